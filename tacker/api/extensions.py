@@ -17,6 +17,7 @@
 import abc
 import imp
 import os
+import sys
 
 from oslo_config import cfg
 import routes
@@ -27,6 +28,7 @@ import webob.exc
 from tacker.api.v1 import attributes
 from tacker.common import exceptions
 import tacker.extensions
+from tacker.openstack.common import importutils
 from tacker.openstack.common import log as logging
 from tacker import policy
 from tacker import wsgi
@@ -267,7 +269,7 @@ class ExtensionMiddleware(wsgi.Middleware):
                  ext_mgr=None):
         self.ext_mgr = (ext_mgr
                         or ExtensionManager(get_extensions_path()))
-        mapper = routes.Mapper()
+        mapper = wsgi.Mapper()
 
         # extended resources
         for resource in self.ext_mgr.get_resources():
@@ -546,13 +548,14 @@ class ExtensionManager(object):
         # Sorting the extension list makes the order in which they
         # are loaded predictable across a cluster of load-balanced
         # Tacker Servers
+        package = _package_name(path)
         for f in sorted(os.listdir(path)):
             try:
                 LOG.debug(_('Loading extension file: %s'), f)
                 mod_name, file_ext = os.path.splitext(os.path.split(f)[-1])
                 ext_path = os.path.join(path, f)
                 if file_ext.lower() == '.py' and not mod_name.startswith('_'):
-                    mod = imp.load_source(mod_name, ext_path)
+                    mod = _load_module(package, mod_name, ext_path)
                     ext_name = mod_name[0].upper() + mod_name[1:]
                     new_ext_class = getattr(mod, ext_name, None)
                     if not new_ext_class:
@@ -580,6 +583,29 @@ class ExtensionManager(object):
         self.extensions[alias] = ext
 
 
+def _package_name(path):
+    """Return the dotted package name of path if it is importable."""
+    path = os.path.abspath(path)
+    names = []
+    while os.path.exists(os.path.join(path, '__init__.py')):
+        path, name = os.path.split(path)
+        names.insert(0, name)
+    if names and path in [os.path.abspath(p or '.') for p in sys.path]:
+        return '.'.join(names)
+
+
+def _load_module(package, mod_name, ext_path):
+    """Import the extension module mod_name found at ext_path.
+
+    Modules inside an importable package are imported by their dotted name
+    so that modules already imported elsewhere, like tacker.extensions.vnfm
+    by the VNFM plugin, are not executed a second time.
+    """
+    if package:
+        return importutils.import_module('%s.%s' % (package, mod_name))
+    return imp.load_source(mod_name, ext_path)
+
+
 class RequestExtension(object):
     """Extend requests and responses of core Tacker OpenStack API controllers.
 
@@ -55,6 +55,7 @@ class Controller(object):
         self._collection = collection.replace('-', '_')
         self._resource = resource.replace('-', '_')
         self._attr_info = attr_info
+        self._validation_plan = ValidationPlan(attr_info)
         self._allow_bulk = allow_bulk
         self._allow_pagination = allow_pagination
         self._allow_sorting = allow_sorting
@@ -352,7 +353,8 @@ class Controller(object):
                             body)
         body = Controller.prepare_request_body(request.context, body, True,
                                                self._resource, self._attr_info,
-                                               allow_bulk=self._allow_bulk)
+                                               allow_bulk=self._allow_bulk,
+                                               plan=self._validation_plan)
         action = self._plugin_handlers[self.CREATE]
         # Check authz
         if self._collection in body:
@@ -441,7 +443,8 @@ class Controller(object):
                             payload)
         body = Controller.prepare_request_body(request.context, body, False,
                                                self._resource, self._attr_info,
-                                               allow_bulk=self._allow_bulk)
+                                               allow_bulk=self._allow_bulk,
+                                               plan=self._validation_plan)
         action = self._plugin_handlers[self.UPDATE]
         # Load object to check authz
         # but pass only attributes in the original body and required
@@ -495,7 +498,7 @@ class Controller(object):
 
     @staticmethod
     def prepare_request_body(context, body, is_create, resource, attr_info,
-                             allow_bulk=False):
+                             allow_bulk=False, plan=None):
         """Verifies required attributes are in request body.
 
         Also checking that an attribute is only specified if it is allowed
@@ -503,83 +506,121 @@ class Controller(object):
 
         Attribute with default values are considered to be optional.
 
-        body argument must be the deserialized body.
+        body argument must be the deserialized body.  plan is the
+        ValidationPlan compiled from attr_info; it is built on the fly when
+        not given.
         """
         collection = resource + "s"
         if not body:
             raise webob.exc.HTTPBadRequest(_("Resource body required"))
+        if plan is None:
+            plan = ValidationPlan(attr_info)
 
         LOG.debug(_("Request body: %(body)s"), {'body': body})
-        prep_req_body = lambda x: Controller.prepare_request_body(
-            context,
-            x if resource in x else {resource: x},
-            is_create,
-            resource,
-            attr_info,
-            allow_bulk)
         if collection in body:
             if not allow_bulk:
                 raise webob.exc.HTTPBadRequest(_("Bulk operation "
                                                  "not supported"))
-            bulk_body = [prep_req_body(item) for item in body[collection]]
+            bulk_body = []
+            for item in body[collection]:
+                if resource not in item:
+                    item = {resource: item}
+                Controller._prepare_resource(context, item.get(resource),
+                                             is_create, resource, plan)
+                bulk_body.append(item)
             if not bulk_body:
                 raise webob.exc.HTTPBadRequest(_("Resources required"))
             return {collection: bulk_body}
 
-        res_dict = body.get(resource)
+        Controller._prepare_resource(context, body.get(resource), is_create,
+                                     resource, plan)
+        return body
+
+    @staticmethod
+    def _prepare_resource(context, res_dict, is_create, resource, plan):
         if res_dict is None:
             msg = _("Unable to find '%s' in request body") % resource
             raise webob.exc.HTTPBadRequest(msg)
 
         Controller._populate_tenant_id(context, res_dict, is_create)
-        Controller._verify_attributes(res_dict, attr_info)
+        keys = set(res_dict)
+        extra_keys = keys - plan.attrs
+        if extra_keys:
+            msg = _("Unrecognized attribute(s) '%s'") % ', '.join(extra_keys)
+            raise webob.exc.HTTPBadRequest(msg)
 
         if is_create:  # POST
-            for attr, attr_vals in attr_info.iteritems():
-                if attr_vals['allow_post']:
-                    if ('default' not in attr_vals and
-                        attr not in res_dict):
-                        msg = _("Failed to parse request. Required "
-                                "attribute '%s' not specified") % attr
-                        raise webob.exc.HTTPBadRequest(msg)
-                    res_dict[attr] = res_dict.get(attr,
-                                                  attr_vals.get('default'))
-                else:
-                    if attr in res_dict:
-                        msg = _("Attribute '%s' not allowed in POST") % attr
-                        raise webob.exc.HTTPBadRequest(msg)
+            if not plan.post_required <= keys:
+                attr = plan.first(plan.post_required - keys)
+                msg = _("Failed to parse request. Required "
+                        "attribute '%s' not specified") % attr
+                raise webob.exc.HTTPBadRequest(msg)
+            if not plan.post_forbidden.isdisjoint(keys):
+                attr = plan.first(plan.post_forbidden & keys)
+                msg = _("Attribute '%s' not allowed in POST") % attr
+                raise webob.exc.HTTPBadRequest(msg)
+            for attr, default in plan.post_defaults:
+                if attr not in res_dict:
+                    res_dict[attr] = default
         else:  # PUT
-            for attr, attr_vals in attr_info.iteritems():
-                if attr in res_dict and not attr_vals['allow_put']:
-                    msg = _("Cannot update read-only attribute %s") % attr
-                    raise webob.exc.HTTPBadRequest(msg)
+            if not plan.put_forbidden.isdisjoint(keys):
+                attr = plan.first(plan.put_forbidden & keys)
+                msg = _("Cannot update read-only attribute %s") % attr
+                raise webob.exc.HTTPBadRequest(msg)
 
-        for attr, attr_vals in attr_info.iteritems():
-            if (attr not in res_dict or
-                res_dict[attr] is attributes.ATTR_NOT_SPECIFIED):
+        for attr, convert_to, validators in plan.checks:
+            value = res_dict.get(attr, attributes.ATTR_NOT_SPECIFIED)
+            if value is attributes.ATTR_NOT_SPECIFIED:
                 continue
             # Convert values if necessary
-            if 'convert_to' in attr_vals:
-                res_dict[attr] = attr_vals['convert_to'](res_dict[attr])
+            if convert_to:
+                value = res_dict[attr] = convert_to(value)
             # Check that configured values are correct
-            if 'validate' not in attr_vals:
-                continue
-            for rule in attr_vals['validate']:
-                res = attributes.validators[rule](res_dict[attr],
-                                                  attr_vals['validate'][rule])
+            for validator, data in validators:
+                res = validator(value, data)
                 if res:
                     msg_dict = dict(attr=attr, reason=res)
                     msg = _("Invalid input for %(attr)s. "
                             "Reason: %(reason)s.") % msg_dict
                     raise webob.exc.HTTPBadRequest(msg)
-        return body
 
-    @staticmethod
-    def _verify_attributes(res_dict, attr_info):
-        extra_keys = set(res_dict.keys()) - set(attr_info.keys())
-        if extra_keys:
-            msg = _("Unrecognized attribute(s) '%s'") % ', '.join(extra_keys)
-            raise webob.exc.HTTPBadRequest(msg)
+
+class ValidationPlan(object):
+    """Request body checks of a resource compiled from its attribute map.
+
+    Holds the sets of attributes required or refused on POST and PUT, the
+    POST defaults and, for every attribute with a converter or validation
+    rules, the converter and the validator callables bound to their
+    arguments, so prepare_request_body does not walk attr_info per request.
+    """
+
+    def __init__(self, attr_info):
+        self._order = dict((attr, i) for i, attr in enumerate(attr_info))
+        self.attrs = frozenset(attr_info)
+        self.post_required = frozenset(
+            attr for attr, vals in attr_info.iteritems()
+            if vals['allow_post'] and 'default' not in vals)
+        self.post_forbidden = frozenset(
+            attr for attr, vals in attr_info.iteritems()
+            if not vals['allow_post'])
+        self.put_forbidden = frozenset(
+            attr for attr, vals in attr_info.iteritems()
+            if not vals.get('allow_put'))
+        self.post_defaults = [(attr, vals['default'])
+                              for attr, vals in attr_info.iteritems()
+                              if vals['allow_post'] and 'default' in vals]
+        self.checks = []
+        for attr, vals in attr_info.iteritems():
+            if 'convert_to' not in vals and 'validate' not in vals:
+                continue
+            validators = [(attributes.validators[rule], data)
+                          for rule, data in vals.get('validate',
+                                                     {}).iteritems()]
+            self.checks.append((attr, vals.get('convert_to'), validators))
+
+    def first(self, attrs):
+        """Return the attribute of attrs which comes first in attr_info."""
+        return min(attrs, key=self._order.get)
 
 
 def create_resource(collection, resource, plugin, params, allow_bulk=False,
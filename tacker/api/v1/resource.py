@@ -72,9 +72,8 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
         args.pop('controller', None)
         fmt = args.pop('format', None)
         action = args.pop('action', None)
-        content_type = format_types.get(fmt,
-                                        request.best_match_content_type())
-        language = request.best_match_language()
+        content_type = (format_types.get(fmt) or
+                        request.best_match_content_type())
         deserializer = deserializers.get(content_type)
         serializer = serializers.get(content_type)
 
@@ -98,7 +97,7 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
                          {'action': action, 'exc': e})
             else:
                 LOG.exception(_('%s failed'), action)
-            e = translate(e, language)
+            e = translate(e, request.best_match_language())
             # following structure is expected by python-tackerclient
             err_data = {'type': e.__class__.__name__,
                         'message': e, 'detail': ''}
@@ -108,12 +107,12 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
         except webob.exc.HTTPException as e:
             type_, value, tb = sys.exc_info()
             LOG.exception(_('%s failed'), action)
-            translate(e, language)
+            translate(e, request.best_match_language())
             value.body = serializer.serialize({'TackerError': e})
             value.content_type = content_type
             six.reraise(type_, value, tb)
         except NotImplementedError as e:
-            e = translate(e, language)
+            e = translate(e, request.best_match_language())
             # NOTE(armando-migliaccio): from a client standpoint
             # it makes sense to receive these errors, because
             # extensions may or may not be implemented by
@@ -130,7 +129,7 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             # Do not expose details of 500 error to clients.
             msg = _('Request Failed: internal server error while '
                     'processing your request.')
-            msg = translate(msg, language)
+            msg = translate(msg, request.best_match_language())
             body = serializer.serialize({'TackerError': msg})
             kwargs = {'body': body, 'content_type': content_type}
             raise webob.exc.HTTPInternalServerError(**kwargs)
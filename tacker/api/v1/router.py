@@ -13,7 +13,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import routes as routes_mapper
 import six.moves.urllib.parse as urlparse
 import webob
 import webob.dec
@@ -59,7 +58,7 @@ class APIRouter(wsgi.Router):
         return cls(**local_config)
 
     def __init__(self, **local_config):
-        mapper = routes_mapper.Mapper()
+        mapper = wsgi.Mapper()
         ext_mgr = extensions.ExtensionManager.get_instance()
         ext_mgr.extend_resources("1.0", attributes.RESOURCE_ATTRIBUTE_MAP)
         super(APIRouter, self).__init__(mapper)
@@ -0,0 +1,57 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Run VNF lifecycle tasks queued by tacker-server.
+
+Start as many as needed, on any host sharing the tacker database.
+"""
+
+import signal
+import sys
+
+import eventlet
+eventlet.monkey_patch()
+
+from oslo_config import cfg
+
+from tacker.common import config
+from tacker.openstack.common import gettextutils
+from tacker.openstack.common import log as logging
+from tacker.vm import plugin
+gettextutils.install('tacker', lazy=True)
+
+LOG = logging.getLogger(__name__)
+
+
+def main():
+    config.init(sys.argv[1:])
+    config.setup_logging(cfg.CONF)
+    if cfg.CONF.servicevm.lifecycle_workers <= 0:
+        sys.exit(_("ERROR: [servicevm] lifecycle_workers must be positive "
+                   "to run lifecycle tasks"))
+
+    def _sigterm(signo, frame):
+        raise SystemExit()
+    signal.signal(signal.SIGTERM, _sigterm)
+
+    vnfm_plugin = plugin.VNFMPlugin()
+    LOG.info(_("Running lifecycle tasks as %s"),
+             vnfm_plugin._task_executor.owner)
+    try:
+        vnfm_plugin._task_executor.wait()
+    except (KeyboardInterrupt, SystemExit):
+        LOG.info(_("Stopping, draining lifecycle tasks"))
+        vnfm_plugin.drain()
+
+
+if __name__ == "__main__":
+    main()
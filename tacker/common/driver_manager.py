@@ -20,21 +20,37 @@
 #
 # @author: Isaku Yamahata, Intel Corporation.
 
+import collections
 import logging as log
+import os
 
-import stevedore.named
+from tacker.common import manifest as startup_manifest
+from tacker.openstack.common import importutils
 
 LOG = log.getLogger(__name__)
 
+_Extension = collections.namedtuple('_Extension', ['name', 'obj'])
+
+
+def _load_target(target):
+    module_name, _sep, attrs = target.partition(':')
+    obj = importutils.import_module(module_name)
+    for attr in attrs.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
 
 class DriverManager(object):
     def __init__(self, namespace, driver_list, **kwargs):
         super(DriverManager, self).__init__()
-        manager = stevedore.named.NamedExtensionManager(
-            namespace, driver_list, invoke_on_load=True, **kwargs)
+        extensions = self._load_from_manifest(namespace, driver_list,
+                                              **kwargs)
+        if extensions is None:
+            extensions = self._load_from_entry_points(namespace, driver_list,
+                                                      **kwargs)
 
         drivers = {}
-        for ext in manager:
+        for ext in extensions:
             type_ = ext.obj.get_type()
             if type_ in drivers:
                 msg = _("driver '%(new_driver)s' ignored because "
@@ -52,6 +68,71 @@ class DriverManager(object):
         LOG.info(_("Registered drivers from %(namespace)s: %(keys)s"),
                  {'namespace': namespace, 'keys': self._drivers.keys()})
 
+    @staticmethod
+    def _manifest_key(namespace, driver_list):
+        return '%s:%s' % (namespace, ','.join(driver_list))
+
+    @classmethod
+    def _load_from_manifest(cls, namespace, driver_list, invoke_args=(),
+                            invoke_kwds=None, **kwargs):
+        """Load the drivers recorded in the startup manifest.
+
+        Avoids scanning every installed distribution for entry points.
+        Returns None when the manifest can not be used.
+        """
+        if kwargs:
+            return None
+        targets = startup_manifest.get_manifest().get(
+            'drivers', cls._manifest_key(namespace, driver_list))
+        if targets is None:
+            return None
+        extensions = []
+        for name, target in targets:
+            try:
+                driver_class = _load_target(target)
+            except (ImportError, AttributeError) as e:
+                LOG.info(_("Startup manifest entry for %(namespace)s is "
+                           "unusable: %(error)s"),
+                         {'namespace': namespace, 'error': e})
+                return None
+            try:
+                driver = driver_class(*invoke_args, **(invoke_kwds or {}))
+            except Exception:
+                # like stevedore, skip a driver which fails to load
+                LOG.exception(_("Could not load %r"), name)
+                continue
+            extensions.append(_Extension(name, driver))
+        return extensions
+
+    @classmethod
+    def _load_from_entry_points(cls, namespace, driver_list, **kwargs):
+        # NOTE: stevedore scans all installed distributions when it is
+        # imported, so only do so when the manifest can not be used.
+        import stevedore.named
+
+        manager = stevedore.named.NamedExtensionManager(
+            namespace, driver_list, invoke_on_load=True, **kwargs)
+        extensions = list(manager)
+        if set(driver_list) - set(ext.name for ext in extensions):
+            # keep looking for the missing drivers on the next start
+            return extensions
+
+        targets = []
+        paths = set()
+        for ext in extensions:
+            ep = ext.entry_point
+            egg_info = getattr(ep.dist, 'egg_info', None)
+            if not egg_info:
+                return extensions
+            targets.append((ext.name, '%s:%s' % (ep.module_name,
+                                                 '.'.join(ep.attrs))))
+            paths.add(os.path.join(egg_info, 'entry_points.txt'))
+        manifest = startup_manifest.get_manifest()
+        manifest.set('drivers', cls._manifest_key(namespace, driver_list),
+                     targets, paths)
+        manifest.save()
+        return extensions
+
     @staticmethod
     def _driver_name(driver):
         return driver.__module__ + '.' + driver.__class__.__name__
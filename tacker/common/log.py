@@ -16,14 +16,49 @@
 
 """Log helper functions."""
 
+import logging as std_logging
+
+import six
+
 from tacker.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
 
+class Deferred(object):
+    """Log argument which is only computed when the record is formatted.
+
+    Wraps a callable whose result is substituted into the message, so
+    expensive arguments (e.g. lazy-loaded ORM relationships) are never
+    evaluated for records that are filtered out by the log level::
+
+        LOG.debug('attributes %s', Deferred(lambda: device_db.attributes))
+
+    Arguments which are already computed, like the device and template
+    dicts, are only formatted for emitted records anyway and gain nothing
+    from being wrapped.
+    """
+
+    __slots__ = ('func',)
+
+    def __init__(self, func):
+        self.func = func
+
+    def __str__(self):
+        return str(self.func())
+
+    def __unicode__(self):
+        return six.text_type(self.func())
+
+    def __repr__(self):
+        return repr(self.func())
+
+
 def log(method):
     """Decorator helping to log method calls."""
     def wrapper(*args, **kwargs):
+        if not LOG.isEnabledFor(std_logging.DEBUG):
+            return method(*args, **kwargs)
         instance = args[0]
         data = {"class_name": (instance.__class__.__module__ + '.'
                                + instance.__class__.__name__),
@@ -0,0 +1,112 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""On-disk manifest of what driver discovery found.
+
+Every entry records the modification time of the files it was derived
+from and is ignored once any of them changes, so a stale manifest only
+costs the discovery it would have saved.
+"""
+
+import json
+import os
+import tempfile
+
+from oslo_config import cfg
+
+from tacker.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.StrOpt('startup_manifest',
+               default='$state_path/startup_manifest.json',
+               help=_("File caching the drivers discovered at startup. "
+                      "An empty value disables it")),
+]
+cfg.CONF.register_opts(OPTS)
+
+_manifests = {}
+
+
+def stamp(path):
+    """Return the modification time of path, None if it does not exist."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class Manifest(object):
+    """Sections of entries validated against file modification times."""
+
+    def __init__(self, path):
+        self.path = path
+        self._sections = None
+        self._dirty = False
+
+    def _load(self):
+        if self._sections is None:
+            self._sections = {}
+            if self.path:
+                try:
+                    with open(self.path) as manifest_file:
+                        self._sections = json.load(manifest_file)
+                except (IOError, ValueError) as e:
+                    LOG.debug(_("Ignoring startup manifest %(path)s: "
+                                "%(error)s"), {'path': self.path, 'error': e})
+        return self._sections
+
+    def get(self, section, key):
+        """Return the value stored for key, None if missing or stale."""
+        entry = self._load().get(section, {}).get(key)
+        if entry is None:
+            return None
+        for path, mtime in entry['stamps'].items():
+            if stamp(path) != mtime:
+                return None
+        return entry['value']
+
+    def set(self, section, key, value, paths):
+        """Store value for key, valid until one of paths is modified."""
+        entry = {'stamps': dict((path, stamp(path)) for path in paths),
+                 'value': value}
+        self._load().setdefault(section, {})[key] = entry
+        self._dirty = True
+
+    def save(self):
+        """Write the manifest if anything changed; failures are logged."""
+        if not (self._dirty and self.path):
+            return
+        directory = os.path.dirname(self.path) or '.'
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory,
+                                            prefix='.startup_manifest')
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(self._sections, tmp_file)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            LOG.info(_("Unable to write startup manifest %(path)s: "
+                       "%(error)s"), {'path': self.path, 'error': e})
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        self._dirty = False
+
+
+def get_manifest():
+    path = cfg.CONF.startup_manifest
+    if path not in _manifests:
+        _manifests[path] = Manifest(path)
+    return _manifests[path]
@@ -18,6 +18,7 @@
 
 """Utilities and helper functions."""
 
+import collections
 import datetime
 import functools
 import hashlib
@@ -33,6 +34,7 @@ from eventlet.green import subprocess
 from oslo_config import cfg
 
 from tacker.common import constants as q_const
+from tacker.openstack.common import importutils
 from tacker.openstack.common import lockutils
 from tacker.openstack.common import log as logging
 
@@ -102,6 +104,59 @@ class cache_method_results(object):
         return functools.partial(self.__call__, obj)
 
 
+class LazyModule(object):
+    """Stand-in for a module which is imported on first attribute access.
+
+    Keeps heavy client libraries out of processes which never call them.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importutils.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return '<LazyModule %s>' % self._name
+
+
+class LRUCache(object):
+    """A bounded mapping which evicts the least recently used entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+        self._data[key] = value
+        return value
+
+    def set(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
+
+
 def read_cached_file(filename, cache_info, reload_func=None):
     """Read from a file if it has been modified.
 
@@ -0,0 +1,49 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add lifecycle tasks
+
+Revision ID: 2774a42c7163
+Revises: 3f1a8c2d9e6b
+Create Date: 2015-10-28 15:40:51.204817
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2774a42c7163'
+down_revision = '3f1a8c2d9e6b'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade(active_plugins=None, options=None):
+    op.create_table(
+        'lifecycletasks',
+        sa.Column('id', sa.String(36), nullable=False),
+        sa.Column('operation', sa.String(255), nullable=False),
+        sa.Column('device_id', sa.String(255), nullable=True),
+        sa.Column('payload', sa.TEXT(65535), nullable=False),
+        sa.Column('status', sa.String(255), nullable=False),
+        sa.Column('steps', sa.String(1024), nullable=False),
+        sa.Column('attempts', sa.Integer, nullable=False),
+        sa.Column('run_at', sa.DateTime, nullable=False),
+        sa.Column('lease_owner', sa.String(255), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime, nullable=True),
+        sa.Column('last_error', sa.String(1024), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_lifecycletasks_status_run_at', 'lifecycletasks',
+                    ['status', 'run_at'])
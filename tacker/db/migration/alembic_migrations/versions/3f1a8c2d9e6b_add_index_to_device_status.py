@@ -0,0 +1,32 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add index to device status
+
+Revision ID: 3f1a8c2d9e6b
+Revises: 5958429bcb3c
+Create Date: 2015-10-26 11:02:13.519340
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f1a8c2d9e6b'
+down_revision = '5958429bcb3c'
+
+from alembic import op
+
+
+def upgrade(active_plugins=None, options=None):
+    op.create_index('ix_devices_status', 'devices', ['status'])
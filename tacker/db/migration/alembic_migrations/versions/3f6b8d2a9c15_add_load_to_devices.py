@@ -0,0 +1,44 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add load to devices
+
+Revision ID: 3f6b8d2a9c15
+Revises: 9a4b6c8d0e12
+Create Date: 2015-12-02 11:05:37.618204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f6b8d2a9c15'
+down_revision = '9a4b6c8d0e12'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade(active_plugins=None, options=None):
+    op.add_column('devices',
+                  sa.Column('load', sa.Integer(), nullable=False,
+                            server_default='0'))
+    op.create_index('ix_devices_load', 'devices', ['load'])
+    devices = sa.sql.table('devices', sa.sql.column('id', sa.String),
+                           sa.sql.column('load', sa.Integer))
+    bindings = sa.sql.table('servicedevicebindings',
+                            sa.sql.column('device_id', sa.String))
+    op.execute(devices.update().
+               values(load=sa.select([sa.func.count()]).
+                      where(bindings.c.device_id == devices.c.id).
+                      as_scalar()))
@@ -0,0 +1,35 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add version to devices
+
+Revision ID: 5e2a7c9b1d04
+Revises: 8c1f2d6e4a3b
+Create Date: 2015-11-20 14:03:27.519286
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5e2a7c9b1d04'
+down_revision = '8c1f2d6e4a3b'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade(active_plugins=None, options=None):
+    op.add_column('devices',
+                  sa.Column('version', sa.Integer(), nullable=False,
+                            server_default='0'))
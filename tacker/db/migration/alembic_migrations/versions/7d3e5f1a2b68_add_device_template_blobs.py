@@ -0,0 +1,74 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add device template blobs
+
+Revision ID: 7d3e5f1a2b68
+Revises: 5e2a7c9b1d04
+Create Date: 2015-11-24 09:41:52.106733
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7d3e5f1a2b68'
+down_revision = '5e2a7c9b1d04'
+
+import hashlib
+
+from alembic import op
+import six
+import sqlalchemy as sa
+
+
+def upgrade(active_plugins=None, options=None):
+    op.create_table(
+        'devicetemplateblobs',
+        sa.Column('hash', sa.String(64), nullable=False),
+        sa.Column('value', sa.TEXT(65535), nullable=False),
+        sa.PrimaryKeyConstraint('hash'),
+    )
+    op.add_column('devicetemplateattributes',
+                  sa.Column('blob_hash', sa.String(64), nullable=True))
+    op.create_foreign_key('fk_devicetemplateattributes_blob_hash',
+                          'devicetemplateattributes', 'devicetemplateblobs',
+                          ['blob_hash'], ['hash'])
+
+    attributes = sa.sql.table(
+        'devicetemplateattributes', sa.sql.column('id', sa.String),
+        sa.sql.column('key', sa.String), sa.sql.column('value', sa.String),
+        sa.sql.column('blob_hash', sa.String))
+    blobs = sa.sql.table('devicetemplateblobs',
+                         sa.sql.column('hash', sa.String),
+                         sa.sql.column('value', sa.String))
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select([attributes.c.id, attributes.c.value]).
+        where(attributes.c.key == 'vnfd').
+        where(attributes.c.value != sa.null())).fetchall()
+    blob_hashes = {}
+    values = {}
+    for attr_id, value in rows:
+        data = value
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        blob_hashes[attr_id] = hashlib.sha256(data).hexdigest()
+        values[blob_hashes[attr_id]] = value
+    if values:
+        op.bulk_insert(blobs, [{'hash': blob_hash, 'value': value}
+                               for blob_hash, value in values.items()])
+    for attr_id, blob_hash in blob_hashes.items():
+        bind.execute(attributes.update().
+                     where(attributes.c.id == attr_id).
+                     values(blob_hash=blob_hash, value=None))
@@ -0,0 +1,74 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add device mgmt endpoints
+
+Revision ID: 8c1f2d6e4a3b
+Revises: c88e3264376b
+Create Date: 2015-11-02 11:24:07.519316
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8c1f2d6e4a3b'
+down_revision = 'c88e3264376b'
+
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+from tacker.openstack.common import jsonutils
+
+
+def upgrade(active_plugins=None, options=None):
+    op.alter_column('devices',
+        'mgmt_url', type_=sa.TEXT(65535), nullable=True)
+    op.create_table(
+        'devicemgmtendpoints',
+        sa.Column('id', sa.String(36), nullable=False),
+        sa.Column('device_id', sa.String(255), nullable=False),
+        sa.Column('vdu', sa.String(255), nullable=False),
+        sa.Column('ip', sa.String(64), nullable=False),
+        sa.Column('port', sa.Integer, nullable=True),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_devicemgmtendpoints_ip', 'devicemgmtendpoints',
+                    ['ip'])
+
+    devices = sa.sql.table('devices', sa.sql.column('id', sa.String),
+                           sa.sql.column('mgmt_url', sa.String))
+    endpoints = sa.sql.table(
+        'devicemgmtendpoints', sa.sql.column('id', sa.String),
+        sa.sql.column('device_id', sa.String),
+        sa.sql.column('vdu', sa.String), sa.sql.column('ip', sa.String),
+        sa.sql.column('port', sa.Integer))
+    rows = []
+    for device_id, mgmt_url in op.get_bind().execute(
+            sa.select([devices.c.id, devices.c.mgmt_url]).
+            where(devices.c.mgmt_url != sa.null())):
+        try:
+            mgmt_url = jsonutils.loads(mgmt_url)
+        except ValueError:
+            continue
+        if not isinstance(mgmt_url, dict):
+            continue
+        rows.extend({'id': str(uuid.uuid4()), 'device_id': device_id,
+                     'vdu': vdu, 'ip': ip, 'port': None}
+                    for vdu, ip in mgmt_url.items()
+                    if ip and not isinstance(ip, dict))
+    if rows:
+        op.bulk_insert(endpoints, rows)
@@ -0,0 +1,39 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add lifecycle leases
+
+Revision ID: 9a4b6c8d0e12
+Revises: 7d3e5f1a2b68
+Create Date: 2015-11-26 16:20:11.402517
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9a4b6c8d0e12'
+down_revision = '7d3e5f1a2b68'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade(active_plugins=None, options=None):
+    op.create_table(
+        'lifecycleleases',
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('owner', sa.String(255), nullable=False),
+        sa.Column('expires_at', sa.DateTime, nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
@@ -0,0 +1,42 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add internal to devices
+
+Revision ID: c88e3264376b
+Revises: 2774a42c7163
+Create Date: 2015-10-30 10:12:45.871034
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c88e3264376b'
+down_revision = '2774a42c7163'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade(active_plugins=None, options=None):
+    op.add_column('devices',
+                  sa.Column('internal', sa.Boolean(), nullable=False,
+                            server_default=sa.sql.false()))
+    op.create_index('ix_devices_internal', 'devices', ['internal'])
+    devices = sa.sql.table('devices', sa.sql.column('id', sa.String),
+                           sa.sql.column('internal', sa.Boolean))
+    op.execute(devices.update().
+               where(sa.or_(devices.c.id.like('%-RESPAWN-%'),
+                            devices.c.id.like('%-DEAD-%'))).
+               values(internal=True))
@@ -0,0 +1,255 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import uuid
+
+import sqlalchemy as sa
+from sqlalchemy.orm import exc as orm_exc
+
+from tacker.db import model_base
+from tacker.db import models_v1
+from tacker.extensions import vnfm
+from tacker.openstack.common.db import exception as db_exc
+from tacker.openstack.common import jsonutils
+from tacker.openstack.common import log as logging
+from tacker.openstack.common import timeutils
+
+LOG = logging.getLogger(__name__)
+
+TASK_PENDING = 'PENDING'
+TASK_RUNNING = 'RUNNING'
+TASK_FAILED = 'FAILED'
+
+
+class LifecycleTask(model_base.BASE, models_v1.HasId):
+    """Long running half of a device or service instance operation.
+
+    A task is PENDING until a worker leases it and RUNNING while the lease
+    holds. A task whose lease expired is taken over by another worker and
+    steps it recorded as done are not run again. Finished tasks are
+    deleted, tasks out of attempts are kept as FAILED.
+    """
+    operation = sa.Column(sa.String(255), nullable=False)
+    device_id = sa.Column(sa.String(255), nullable=True)
+    # json encoded context and keyword arguments of the operation
+    payload = sa.Column(sa.TEXT(65535), nullable=False)
+    status = sa.Column(sa.String(255), nullable=False)
+    # comma separated names of the steps already done
+    steps = sa.Column(sa.String(1024), nullable=False, default='')
+    attempts = sa.Column(sa.Integer, nullable=False, default=0)
+    run_at = sa.Column(sa.DateTime, nullable=False)
+    lease_owner = sa.Column(sa.String(255), nullable=True)
+    lease_expires_at = sa.Column(sa.DateTime, nullable=True)
+    last_error = sa.Column(sa.String(1024), nullable=True)
+
+    __table_args__ = (
+        sa.Index('ix_lifecycletasks_status_run_at', 'status', 'run_at'),
+    )
+
+
+class LifecycleLease(model_base.BASE):
+    """Job only one process at a time runs, e.g. the device reconciler.
+
+    The owner holds the lease until expires_at unless it renews it.
+    """
+    name = sa.Column(sa.String(255), primary_key=True)
+    owner = sa.Column(sa.String(255), nullable=False)
+    expires_at = sa.Column(sa.DateTime, nullable=False)
+
+
+class LifecycleTaskDbMixin(object):
+
+    def _make_lifecycle_task_dict(self, task_db, fields=None):
+        key_list = ('id', 'operation', 'device_id', 'status', 'attempts',
+                    'lease_owner', 'last_error')
+        res = dict((key, task_db[key]) for key in key_list)
+        res['steps'] = [step for step in task_db.steps.split(',') if step]
+        for key in ('run_at', 'lease_expires_at'):
+            res[key] = task_db[key] and timeutils.isotime(task_db[key])
+        return self._fields(res, fields)
+
+    def get_lifecycle_tasks(self, context, filters=None, fields=None):
+        return self._get_collection(context, LifecycleTask,
+                                    self._make_lifecycle_task_dict,
+                                    filters=filters, fields=fields)
+
+    def get_lifecycle_task(self, context, id, fields=None):
+        try:
+            task_db = self._get_by_id(context, LifecycleTask, id)
+        except orm_exc.NoResultFound:
+            raise vnfm.LifecycleTaskNotFound(task_id=id)
+        return self._make_lifecycle_task_dict(task_db, fields)
+
+    def _count_tasks(self, context):
+        """Return {operation: {status: number of tasks}}."""
+        counts = {}
+        query = (context.session.query(LifecycleTask.operation,
+                                       LifecycleTask.status,
+                                       sa.func.count(LifecycleTask.id)).
+                 group_by(LifecycleTask.operation, LifecycleTask.status))
+        for operation, status, count in query:
+            counts.setdefault(operation, {})[status] = count
+        return counts
+
+    def _enqueue_task(self, context, operation, device_id, payload):
+        task_id = str(uuid.uuid4())
+        with context.session.begin(subtransactions=True):
+            context.session.add(LifecycleTask(
+                id=task_id, operation=operation, device_id=device_id,
+                payload=jsonutils.dumps(payload), status=TASK_PENDING,
+                steps='', attempts=0, run_at=timeutils.utcnow()))
+        return task_id
+
+    def _get_devices_with_tasks(self, context, device_ids):
+        """Return the ids of device_ids with a PENDING or RUNNING task."""
+        if not device_ids:
+            return []
+        return [device_id for (device_id,) in
+                context.session.query(LifecycleTask.device_id).
+                filter(LifecycleTask.device_id.in_(device_ids)).
+                filter(LifecycleTask.status.in_((TASK_PENDING,
+                                                 TASK_RUNNING))).
+                distinct()]
+
+    def _acquire_lease(self, context, name, owner, lease):
+        """Take or renew the lease name for lease seconds.
+
+        Return whether owner holds it, i.e. it was free, expired or
+        already held by owner.
+        """
+        now = timeutils.utcnow()
+        expires = now + datetime.timedelta(seconds=lease)
+        with context.session.begin(subtransactions=True):
+            count = (context.session.query(LifecycleLease).
+                     filter(LifecycleLease.name == name).
+                     filter(sa.or_(LifecycleLease.owner == owner,
+                                   LifecycleLease.expires_at < now)).
+                     update({'owner': owner, 'expires_at': expires},
+                            synchronize_session=False))
+        if count:
+            return True
+        try:
+            with context.session.begin(subtransactions=True):
+                context.session.add(LifecycleLease(name=name, owner=owner,
+                                                   expires_at=expires))
+        except db_exc.DBDuplicateEntry:
+            # held by another process
+            return False
+        return True
+
+    def _release_lease(self, context, name, owner):
+        with context.session.begin(subtransactions=True):
+            (context.session.query(LifecycleLease).
+             filter(LifecycleLease.name == name).
+             filter(LifecycleLease.owner == owner).
+             delete(synchronize_session=False))
+
+    def _lease_tasks(self, context, owner, limit, lease, operations=None,
+                     exclude=None):
+        """Lease up to limit runnable tasks for lease seconds.
+
+        Only tasks of operations, if given, and of none of exclude are
+        leased. Candidates are read without locks and each one is claimed
+        with a conditional UPDATE, so concurrent workers never run the
+        same task.
+        """
+        now = timeutils.utcnow()
+        runnable = sa.or_(
+            sa.and_(LifecycleTask.status == TASK_PENDING,
+                    LifecycleTask.run_at <= now),
+            sa.and_(LifecycleTask.status == TASK_RUNNING,
+                    LifecycleTask.lease_expires_at < now))
+        query = context.session.query(LifecycleTask.id).filter(runnable)
+        if operations is not None:
+            query = query.filter(LifecycleTask.operation.in_(operations))
+        if exclude:
+            query = query.filter(~LifecycleTask.operation.in_(exclude))
+        candidates = [task_id for (task_id,) in
+                      query.order_by(LifecycleTask.run_at).limit(limit)]
+        expires = now + datetime.timedelta(seconds=lease)
+        leased = []
+        for task_id in candidates:
+            with context.session.begin(subtransactions=True):
+                claimed = (context.session.query(LifecycleTask).
+                           filter(LifecycleTask.id == task_id).
+                           filter(runnable).
+                           update({'status': TASK_RUNNING,
+                                   'lease_owner': owner,
+                                   'lease_expires_at': expires,
+                                   'attempts': LifecycleTask.attempts + 1},
+                                  synchronize_session=False))
+            if claimed:
+                leased.append(task_id)
+        if not leased:
+            return []
+        return (context.session.query(LifecycleTask).
+                filter(LifecycleTask.id.in_(leased)).
+                filter(LifecycleTask.lease_owner == owner).all())
+
+    def _renew_task_leases(self, context, owner, task_ids, lease):
+        if not task_ids:
+            return
+        expires = timeutils.utcnow() + datetime.timedelta(seconds=lease)
+        with context.session.begin(subtransactions=True):
+            (context.session.query(LifecycleTask).
+             filter(LifecycleTask.id.in_(task_ids)).
+             filter(LifecycleTask.lease_owner == owner).
+             update({'lease_expires_at': expires},
+                    synchronize_session=False))
+
+    def _release_tasks(self, context, owner, task_ids):
+        """Hand tasks still running back to the queue for other workers."""
+        if not task_ids:
+            return
+        with context.session.begin(subtransactions=True):
+            (context.session.query(LifecycleTask).
+             filter(LifecycleTask.id.in_(task_ids)).
+             filter(LifecycleTask.lease_owner == owner).
+             update({'status': TASK_PENDING, 'lease_owner': None,
+                     'lease_expires_at': None,
+                     'run_at': timeutils.utcnow()},
+                    synchronize_session=False))
+
+    def _mark_task_step(self, context, owner, task_id, steps):
+        with context.session.begin(subtransactions=True):
+            (context.session.query(LifecycleTask).
+             filter(LifecycleTask.id == task_id).
+             filter(LifecycleTask.lease_owner == owner).
+             update({'steps': ','.join(steps)},
+                    synchronize_session=False))
+
+    def _complete_task(self, context, owner, task_id):
+        with context.session.begin(subtransactions=True):
+            (context.session.query(LifecycleTask).
+             filter(LifecycleTask.id == task_id).
+             filter(LifecycleTask.lease_owner == owner).
+             delete(synchronize_session=False))
+
+    def _retry_task(self, context, owner, task_id, delay, error):
+        """Release the task to be run again in delay seconds.
+
+        A None delay marks the task FAILED for good.
+        """
+        values = {'lease_owner': None, 'lease_expires_at': None,
+                  'last_error': error[:1024]}
+        if delay is None:
+            values['status'] = TASK_FAILED
+        else:
+            values['status'] = TASK_PENDING
+            values['run_at'] = (timeutils.utcnow() +
+                                datetime.timedelta(seconds=delay))
+        with context.session.begin(subtransactions=True):
+            (context.session.query(LifecycleTask).
+             filter(LifecycleTask.id == task_id).
+             filter(LifecycleTask.lease_owner == owner).
+             update(values, synchronize_session=False))
@@ -20,13 +20,19 @@
 #
 # @author: Isaku Yamahata, Intel Corporation.
 
+import collections
+import hashlib
+import threading
 import uuid
 
+import six
 import sqlalchemy as sa
 from sqlalchemy import orm
 from sqlalchemy.orm import exc as orm_exc
+from sqlalchemy.orm import util as orm_util
 
 from tacker.api.v1 import attributes
+from tacker.common import log as call_log
 from tacker import context as t_context
 from tacker.db import api as qdbapi
 from tacker.db import db_base
@@ -34,6 +40,7 @@ from tacker.db import model_base
 from tacker.db import models_v1
 from tacker.extensions import vnfm
 from tacker import manager
+from tacker.openstack.common import jsonutils
 from tacker.openstack.common import log as logging
 from tacker.openstack.common import uuidutils
 from tacker.plugins.common import constants
@@ -43,6 +50,19 @@ _ACTIVE_UPDATE = (constants.ACTIVE, constants.PENDING_UPDATE)
 _ACTIVE_UPDATE_ERROR_DEAD = (
     constants.PENDING_CREATE, constants.ACTIVE, constants.PENDING_UPDATE,
     constants.ERROR, constants.DEAD)
+_PENDING = (constants.PENDING_CREATE, constants.PENDING_UPDATE,
+            constants.PENDING_DELETE)
+# number of device and device template dicts kept by a plugin
+DEVICE_CACHE_SIZE = 1024
+TEMPLATE_CACHE_SIZE = 256
+BLOB_CACHE_SIZE = 256
+# template attributes stored once per content, see DeviceTemplateBlob
+TEMPLATE_BLOB_KEYS = ('vnfd',)
+
+
+def _is_internal_id(device_id):
+    # failure policies create devices with ids like <id>-RESPAWN-<n>
+    return not uuidutils.is_uuid_like(device_id)
 
 
 ###########################################################################
@@ -91,6 +111,20 @@ class DeviceTemplateAttribute(model_base.BASE, models_v1.HasId):
                             nullable=False)
     key = sa.Column(sa.String(255), nullable=False)
     value = sa.Column(sa.TEXT(65535), nullable=True)
+    # set instead of value for the keys of TEMPLATE_BLOB_KEYS
+    blob_hash = sa.Column(sa.String(64),
+                          sa.ForeignKey('devicetemplateblobs.hash'),
+                          nullable=True)
+    blob = orm.relationship('DeviceTemplateBlob')
+
+
+class DeviceTemplateBlob(model_base.BASE):
+    """Represents a template attribute value by the sha256 of its content.
+
+    Identical VNFDs onboarded as many templates are stored once.
+    """
+    hash = sa.Column(sa.String(64), primary_key=True)
+    value = sa.Column(sa.TEXT(65535), nullable=False)
 
 
 class Device(model_base.BASE, models_v1.HasTenant):
@@ -115,13 +149,30 @@ class Device(model_base.BASE, models_v1.HasTenant):
     # For a management tool to talk to manage this hosting device.
     # opaque string.
     # e.g. (driver, mgmt_url) = (ssh, ip address), ...
-    mgmt_url = sa.Column(sa.String(255), nullable=True)
+    mgmt_url = sa.Column(sa.TEXT(65535), nullable=True)
+    # mgmt_url decoded
+    mgmt_endpoints = orm.relationship('DeviceMgmtEndpoint')
     attributes = orm.relationship("DeviceAttribute", backref="device")
 
     service_context = orm.relationship('DeviceServiceContext')
     services = orm.relationship('ServiceDeviceBinding', backref='device')
 
-    status = sa.Column(sa.String(255), nullable=False)
+    status = sa.Column(sa.String(255), nullable=False, index=True)
+
+    # internally used record, e.g. the device a respawn replaced, hidden
+    # from listings
+    internal = sa.Column(sa.Boolean, nullable=False, default=False,
+                         server_default=sa.sql.false(), index=True)
+
+    # incremented by every write to the device or the rows of its dict,
+    # cached device dicts of an older version are stale
+    version = sa.Column(sa.Integer, nullable=False, default=0,
+                        server_default='0')
+
+    # number of service instances bound to the device, written with the
+    # bindings so the least loaded scheduler reads it from the index
+    load = sa.Column(sa.Integer, nullable=False, default=0,
+                     server_default='0', index=True)
 
 
 class DeviceAttribute(model_base.BASE, models_v1.HasId):
@@ -138,6 +189,43 @@ class DeviceAttribute(model_base.BASE, models_v1.HasId):
     value = sa.Column(sa.String(4096), nullable=True)
 
 
+class DeviceMgmtEndpoint(model_base.BASE, models_v1.HasId):
+    """Represents a management address of a vdu of a Device.
+
+    It is the decoded mgmt_url, so that monitors and mgmt drivers do not
+    parse it again and devices can be looked up by address.
+    """
+    device_id = sa.Column(sa.String(255), sa.ForeignKey('devices.id'),
+                          nullable=False)
+    vdu = sa.Column(sa.String(255), nullable=False)
+    ip = sa.Column(sa.String(64), nullable=False, index=True)
+    port = sa.Column(sa.Integer, nullable=True)
+
+
+def mgmt_endpoints(mgmt_url):
+    """Decode the json mgmt_url reported by infra drivers.
+
+    mgmt_url maps a vdu to its address, or to a dict of ip and port.
+    Return a list of dicts of vdu, ip and port sorted by vdu.
+    """
+    try:
+        mgmt_url = jsonutils.loads(mgmt_url or '{}')
+    except ValueError:
+        return []
+    if not isinstance(mgmt_url, dict):
+        return []
+    endpoints = []
+    for vdu, address in sorted(mgmt_url.items()):
+        if isinstance(address, dict):
+            endpoint = {'vdu': vdu, 'ip': address.get('ip'),
+                        'port': address.get('port')}
+        else:
+            endpoint = {'vdu': vdu, 'ip': address, 'port': None}
+        if endpoint['ip']:
+            endpoints.append(endpoint)
+    return endpoints
+
+
 # TODO(yamahata): This is tentative.
 #                 In the future, this will be replaced with db models of
 #                 service insertion/chain.
@@ -250,6 +338,58 @@ class ServiceDeviceBinding(model_base.BASE):
                           primary_key=True)
 
 
+def _copy(value):
+    # copy.deepcopy() without its memo, for the plain dicts cached below
+    if isinstance(value, dict):
+        return dict((key, _copy(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+class _DictCache(object):
+    """Least recently used dicts built from rows, by id and row version.
+
+    Entries are copied in and out so that callers may modify the dicts
+    they are given.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries[key] = entry
+            return _copy(entry[1])
+
+    def put(self, key, value, version=None):
+        value = _copy(value)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (version, value)
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+# blob values by hash, immutable and so shared by all the plugins
+_blob_cache = _DictCache(BLOB_CACHE_SIZE)
+
+
+def _blob_hash(value):
+    if isinstance(value, six.text_type):
+        value = value.encode('utf-8')
+    return hashlib.sha256(value).hexdigest()
+
+
 ###########################################################################
 # actual code to manage those tables
 class ServiceContextEntry(dict):
@@ -278,6 +418,11 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
     def __init__(self):
         qdbapi.register_models()
         super(VNFMPluginDb, self).__init__()
+        # device dicts are checked against the version of their row, so
+        # writes of other processes invalidate them too
+        self._device_cache = _DictCache(DEVICE_CACHE_SIZE)
+        # but for name and description, templates are immutable
+        self._template_cache = _DictCache(TEMPLATE_CACHE_SIZE)
 
     def _get_resource(self, context, model, id):
         try:
@@ -295,7 +440,18 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
                 raise
 
     def _make_attributes_dict(self, attributes_db):
-        return dict((attr.key, attr.value) for attr in attributes_db)
+        return dict((attr.key, self._template_attribute_value(attr))
+                    for attr in attributes_db)
+
+    @staticmethod
+    def _template_attribute_value(attr_db):
+        if attr_db.blob_hash is None:
+            return attr_db.value
+        value = _blob_cache.get(attr_db.blob_hash)
+        if value is None:
+            value = attr_db.blob.value
+            _blob_cache.put(attr_db.blob_hash, value)
+        return value
 
     def _make_service_types_list(self, service_types):
         return [{'id': service_type.id,
@@ -303,14 +459,18 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
                 for service_type in service_types]
 
     def _make_template_dict(self, template, fields=None):
-        res = {
-            'attributes': self._make_attributes_dict(template['attributes']),
-            'service_types': self._make_service_types_list(
-                template.service_types)
-        }
-        key_list = ('id', 'tenant_id', 'name', 'description',
-                    'infra_driver', 'mgmt_driver')
-        res.update((key, template[key]) for key in key_list)
+        res = self._template_cache.get(template.id)
+        if res is None:
+            res = {
+                'attributes':
+                self._make_attributes_dict(template['attributes']),
+                'service_types': self._make_service_types_list(
+                    template.service_types)
+            }
+            key_list = ('id', 'tenant_id', 'infra_driver', 'mgmt_driver')
+            res.update((key, template[key]) for key in key_list)
+            self._template_cache.put(template.id, res)
+        res.update((key, template[key]) for key in ('name', 'description'))
         return self._fields(res, fields)
 
     def _make_services_list(self, binding_db):
@@ -319,6 +479,11 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
     def _make_dev_attrs_dict(self, dev_attrs_db):
         return dict((arg.key, arg.value) for arg in dev_attrs_db)
 
+    def _make_mgmt_endpoints_list(self, endpoints_db):
+        return [{'vdu': endpoint.vdu, 'ip': endpoint.ip,
+                 'port': endpoint.port}
+                for endpoint in sorted(endpoints_db, key=lambda e: e.vdu)]
+
     def _make_device_service_context_dict(self, service_context):
         key_list = ('id', 'network_id', 'subnet_id', 'port_id', 'router_id',
                     'role', 'index')
@@ -326,20 +491,30 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
                 for entry in service_context]
 
     def _make_device_dict(self, device_db, fields=None):
+        # the template, descriptor included, is only built when asked for
         LOG.debug(_('device_db %s'), device_db)
-        LOG.debug(_('device_db attributes %s'), device_db.attributes)
-        res = {
-            'services':
-            self._make_services_list(getattr(device_db, 'services', [])),
-            'device_template':
-            self._make_template_dict(device_db.template),
-            'attributes': self._make_dev_attrs_dict(device_db.attributes),
-            'service_context':
-            self._make_device_service_context_dict(device_db.service_context),
-        }
-        key_list = ('id', 'tenant_id', 'name', 'description', 'instance_id',
-                    'template_id', 'status', 'mgmt_url')
-        res.update((key, device_db[key]) for key in key_list)
+        version = device_db.version
+        res = self._device_cache.get(device_db.id, version)
+        if res is None:
+            LOG.debug(_('device_db attributes %s'),
+                      call_log.Deferred(lambda: device_db.attributes))
+            res = {
+                'services':
+                self._make_services_list(getattr(device_db, 'services', [])),
+                'attributes': self._make_dev_attrs_dict(device_db.attributes),
+                'mgmt_endpoints':
+                self._make_mgmt_endpoints_list(device_db.mgmt_endpoints),
+                'service_context': self._make_device_service_context_dict(
+                    device_db.service_context),
+            }
+            key_list = ('id', 'tenant_id', 'name', 'description',
+                        'instance_id', 'template_id', 'status', 'mgmt_url')
+            res.update((key, device_db[key]) for key in key_list)
+            if version is not None:
+                self._device_cache.put(device_db.id, res, version)
+        if not fields or 'device_template' in fields:
+            res['device_template'] = self._make_template_dict(
+                device_db.template)
         return self._fields(res, fields)
 
     def _make_service_context_dict(self, service_context):
@@ -408,11 +583,16 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
                 mgmt_driver=mgmt_driver)
             context.session.add(template_db)
             for (key, value) in template.get('attributes', {}).items():
+                blob_hash = None
+                if key in TEMPLATE_BLOB_KEYS and value is not None:
+                    blob_hash = self._write_template_blob(context, value)
+                    value = None
                 attribute_db = DeviceTemplateAttribute(
                     id=str(uuid.uuid4()),
                     template_id=template_id,
                     key=key,
-                    value=value)
+                    value=value,
+                    blob_hash=blob_hash)
                 context.session.add(attribute_db)
             for service_type in (item['service_type']
                                  for item in template['service_types']):
@@ -425,7 +605,8 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
 
         LOG.debug(_('template_db %(template_db)s %(attributes)s '),
                   {'template_db': template_db,
-                   'attributes': template_db.attributes})
+                   'attributes': call_log.Deferred(
+                       lambda: template_db.attributes)})
         return self._make_template_dict(template_db)
 
     def update_device_template(self, context, device_template_id,
@@ -434,6 +615,7 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
             template_db = self._get_resource(context, DeviceTemplate,
                                              device_template_id)
             template_db.update(device_template['device_template'])
+        self._template_cache.pop(device_template_id)
         return self._make_template_dict(template_db)
 
     def delete_device_template(self, context, device_template_id):
@@ -448,11 +630,65 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
 
             context.session.query(ServiceType).filter_by(
                 template_id=device_template_id).delete()
+            blob_hashes = [
+                blob_hash for (blob_hash,) in
+                context.session.query(DeviceTemplateAttribute.blob_hash).
+                filter_by(template_id=device_template_id).
+                filter(DeviceTemplateAttribute.blob_hash.isnot(None))]
             context.session.query(DeviceTemplateAttribute).filter_by(
                 template_id=device_template_id).delete()
+            self._delete_template_blobs(context, blob_hashes)
             template_db = self._get_resource(context, DeviceTemplate,
                                              device_template_id)
             context.session.delete(template_db)
+        self._template_cache.pop(device_template_id)
+
+    def _write_template_blob(self, context, value):
+        """Store value unless a template already did.
+
+        Return the hash template attributes reference it by.
+        """
+        blob_hash = _blob_hash(value)
+        with context.session.begin(subtransactions=True):
+            # the lock keeps _delete_template_blobs() from removing the
+            # blob until the referencing attribute is committed
+            query = (context.session.query(DeviceTemplateBlob.hash).
+                     filter(DeviceTemplateBlob.hash == blob_hash).
+                     with_lockmode('update'))
+            if not query.first():
+                # a blob stored meanwhile by another template is no error
+                context.session.execute(
+                    DeviceTemplateBlob.__table__.insert().
+                    prefix_with('IGNORE', dialect='mysql').
+                    prefix_with('OR IGNORE', dialect='sqlite'),
+                    {'hash': blob_hash, 'value': value})
+                query.one()
+        return blob_hash
+
+    def _delete_template_blobs(self, context, blob_hashes):
+        # only the blobs no other template references
+        if not blob_hashes:
+            return
+        with context.session.begin(subtransactions=True):
+            blob_hashes = [
+                blob_hash for (blob_hash,) in
+                context.session.query(DeviceTemplateBlob.hash).
+                filter(DeviceTemplateBlob.hash.in_(blob_hashes)).
+                with_lockmode('update')]
+            if not blob_hashes:
+                return
+            # a locking read sees the references committed by templates
+            # created since this transaction started
+            referenced = set(
+                blob_hash for (blob_hash,) in
+                context.session.query(DeviceTemplateAttribute.blob_hash).
+                filter(DeviceTemplateAttribute.blob_hash.in_(blob_hashes)).
+                with_lockmode('read'))
+            unreferenced = set(blob_hashes) - referenced
+            if unreferenced:
+                (context.session.query(DeviceTemplateBlob).
+                 filter(DeviceTemplateBlob.hash.in_(unreferenced)).
+                 delete(synchronize_session=False))
 
     def get_device_template(self, context, device_template_id, fields=None):
         template_db = self._get_resource(context, DeviceTemplate,
@@ -493,18 +729,94 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
     ###########################################################################
     # hosting device
 
-    def _device_attribute_update_or_create(
-            self, context, device_id, key, value):
-        arg = (self._model_query(context, DeviceAttribute).
-            filter(DeviceAttribute.device_id == device_id).
-            filter(DeviceAttribute.key == key).first())
-        if arg:
-            arg.value = value
-        else:
-            arg = DeviceAttribute(
-                id=str(uuid.uuid4()), device_id=device_id,
-                key=key, value=value)
-            context.session.add(arg)
+    def _write_device_attributes(self, context, device_id, dev_attrs,
+                                 delete_stale=False):
+        """Make the attributes of the device match dev_attrs.
+
+        The current attributes are read with one SELECT and diffed in
+        memory. The difference is written with one multi-row INSERT, one
+        batched UPDATE and, with delete_stale, one DELETE of the keys not
+        in dev_attrs, whatever the number of attributes.
+        """
+        table = DeviceAttribute.__table__
+        with context.session.begin(subtransactions=True):
+            current = dict(
+                (key, (attr_id, value)) for attr_id, key, value in
+                context.session.query(DeviceAttribute.id,
+                                      DeviceAttribute.key,
+                                      DeviceAttribute.value).
+                filter(DeviceAttribute.device_id == device_id))
+            inserts = [{'id': str(uuid.uuid4()), 'device_id': device_id,
+                        'key': key, 'value': value}
+                       for key, value in dev_attrs.items()
+                       if key not in current]
+            updates = [{'attr_id': current[key][0], 'new_value': value}
+                       for key, value in dev_attrs.items()
+                       if key in current and current[key][1] != value]
+            stale = []
+            if delete_stale:
+                stale = [attr_id for key, (attr_id, _value) in current.items()
+                         if key not in dev_attrs]
+            if inserts:
+                context.session.execute(table.insert(), inserts)
+            if updates:
+                context.session.execute(
+                    table.update().
+                    where(table.c.id == sa.bindparam('attr_id')).
+                    values(value=sa.bindparam('new_value')), updates)
+            if stale:
+                context.session.execute(
+                    table.delete().where(table.c.id.in_(stale)))
+            if inserts or updates or stale:
+                self._touch_device(context, device_id)
+        if inserts or updates or stale:
+            self._expire_device_attributes(context, device_id)
+
+    def _touch_device(self, context, device_id, load=0):
+        # for a write to the rows of the device dict rather than the device,
+        # load is the change of the number of bound service instances
+        self._device_cache.pop(device_id)
+        values = {'version': Device.version + 1}
+        if load:
+            values['load'] = Device.load + load
+        (context.session.query(Device).filter(Device.id == device_id).
+         update(values))
+
+    def _expire_device_attributes(self, context, device_id,
+                                  relationship='attributes'):
+        # the statements above bypass the session, do not let a device
+        # loaded before them serve its old attributes
+        device_db = context.session.identity_map.get(
+            orm_util.identity_key(Device, device_id))
+        if device_db is None:
+            return
+        for attr_db in device_db.__dict__.get(relationship, []):
+            context.session.expire(attr_db)
+        context.session.expire(device_db, [relationship])
+
+    def _write_mgmt_endpoints(self, context, device_id, mgmt_url):
+        """Replace the management endpoints of the device with mgmt_url.
+
+        Return the endpoints, decoded once and written with one DELETE
+        and one multi-row INSERT.
+        """
+        endpoints = mgmt_endpoints(mgmt_url)
+        table = DeviceMgmtEndpoint.__table__
+        with context.session.begin(subtransactions=True):
+            context.session.execute(
+                table.delete().where(table.c.device_id == device_id))
+            if endpoints:
+                context.session.execute(table.insert(), [
+                    dict(endpoint, id=str(uuid.uuid4()), device_id=device_id)
+                    for endpoint in endpoints])
+            self._touch_device(context, device_id)
+        self._expire_device_attributes(context, device_id, 'mgmt_endpoints')
+        return endpoints
+
+    def _get_device_ids_by_mgmt_ip(self, context, ip):
+        return [device_id for (device_id,) in
+                context.session.query(DeviceMgmtEndpoint.device_id).
+                filter(DeviceMgmtEndpoint.ip == ip).distinct()]
 
     # called internally, not by REST API
     def _create_device_pre(self, context, device):
@@ -525,7 +837,8 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
                                description=template_db.description,
                                instance_id=None,
                                template_id=template_id,
-                               status=constants.PENDING_CREATE)
+                               status=constants.PENDING_CREATE,
+                               internal=_is_internal_id(device_id))
             context.session.add(device_db)
             for key, value in attributes.items():
                 arg = DeviceAttribute(
@@ -561,13 +874,13 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
                      filter(Device.id == device_id).
                      filter(Device.status == constants.PENDING_CREATE).
                      one())
-            query.update({'instance_id': instance_id, 'mgmt_url': mgmt_url})
-            if instance_id is None:
-                query.update({'status': constants.ERROR})
+            query.update({'instance_id': instance_id, 'mgmt_url': mgmt_url,
+                          'version': Device.version + 1})
+            device_dict['mgmt_endpoints'] = self._write_mgmt_endpoints(
+                context, device_id, mgmt_url)
 
-            for (key, value) in device_dict['attributes'].items():
-                self._device_attribute_update_or_create(context, device_id,
-                                                        key, value)
+            self._write_device_attributes(context, device_id,
+                                          device_dict['attributes'])
 
             for sc_entry in device_dict['service_context']:
                 # some member of service context is determined during
@@ -580,26 +893,52 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
                             'router_id': sc_entry['router_id'],
                             'role': sc_entry['role'],
                             'index': sc_entry['index']}))
-
-    def _create_device_status(self, context, device_id, new_status):
+        if instance_id is None:
+            self._transition_device_status(context, device_id,
+                                           constants.PENDING_CREATE,
+                                           constants.ERROR)
+
+    def _create_device_instance(self, context, device_id, instance_id):
+        # record the instance as soon as the driver returns it so that a
+        # device left in PENDING_CREATE can still be reconciled with it
         with context.session.begin(subtransactions=True):
             (self._model_query(context, Device).
                 filter(Device.id == device_id).
                 filter(Device.status == constants.PENDING_CREATE).
-                update({'status': new_status}))
+                update({'instance_id': instance_id,
+                        'version': Device.version + 1}))
+
+    def _create_device_status(self, context, device_id, new_status):
+        return self._transition_device_status(
+            context, device_id, constants.PENDING_CREATE, new_status)
+
+    def _transition_device_status(self, context, device_id, current_status,
+                                  new_status):
+        """Move the device from current_status to new_status.
+
+        Return whether the device was in current_status. Plugins may
+        override it to coalesce the transitions of concurrent operations.
+        """
+        return device_id in self._bulk_update_device_status(
+            context, [device_id], current_status, new_status)
 
     def _get_device_db(self, context, device_id, current_statuses, new_status):
-        try:
-            device_db = (
-                self._model_query(context, Device).
-                filter(Device.id == device_id).
-                filter(Device.status.in_(current_statuses)).
-                with_lockmode('update').one())
-        except orm_exc.NoResultFound:
+        # a conditional UPDATE rather than SELECT ... FOR UPDATE, the row is
+        # only locked for the duration of the statement
+        statuses = [status for status in current_statuses
+                    if status != constants.PENDING_UPDATE]
+        query = self._model_query(context, Device).filter(
+            Device.id == device_id)
+        count = (query.filter(Device.status.in_(statuses)).
+                 update({'status': new_status,
+                         'version': Device.version + 1},
+                        synchronize_session=False))
+        device_db = query.populate_existing().first()
+        if not count:
+            if (device_db is not None and
+                    device_db.status == constants.PENDING_UPDATE):
+                raise vnfm.DeviceInUse(device_id=device_id)
             raise vnfm.DeviceNotFound(device_id=device_id)
-        if device_db.status == constants.PENDING_UPDATE:
-            raise vnfm.DeviceInUse(device_id=device_id)
-        device_db.update({'status': new_status})
         return device_db
 
     def _update_device_pre(self, context, device_id):
@@ -609,22 +948,25 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
         return self._make_device_dict(device_db)
 
     def _update_device_post(self, context, device_id, new_status,
-                            new_device_dict=None):
-        with context.session.begin(subtransactions=True):
-            (self._model_query(context, Device).
-             filter(Device.id == device_id).
-             filter(Device.status == constants.PENDING_UPDATE).
-             update({'status': new_status}))
-
-            dev_attrs = new_device_dict.get('attributes', {})
-            (context.session.query(DeviceAttribute).
-             filter(DeviceAttribute.device_id == device_id).
-             filter(~DeviceAttribute.key.in_(dev_attrs.keys())).
-             delete(synchronize_session='fetch'))
-
-            for (key, value) in dev_attrs.items():
-                self._device_attribute_update_or_create(context, device_id,
-                                                        key, value)
+                            new_device_dict=None, mgmt_url=None):
+        if new_device_dict is not None:
+            self._write_device_attributes(
+                context, device_id, new_device_dict.get('attributes', {}),
+                delete_stale=True)
+        if mgmt_url is not None:
+            with context.session.begin(subtransactions=True):
+                count = (self._model_query(context, Device).
+                         filter(Device.id == device_id).
+                         filter(Device.status == constants.PENDING_UPDATE).
+                         update({'mgmt_url': mgmt_url,
+                                 'version': Device.version + 1}))
+                if count:
+                    endpoints = self._write_mgmt_endpoints(
+                        context, device_id, mgmt_url)
+                    if new_device_dict is not None:
+                        new_device_dict['mgmt_endpoints'] = endpoints
+        return self._transition_device_status(
+            context, device_id, constants.PENDING_UPDATE, new_status)
 
     def _delete_device_pre(self, context, device_id):
         with context.session.begin(subtransactions=True):
@@ -640,19 +982,101 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
         return self._make_device_dict(device_db)
 
     def _delete_device_post(self, context, device_id, error):
+        if error:
+            self._transition_device_status(context, device_id,
+                                           constants.PENDING_DELETE,
+                                           constants.ERROR)
+            return
         with context.session.begin(subtransactions=True):
             query = (
                 self._model_query(context, Device).
                 filter(Device.id == device_id).
                 filter(Device.status == constants.PENDING_DELETE))
-            if error:
-                query.update({'status': constants.ERROR})
-            else:
-                (self._model_query(context, DeviceAttribute).
-                 filter(DeviceAttribute.device_id == device_id).delete())
-                (self._model_query(context, DeviceServiceContext).
-                 filter(DeviceServiceContext.device_id == device_id).delete())
-                query.delete()
+            (self._model_query(context, DeviceAttribute).
+             filter(DeviceAttribute.device_id == device_id).delete())
+            (self._model_query(context, DeviceMgmtEndpoint).
+             filter(DeviceMgmtEndpoint.device_id == device_id).delete())
+            (self._model_query(context, DeviceServiceContext).
+             filter(DeviceServiceContext.device_id == device_id).delete())
+            query.delete()
+        self._device_cache.pop(device_id)
+
+    # called internally by the reconciler, not by REST API
+    def _get_pending_devices(self, context, marker, limit):
+        """Return the next page of devices in a PENDING_* status.
+
+        Rows are (id, status, instance_id, infra_driver) ordered by id and
+        start after the marker id, so the scan walks the status index.
+        """
+        query = (context.session.query(Device.id, Device.status,
+                                       Device.instance_id,
+                                       DeviceTemplate.infra_driver).
+                 join(DeviceTemplate,
+                      Device.template_id == DeviceTemplate.id).
+                 filter(Device.status.in_(_PENDING)))
+        if marker is not None:
+            query = query.filter(Device.id > marker)
+        return query.order_by(Device.id).limit(limit).all()
+
+    def _bulk_update_device_status(self, context, device_ids,
+                                   current_status, new_status):
+        """Move the devices of device_ids from current_status to new_status.
+
+        Return the ids of the devices which transitioned.
+        """
+        if not device_ids:
+            return []
+        with context.session.begin(subtransactions=True):
+            candidates = [
+                device_id for (device_id,) in
+                context.session.query(Device.id).
+                filter(Device.id.in_(device_ids)).
+                filter(Device.status == current_status)]
+            if not candidates:
+                return []
+            count = (context.session.query(Device).
+                     filter(Device.id.in_(candidates)).
+                     filter(Device.status == current_status).
+                     update({'status': new_status,
+                             'version': Device.version + 1},
+                            synchronize_session=False))
+            if count != len(candidates):
+                # another writer moved some of them in the meantime
+                candidates = [
+                    device_id for (device_id,) in
+                    context.session.query(Device.id).
+                    filter(Device.id.in_(candidates)).
+                    filter(Device.status == new_status)]
+        return candidates
+
+    def _bulk_delete_devices(self, context, device_ids):
+        """Purge the devices of device_ids still in PENDING_DELETE."""
+        if not device_ids:
+            return 0
+        with context.session.begin(subtransactions=True):
+            device_ids = [
+                device_id for (device_id,) in
+                context.session.query(Device.id).
+                filter(Device.id.in_(device_ids)).
+                filter(Device.status == constants.PENDING_DELETE).
+                with_lockmode('update')]
+            if not device_ids:
+                return 0
+            (context.session.query(DeviceAttribute).
+             filter(DeviceAttribute.device_id.in_(device_ids)).
+             delete(synchronize_session=False))
+            (context.session.query(DeviceMgmtEndpoint).
+             filter(DeviceMgmtEndpoint.device_id.in_(device_ids)).
+             delete(synchronize_session=False))
+            (context.session.query(DeviceServiceContext).
+             filter(DeviceServiceContext.device_id.in_(device_ids)).
+             delete(synchronize_session=False))
+            count = (context.session.query(Device).
+                     filter(Device.id.in_(device_ids)).
+                     delete(synchronize_session=False))
+        for device_id in device_ids:
+            self._device_cache.pop(device_id)
+        return count
 
     # reference implementation. needs to be overrided by subclass
     def create_device(self, context, device):
@@ -690,26 +1114,23 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
         return self._make_device_dict(device_db, fields)
 
     def get_devices(self, context, filters=None, fields=None):
-        devices = self._get_collection(context, Device, self._make_device_dict,
-                                    filters=filters, fields=fields)
-        # Ugly hack to mask internaly used record
-        return [device for device in devices
-                if uuidutils.is_uuid_like(device['id'])]
+        query = (self._get_collection_query(context, Device, filters).
+                 filter(Device.internal == sa.false()))
+        return [self._make_device_dict(device_db, fields)
+                for device_db in query]
 
     def _mark_device_status(self, device_id, exclude_status, new_status):
         context = t_context.get_admin_context()
         with context.session.begin(subtransactions=True):
-            try:
-                device_db = (
-                    self._model_query(context, Device).
-                    filter(Device.id == device_id).
-                    filter(~Device.status.in_(exclude_status)).
-                    with_lockmode('update').one())
-            except orm_exc.NoResultFound:
-                LOG.warn(_('no device found %s'), device_id)
-                return False
-
-            device_db.update({'status': new_status})
+            count = (self._model_query(context, Device).
+                     filter(Device.id == device_id).
+                     filter(~Device.status.in_(exclude_status)).
+                     update({'status': new_status,
+                             'version': Device.version + 1},
+                            synchronize_session=False))
+        if not count:
+            LOG.warn(_('no device found %s'), device_id)
+            return False
         return True
 
     def _mark_device_error(self, device_id):
@@ -728,26 +1149,28 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
             device_id, exclude_status, constants.DEAD)
 
     # used by failure policy
-    def rename_device_id(self, context, device_id, new_device_id):
-        # ugly hack...
-        context = t_context.get_admin_context()
-        with context.session.begin(subtransactions=True):
-            device_db = self._get_resource(context, Device, device_id)
-            new_device_db = Device(
-                id=new_device_id,
-                tenant_id=device_db.tenant_id,
-                template_id=device_db.template_id,
-                name=device_db.name,
-                description=device_db.description,
-                instance_id=device_db.instance_id,
-                mgmt_url=device_db.mgmt_url,
-                status=device_db.status)
-            context.session.add(new_device_db)
+    def _replace_device_instance(self, context, device_id, dead_instance_id,
+                                 instance_id, mgmt_url, dev_attrs):
+        """Move the DEAD device from dead_instance_id to instance_id.
 
-            (self._model_query(context, DeviceAttribute).
-             filter(DeviceAttribute.device_id == device_id).
-             update({'device_id': new_device_id}))
-            context.session.delete(device_db)
+        The device keeps its row, the instance, management url and
+        attributes are swapped in one transaction. Return False when the
+        device was deleted or is no longer on dead_instance_id.
+        """
+        with context.session.begin(subtransactions=True):
+            count = (self._model_query(context, Device).
+                     filter(Device.id == device_id).
+                     filter(Device.status == constants.DEAD).
+                     filter(Device.instance_id == dead_instance_id).
+                     update({'instance_id': instance_id,
+                             'mgmt_url': mgmt_url,
+                             'status': constants.ACTIVE,
+                             'version': Device.version + 1}))
+            if count:
+                self._write_mgmt_endpoints(context, device_id, mgmt_url)
+                self._write_device_attributes(context, device_id, dev_attrs,
+                                              delete_stale=True)
+        return bool(count)
 
     ###########################################################################
     # logical service instance
@@ -792,6 +1215,7 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
             binding_db = ServiceDeviceBinding(
                 service_instance_id=service_instance_id, device_id=device_id)
             context.session.add(binding_db)
+            self._touch_device(context, device_id, load=1)
 
         return self._make_service_instance_dict(instance_db)
 
@@ -876,6 +1300,7 @@ class VNFMPluginDb(vnfm.VNFMPluginBase, db_base.CommonDbMixin):
             assert binding_db
             assert len(binding_db) == 1
             context.session.delete(binding_db[0])
+            self._touch_device(context, binding_db[0].device_id, load=-1)
 
             (self._model_query(context, ServiceInstance).
              filter(ServiceInstance.id == service_instance_id).
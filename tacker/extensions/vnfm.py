@@ -61,6 +61,23 @@ class DeviceCreateWaitFailed(exceptions.TackerException):
     message = _('waiting for creation of device %(device_id)s failed')
 
 
+class DeviceUpdateWaitFailed(exceptions.TackerException):
+    message = _('waiting for update of device %(device_id)s failed')
+
+
+class DeviceNotScalable(exceptions.InvalidInput):
+    message = _('device %(device_id)s has no vdu which can be scaled')
+
+
+class DeviceScaleInvalid(exceptions.InvalidInput):
+    message = _('invalid scale: %(msg)s')
+
+
+class ScalableVDUAddresses(exceptions.InvalidInput):
+    message = _('fixed addresses can not be given to the network '
+                'interfaces of vdu %(vdu_id)s which has a count')
+
+
 class DeviceDeleteFailed(exceptions.TackerException):
     message = _('deleting device %(device_id)s failed')
 
@@ -90,6 +107,14 @@ class ServiceInstanceNotFound(exceptions.NotFound):
     message = _('service instance %(service_instance_id)s could not be found')
 
 
+class LifecycleTaskNotFound(exceptions.NotFound):
+    message = _('lifecycle task %(task_id)s could not be found')
+
+
+class LifecycleOperationNotFound(exceptions.NotFound):
+    message = _('lifecycle operation %(operation)s could not be found')
+
+
 class ParamYAMLNotWellFormed(exceptions.InvalidInput):
     message = _("Parameter YAML not well formed - %(error_msg_details)s")
 
@@ -419,6 +444,94 @@ RESOURCE_ATTRIBUTE_MAP = {
             'is_visible': True,
         },
     },
+
+    'lifecycle_tasks': {
+        'id': {
+            'allow_post': False,
+            'allow_put': False,
+            'primary_key': True,
+            'is_visible': True,
+        },
+        'operation': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'device_id': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'status': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'steps': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'attempts': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'run_at': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'lease_owner': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'lease_expires_at': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'last_error': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+    },
+
+    'lifecycle_operations': {
+        'id': {
+            'allow_post': False,
+            'allow_put': False,
+            'primary_key': True,
+            'is_visible': True,
+        },
+        'limit': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'queued': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'running': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'failed': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+        'worker_stats': {
+            'allow_post': False,
+            'allow_put': False,
+            'is_visible': True,
+        },
+    },
 }
 
 
@@ -451,9 +564,10 @@ class Vnfm(extensions.ExtensionDescriptor):
         plural_mappings['service_types'] = 'service_type'
         plural_mappings['service_contexts'] = 'service_context'
         attr.PLURALS.update(plural_mappings)
+        action_map = {'vnf': {'scale_vnf': 'PUT'}}
         return resource_helper.build_resource_info(
             plural_mappings, RESOURCE_ATTRIBUTE_MAP, constants.VNFM,
-            translate_name=True)
+            action_map=action_map, translate_name=True)
 
     @classmethod
     def get_plugin_interface(cls):
@@ -516,6 +630,10 @@ class VNFMPluginBase(NFVPluginBase):
     def delete_vnf(self, context, vnf_id):
         pass
 
+    @abc.abstractmethod
+    def scale_vnf(self, context, vnf_id, scale):
+        pass
+
     @abc.abstractmethod
     def create_device_template(self, context, device_template):
         pass
@@ -552,3 +670,19 @@ class VNFMPluginBase(NFVPluginBase):
     @abc.abstractmethod
     def delete_device(self, context, device_id):
         pass
+
+    @abc.abstractmethod
+    def get_lifecycle_tasks(self, context, filters=None, fields=None):
+        pass
+
+    @abc.abstractmethod
+    def get_lifecycle_task(self, context, id, fields=None):
+        pass
+
+    @abc.abstractmethod
+    def get_lifecycle_operations(self, context, filters=None, fields=None):
+        pass
+
+    @abc.abstractmethod
+    def get_lifecycle_operation(self, context, id, fields=None):
+        pass
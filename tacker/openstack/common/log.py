@@ -35,6 +35,7 @@ import logging.handlers
 import os
 import re
 import sys
+import time
 import traceback
 
 from oslo_config import cfg
@@ -46,6 +47,8 @@ from tacker.openstack.common import importutils
 from tacker.openstack.common import jsonutils
 from tacker.openstack.common import local
 
+eventlet_patcher = importutils.try_import('eventlet.patcher')
+
 
 _DEFAULT_LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
@@ -55,16 +58,21 @@ _SANITIZE_KEYS = ['adminPass', 'admin_pass', 'password', 'admin_password']
 # _SANITIZE_KEYS we already have. This way, we only have to add the new key
 # to the list of _SANITIZE_KEYS and we can generate regular expressions
 # for XML and JSON automatically.
-_SANITIZE_PATTERNS = []
 _FORMAT_PATTERNS = [r'(%(key)s\s*[=]\s*[\"\']).*?([\"\'])',
                     r'(<%(key)s>).*?(</%(key)s>)',
                     r'([\"\']%(key)s[\"\']\s*:\s*[\"\']).*?([\"\'])',
                     r'([\'"].*?%(key)s[\'"]\s*:\s*u?[\'"]).*?([\'"])']
 
-for key in _SANITIZE_KEYS:
-    for pattern in _FORMAT_PATTERNS:
-        reg_ex = re.compile(pattern % {'key': key}, re.DOTALL)
-        _SANITIZE_PATTERNS.append(reg_ex)
+# NOTE: all patterns are compiled into a single alternation so a message is
+# scanned once.  Every alternative has exactly two groups, the text before
+# and after the secret, so the last matched group identifies the pair.
+_SANITIZE_KEYS_ALTERNATION = '(?:%s)' % '|'.join(
+    re.escape(key) for key in _SANITIZE_KEYS)
+_SANITIZE_PATTERN = re.compile(
+    '|'.join(pattern % {'key': _SANITIZE_KEYS_ALTERNATION}
+             for pattern in _FORMAT_PATTERNS), re.DOTALL)
+# cheap pre-check; most messages contain none of the keys
+_SANITIZE_KEYS_PATTERN = re.compile(_SANITIZE_KEYS_ALTERNATION)
 
 
 common_cli_opts = [
@@ -161,6 +169,18 @@ log_opts = [
     cfg.BoolOpt('fatal_deprecations',
                 default=False,
                 help='make deprecations fatal'),
+    cfg.BoolOpt('use_async_logging',
+                default=False,
+                help='Format and write log records from a dedicated thread '
+                     'instead of the thread that logs them'),
+    cfg.IntOpt('async_log_queue_size',
+               default=10000,
+               help='Maximum number of log records waiting to be written '
+                    'when use_async_logging is set. Debug records are '
+                    'sampled and then dropped when the queue fills up'),
+    cfg.BoolOpt('use_json_logging',
+                default=False,
+                help='Write log records as JSON lines'),
 
     # NOTE(mikal): there are two options here because sometimes we are handed
     # a full instance (and could include more information), and other times we
@@ -256,17 +276,86 @@ def mask_password(message, secret="***"):
     # NOTE(ldbragst): Check to see if anything in message contains any key
     # specified in _SANITIZE_KEYS, if not then just return the message since
     # we don't have to mask any passwords.
-    if not any(key in message for key in _SANITIZE_KEYS):
+    if not _SANITIZE_KEYS_PATTERN.search(message):
         return message
 
-    secret = r'\g<1>' + secret + r'\g<2>'
-    for pattern in _SANITIZE_PATTERNS:
-        message = re.sub(pattern, secret, message)
-    return message
+    def _replace(match):
+        end = match.lastindex
+        return match.group(end - 1) + secret + match.group(end)
+    return _SANITIZE_PATTERN.sub(_replace, message)
+
+
+def _mask_structure(value, secret):
+    """Mask the values of sensitive keys in nested dicts and sequences.
+
+    Returns a tuple (value, opaque).  Strings are masked with
+    mask_password(), other objects are returned unchanged and flag the
+    result as opaque since their formatted form may still hold secrets.
+    """
+    if isinstance(value, dict):
+        masked = {}
+        opaque = False
+        for key, item in six.iteritems(value):
+            if (isinstance(key, six.string_types) and
+                    _SANITIZE_KEYS_PATTERN.search(key)):
+                masked[key] = secret
+                continue
+            masked[key], item_opaque = _mask_structure(item, secret)
+            opaque = opaque or item_opaque
+        return masked, opaque
+    if isinstance(value, (list, tuple)):
+        items = [_mask_structure(item, secret) for item in value]
+        masked = [item for item, _opaque in items]
+        if isinstance(value, list):
+            masked = type(value)(masked)
+        elif hasattr(type(value), '_fields'):
+            # namedtuples take their items as arguments
+            masked = type(value)(*masked)
+        else:
+            masked = tuple(masked)
+        return masked, any(opaque for _item, opaque in items)
+    if isinstance(value, six.string_types):
+        if _SANITIZE_KEYS_PATTERN.search(value):
+            return mask_password(value, secret), False
+        return value, False
+    if value is None or isinstance(value, (bool, float) +
+                                   six.integer_types):
+        return value, False
+    return value, True
+
+
+class MaskPasswordFilter(logging.Filter):
+    """Mask passwords in records which are actually emitted by a handler.
+
+    Structured arguments (dicts, lists, strings, numbers) are masked by key
+    without formatting them; only records with other objects among their
+    arguments are formatted and scanned as a whole.
+    """
+
+    def filter(self, record):
+        if record.args:
+            args, opaque = _mask_structure(record.args, '***')
+            if opaque:
+                message = record.getMessage()
+                if _SANITIZE_KEYS_PATTERN.search(message):
+                    record.msg = mask_password(message)
+                    record.args = None
+                return True
+            record.args = args
+        if (isinstance(record.msg, six.string_types) and
+                _SANITIZE_KEYS_PATTERN.search(record.msg)):
+            record.msg = mask_password(record.msg)
+        return True
 
 
 class BaseLoggerAdapter(logging.LoggerAdapter):
 
+    def debug(self, msg, *args, **kwargs):
+        # NOTE: LoggerAdapter calls process() before the logger checks the
+        #       level, so skip it early for the common disabled case.
+        if self.isEnabledFor(logging.DEBUG):
+            super(BaseLoggerAdapter, self).debug(msg, *args, **kwargs)
+
     def audit(self, msg, *args, **kwargs):
         self.log(logging.AUDIT, msg, *args, **kwargs)
 
@@ -424,6 +513,18 @@ def setup(product_name):
         _load_log_config(CONF.log_config_append)
     else:
         _setup_logging_from_conf()
+    log_root = getLogger(None).logger
+    mask_filter = MaskPasswordFilter()
+    for handler in log_root.handlers:
+        handler.addFilter(mask_filter)
+    if CONF.use_async_logging:
+        # NOTE: the async handler masks records itself before it renders
+        # their message in the logging thread.
+        async_handler = AsyncHandler(log_root.handlers,
+                                     CONF.async_log_queue_size)
+        for handler in list(log_root.handlers):
+            log_root.removeHandler(handler)
+        log_root.addHandler(async_handler)
     sys.excepthook = _create_logging_excepthook(product_name)
 
 
@@ -493,7 +594,9 @@ def _setup_logging_from_conf():
     for handler in log_root.handlers:
         # NOTE(alaski): CONF.log_format overrides everything currently.  This
         # should be deprecated in favor of context aware formatting.
-        if CONF.log_format:
+        if CONF.use_json_logging:
+            handler.setFormatter(JSONFormatter(datefmt=datefmt))
+        elif CONF.log_format:
             handler.setFormatter(logging.Formatter(fmt=CONF.log_format,
                                                    datefmt=datefmt))
             log_root.info('Deprecated: log_format is now deprecated and will '
@@ -619,6 +722,132 @@ class ColorHandler(logging.StreamHandler):
         return logging.StreamHandler.format(self, record)
 
 
+def _original(module_name):
+    # NOTE: the writer must be a native thread even when eventlet has
+    # monkey patched threading, otherwise a stalled write still blocks
+    # the hub and every green thread with it.
+    if eventlet_patcher is not None:
+        return eventlet_patcher.original(module_name)
+    return importutils.import_module(module_name)
+
+
+class AsyncHandler(logging.Handler):
+    """Hand records over to a dedicated thread which writes them.
+
+    The message of a record is masked and rendered by the logging thread,
+    so lazy arguments are evaluated there and never by the writer thread,
+    which formats the record and passes it to the wrapped handlers.  Once
+    the queue is three quarters full only one in SAMPLE_RATE debug records
+    is queued; when it is full records below WARNING are dropped and the
+    others wait up to WARNING_WAIT seconds for room before they are
+    dropped too.  Dropped records are counted in ``dropped`` and reported
+    by the writer.
+    """
+
+    SAMPLE_RATE = 10
+    WARNING_WAIT = 1.0
+
+    def __init__(self, handlers, maxsize=10000):
+        logging.Handler.__init__(self)
+        threading = _original('threading')
+        queue = _original(moves.queue.__name__)
+        self.handlers = list(handlers)
+        for handler in self.handlers:
+            # only the writer thread uses them from now on
+            handler.lock = threading.RLock()
+        self.dropped = 0
+        self._reported = 0
+        self._mask = MaskPasswordFilter()
+        self._sampled = 0
+        self._full = queue.Full
+        self._high_water = max(maxsize * 3 // 4, 1)
+        self._queue = queue.Queue(maxsize)
+        self._writer = threading.Thread(target=self._write,
+                                        name='tacker-log-writer')
+        self._writer.daemon = True
+        self._writer.start()
+
+    def emit(self, record):
+        if (record.levelno <= logging.DEBUG and
+                self._queue.qsize() >= self._high_water):
+            self._sampled += 1
+            if self._sampled % self.SAMPLE_RATE:
+                self.dropped += 1
+                return
+        try:
+            # masking by key has to happen before the arguments are
+            # rendered into the message
+            self._mask.filter(record)
+            record.msg = record.getMessage()
+            record.args = None
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self._queue.put_nowait(record)
+        except self._full:
+            if (record.levelno < logging.WARNING or
+                    not self._wait_for_room(record)):
+                self.dropped += 1
+
+    def _wait_for_room(self, record):
+        # time.sleep() is green once eventlet patched it, unlike a
+        # blocking put() on the native queue it keeps the hub running
+        deadline = time.time() + self.WARNING_WAIT
+        while time.time() < deadline:
+            time.sleep(0.01)
+            try:
+                self._queue.put_nowait(record)
+                return True
+            except self._full:
+                pass
+        return False
+
+    def _handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _report_dropped(self):
+        dropped = self.dropped
+        if dropped == self._reported:
+            return
+        record = logging.LogRecord(
+            'tacker.openstack.common.log', logging.WARNING, __file__, 0,
+            'Dropped %d log records while the log queue was full',
+            (dropped - self._reported,), None)
+        self._reported = dropped
+        self._handle(record)
+
+    def _write(self):
+        while True:
+            record = self._queue.get()
+            try:
+                if record is None:
+                    return
+                self._report_dropped()
+                self._handle(record)
+            except Exception:
+                self.handleError(record)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until every queued record has been written."""
+        if self._writer.is_alive():
+            self._queue.join()
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        for handler in self.handlers:
+            handler.close()
+        logging.Handler.close(self)
+
+
 class DeprecatedConfig(Exception):
     message = _("Fatal call to deprecated config: %(msg)s")
 
@@ -11,12 +11,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
 import time
 
+import eventlet
 from oslo_config import cfg
 import six
 
-from tacker.openstack.common.gettextutils import _, _LE, _LI
+from tacker.openstack.common.gettextutils import _, _LE, _LI, _LW
 from tacker.openstack.common import log as logging
 
 
@@ -25,6 +27,15 @@ periodic_opts = [
                 default=True,
                 help='Some periodic tasks can be run in a separate process. '
                      'Should we run them here?'),
+    cfg.IntOpt('periodic_task_workers',
+               default=1,
+               help='Number of periodic tasks which may run concurrently. '
+                    'With 1 the due tasks run one after the other.'),
+    cfg.IntOpt('periodic_task_timeout',
+               default=0,
+               help='Seconds after which a running periodic task is '
+                    'cancelled unless the task sets its own timeout. '
+                    '0 disables the timeout.'),
 ]
 
 CONF = cfg.CONF
@@ -56,6 +67,9 @@ def periodic_task(*args, **kwargs):
            run_immediately is omitted or set to 'False', the first time the
            task runs will be approximately N seconds after the task scheduler
            starts.
+
+    A timeout=N argument cancels a run of the task which takes more than N
+    seconds, overriding the periodic_task_timeout option.
     """
     def decorator(f):
         # Test for old style invocation
@@ -73,6 +87,7 @@ def periodic_task(*args, **kwargs):
         # Control frequency
         f._periodic_spacing = kwargs.pop('spacing', 0)
         f._periodic_immediate = kwargs.pop('run_immediately', False)
+        f._periodic_timeout = kwargs.pop('timeout', None)
         if f._periodic_immediate:
             f._periodic_last_run = None
         else:
@@ -142,17 +157,70 @@ class _PeriodicTasksMeta(type):
                 cls._periodic_spacing[name] = task._periodic_spacing
 
 
+class PeriodicTaskStats(object):
+    """Run counters and a runtime histogram of one periodic task."""
+
+    # upper bounds in seconds of the histogram buckets, the last bucket
+    # counts the runs taking longer than all of them
+    BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.histogram = [0] * (len(self.BUCKETS) + 1)
+
+    def record(self, runtime):
+        self.runs += 1
+        self.total_time += runtime
+        self.max_time = max(self.max_time, runtime)
+        self.histogram[bisect.bisect_left(self.BUCKETS, runtime)] += 1
+
+    def to_dict(self):
+        bounds = ['<=%s' % bound for bound in self.BUCKETS]
+        bounds.append('>%s' % self.BUCKETS[-1])
+        return {'runs': self.runs,
+                'failures': self.failures,
+                'timeouts': self.timeouts,
+                'skipped': self.skipped,
+                'total_time': self.total_time,
+                'max_time': self.max_time,
+                'histogram': dict(zip(bounds, self.histogram))}
+
+
 @six.add_metaclass(_PeriodicTasksMeta)
 class PeriodicTasks(object):
     def __init__(self):
         super(PeriodicTasks, self).__init__()
         self._periodic_last_run = {}
+        self._periodic_running = set()
+        self._periodic_stats = {}
+        self._periodic_pool = None
         for name, task in self._periodic_tasks:
             self._periodic_last_run[name] = task._periodic_last_run
+            self._periodic_stats[name] = PeriodicTaskStats()
+
+    def get_periodic_task_stats(self):
+        """Return the run statistics of every periodic task by name."""
+        return dict(('.'.join([self.__class__.__name__, name]),
+                     stats.to_dict())
+                    for name, stats in self._periodic_stats.items())
 
     def run_periodic_tasks(self, context, raise_on_error=False):
-        """Tasks to be run at a periodic interval."""
+        """Tasks to be run at a periodic interval.
+
+        With periodic_task_workers above 1 the due tasks are started on a
+        pool of that size and this returns without waiting for them; a task
+        still running from an earlier call is skipped.
+        """
         idle_for = DEFAULT_INTERVAL
+        concurrent = CONF.periodic_task_workers > 1 and not raise_on_error
+        if concurrent and self._periodic_pool is None:
+            self._periodic_pool = eventlet.GreenPool(
+                CONF.periodic_task_workers)
         for task_name, task in self._periodic_tasks:
             full_task_name = '.'.join([self.__class__.__name__, task_name])
 
@@ -167,17 +235,56 @@ class PeriodicTasks(object):
                     idle_for = min(idle_for, delta)
                     continue
 
+            if task_name in self._periodic_running:
+                LOG.debug("Skipping periodic task %(full_task_name)s "
+                          "because its previous run has not finished",
+                          {"full_task_name": full_task_name})
+                self._periodic_stats[task_name].skipped += 1
+                continue
+
             LOG.debug("Running periodic task %(full_task_name)s",
                       {"full_task_name": full_task_name})
             self._periodic_last_run[task_name] = time.time()
 
-            try:
-                task(self, context)
-            except Exception as e:
-                if raise_on_error:
-                    raise
-                LOG.exception(_LE("Error during %(full_task_name)s: %(e)s"),
-                              {"full_task_name": full_task_name, "e": e})
+            self._periodic_running.add(task_name)
+            if concurrent:
+                self._periodic_pool.spawn_n(self._run_periodic_task,
+                                            context, task_name, task,
+                                            full_task_name, False)
+            else:
+                self._run_periodic_task(context, task_name, task,
+                                        full_task_name, raise_on_error)
             time.sleep(0)
 
         return idle_for
+
+    def _run_periodic_task(self, context, task_name, task, full_task_name,
+                           raise_on_error):
+        stats = self._periodic_stats[task_name]
+        timeout = getattr(task, '_periodic_timeout', None)
+        if timeout is None:
+            timeout = CONF.periodic_task_timeout
+        # NOTE: like any eventlet timeout this only fires when the task
+        # yields, e.g. on I/O or sleep.
+        timer = eventlet.Timeout(timeout) if timeout > 0 else None
+        start = time.time()
+        try:
+            task(self, context)
+        except eventlet.Timeout as t:
+            if t is not timer:
+                raise
+            stats.timeouts += 1
+            LOG.warn(_LW("Periodic task %(full_task_name)s cancelled after "
+                         "%(timeout)s seconds"),
+                     {"full_task_name": full_task_name, "timeout": timeout})
+        except Exception as e:
+            stats.failures += 1
+            if raise_on_error:
+                raise
+            LOG.exception(_LE("Error during %(full_task_name)s: %(e)s"),
+                          {"full_task_name": full_task_name, "e": e})
+        finally:
+            if timer is not None:
+                timer.cancel()
+            stats.record(time.time() - start)
+            self._periodic_running.discard(task_name)
@@ -23,6 +23,7 @@ from oslo_config import cfg
 from tacker.common import config
 from tacker.common import rpc_compat
 from tacker import context
+from tacker import manager
 from tacker.openstack.common import excutils
 from tacker.openstack.common import importutils
 from tacker.openstack.common import log as logging
@@ -68,6 +69,14 @@ class WsgiService(object):
     def wait(self):
         self.wsgi_app.wait()
 
+    def stop(self):
+        if self.wsgi_app:
+            self.wsgi_app.stop()
+        # let service plugins finish or hand over their background work
+        for plugin in manager.TackerManager.get_service_plugins().values():
+            if hasattr(plugin, 'drain'):
+                plugin.drain()
+
 
 class TackerApiService(WsgiService):
     """Class for tacker-api service."""
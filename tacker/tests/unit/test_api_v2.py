@@ -1435,3 +1435,69 @@ class CreateResourceTestCase(base.BaseTestCase):
     def test_resource_creation(self):
         resource = v2_base.create_resource('fakes', 'fake', None, {})
         self.assertIsInstance(resource, webob.dec.wsgify)
+
+
+class PrepareRequestBodyTestCase(base.BaseTestCase):
+    attr_info = {
+        'id': {'allow_post': False, 'allow_put': False},
+        'tenant_id': {'allow_post': True, 'allow_put': False},
+        'name': {'allow_post': True, 'allow_put': True,
+                 'validate': {'type:string': None}},
+        'count': {'allow_post': True, 'allow_put': True, 'default': '1',
+                  'convert_to': attributes.convert_to_int},
+    }
+
+    def setUp(self):
+        super(PrepareRequestBodyTestCase, self).setUp()
+        self.context = context.Context('', 'tenant', is_admin=False)
+        self.plan = v2_base.ValidationPlan(self.attr_info)
+
+    def _prepare(self, body, is_create=True):
+        return v2_base.Controller.prepare_request_body(
+            self.context, body, is_create, 'fake', self.attr_info,
+            allow_bulk=True, plan=self.plan)
+
+    def test_create_defaults_and_convert(self):
+        body = self._prepare({'fake': {'name': 'a'}})
+        self.assertEqual({'fake': {'name': 'a', 'count': 1,
+                                   'tenant_id': 'tenant'}}, body)
+
+    def test_create_bulk(self):
+        body = self._prepare({'fakes': [{'name': 'a'},
+                                        {'fake': {'name': 'b',
+                                                  'count': '2'}}]})
+        self.assertEqual([{'fake': {'name': 'a', 'count': 1,
+                                    'tenant_id': 'tenant'}},
+                          {'fake': {'name': 'b', 'count': 2,
+                                    'tenant_id': 'tenant'}}],
+                         body['fakes'])
+
+    def test_create_missing_attr(self):
+        self.assertRaises(exc.HTTPBadRequest, self._prepare,
+                          {'fake': {'count': '2'}})
+
+    def test_create_readonly_attr(self):
+        self.assertRaises(exc.HTTPBadRequest, self._prepare,
+                          {'fake': {'name': 'a', 'id': _uuid()}})
+
+    def test_create_unknown_attr(self):
+        self.assertRaises(exc.HTTPBadRequest, self._prepare,
+                          {'fake': {'name': 'a', 'bogus': 1}})
+
+    def test_create_invalid_value(self):
+        self.assertRaises(exc.HTTPBadRequest, self._prepare,
+                          {'fake': {'name': 1}})
+
+    def test_update_readonly_attr(self):
+        self.assertRaises(exc.HTTPBadRequest, self._prepare,
+                          {'fake': {'tenant_id': 'tenant'}}, False)
+
+    def test_update(self):
+        body = self._prepare({'fake': {'count': '3'}}, False)
+        self.assertEqual({'fake': {'count': 3}}, body)
+
+    def test_plan_built_without_controller(self):
+        body = v2_base.Controller.prepare_request_body(
+            self.context, {'fake': {'name': 'a'}}, True, 'fake',
+            self.attr_info)
+        self.assertEqual(1, body['fake']['count'])
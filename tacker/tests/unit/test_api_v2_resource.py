@@ -24,6 +24,7 @@ import webtest
 
 from tacker.api.v1 import resource as wsgi_resource
 from tacker.common import exceptions as n_exc
+from tacker.common import utils
 from tacker import context
 from tacker.openstack.common import gettextutils
 from tacker.tests import base
@@ -34,6 +35,8 @@ class RequestTestCase(base.BaseTestCase):
     def setUp(self):
         super(RequestTestCase, self).setUp()
         self.req = wsgi_resource.Request({'foo': 'bar'})
+        wsgi._ACCEPT_CACHE.clear()
+        wsgi._LANGUAGE_CACHE.clear()
 
     def test_content_type_missing(self):
         request = wsgi.Request.blank('/tests/123', method='POST')
@@ -121,6 +124,31 @@ class RequestTestCase(base.BaseTestCase):
         language = request.best_match_language()
         self.assertIsNone(language)
 
+    def test_best_match_language_cached(self):
+        with mock.patch.object(gettextutils, 'get_available_languages',
+                               return_value=['es', 'zh']) as get_languages:
+            for _i in range(3):
+                request = wsgi.Request.blank('/')
+                request.headers['Accept-Language'] = 'zh'
+                self.assertEqual('zh', request.best_match_language())
+                request.headers['Accept-Language'] = 'unknown-language'
+                self.assertIsNone(request.best_match_language())
+            self.assertEqual(2, get_languages.call_count)
+
+    def test_content_type_from_accept_cached(self):
+        cache = utils.LRUCache(256)
+        with mock.patch.object(wsgi, '_ACCEPT_CACHE', cache):
+            with mock.patch.object(cache, 'set',
+                                   wraps=cache.set) as cache_set:
+                for _i in range(3):
+                    request = wsgi.Request.blank('/tests/123')
+                    request.headers['Accept'] = 'application/xml'
+                    self.assertEqual('application/xml',
+                                     request.best_match_content_type())
+                # only the first request missed the cache
+                self.assertEqual(1, cache_set.call_count)
+        self.assertEqual('application/xml', cache.get('application/xml'))
+
 
 class ResourceTestCase(base.BaseTestCase):
 
@@ -38,6 +38,9 @@ class TestCallLog(base.BaseTestCase):
                               'method_name': 'test_method',
                               'args': (),
                               'kwargs': {}}
+        mock.patch.object(call_log.LOG, 'isEnabledFor',
+                          return_value=True).start()
+        self.addCleanup(mock.patch.stopall)
 
     def test_call_log_all_args(self):
         self.expected_data['args'] = (10, 20)
@@ -68,3 +71,27 @@ class TestCallLog(base.BaseTestCase):
             self.klass.test_method(10, arg2=20, arg3=30, arg4=40)
             log_debug.assert_called_once_with(self.expected_format,
                                               self.expected_data)
+
+    def test_call_log_debug_disabled(self):
+        call_log.LOG.isEnabledFor.return_value = False
+        with mock.patch.object(call_log.LOG, 'debug') as log_debug:
+            self.klass.test_method(10, 20)
+            self.assertFalse(log_debug.called)
+
+
+class TestDeferred(base.BaseTestCase):
+    def test_not_evaluated_until_formatted(self):
+        func = mock.Mock(return_value='value')
+        deferred = call_log.Deferred(func)
+        self.assertFalse(func.called)
+        self.assertEqual('attr value', 'attr %s' % deferred)
+        self.assertEqual(u'attr value', u'attr %s' % deferred)
+        self.assertEqual("'value'", repr(deferred))
+        self.assertEqual(3, func.call_count)
+
+    def test_not_evaluated_when_debug_disabled(self):
+        func = mock.Mock()
+        log = call_log.LOG
+        with mock.patch.object(log, 'isEnabledFor', return_value=False):
+            log.debug('attr %s', call_log.Deferred(func))
+        self.assertFalse(func.called)
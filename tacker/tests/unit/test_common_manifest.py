@@ -0,0 +1,103 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import mock
+
+from tacker.common import driver_manager
+from tacker.common import manifest
+from tacker.tests import base
+
+
+class FakeDriver(object):
+    def get_type(self):
+        return 'fake'
+
+
+class BrokenDriver(object):
+    def __init__(self):
+        raise ValueError('broken')
+
+
+class TestManifest(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestManifest, self).setUp()
+        self.path = os.path.join(self.temp_dir, 'manifest.json')
+        self.source = os.path.join(self.temp_dir, 'source.py')
+        with open(self.source, 'w') as source:
+            source.write('')
+
+    def test_saved_entry_loaded(self):
+        first = manifest.Manifest(self.path)
+        first.set('section', 'key', ['value'], [self.source])
+        first.save()
+        self.assertEqual(['value'],
+                         manifest.Manifest(self.path).get('section', 'key'))
+
+    def test_modified_source_invalidates_entry(self):
+        m = manifest.Manifest(self.path)
+        m.set('section', 'key', 'value', [self.source])
+        os.utime(self.source, (0, 0))
+        self.assertIsNone(m.get('section', 'key'))
+
+    def test_missing_or_corrupt_file_is_empty(self):
+        self.assertIsNone(manifest.Manifest(self.path).get('section', 'key'))
+        with open(self.path, 'w') as manifest_file:
+            manifest_file.write('{')
+        self.assertIsNone(manifest.Manifest(self.path).get('section', 'key'))
+
+    def test_unwritable_path_ignored(self):
+        m = manifest.Manifest(os.path.join(self.temp_dir, 'nodir', 'm.json'))
+        m.set('section', 'key', 'value', [])
+        m.save()
+        self.assertEqual('value', m.get('section', 'key'))
+
+
+class TestDriverManagerManifest(base.BaseTestCase):
+
+    def test_drivers_loaded_from_manifest(self):
+        manifest.get_manifest().set(
+            'drivers', 'tacker.test.drivers:fake',
+            [('fake', '%s:FakeDriver' % __name__)], [])
+        with mock.patch.object(driver_manager.DriverManager,
+                               '_load_from_entry_points') as load:
+            manager = driver_manager.DriverManager('tacker.test.drivers',
+                                                   ['fake'])
+        self.assertFalse(load.called)
+        self.assertIsInstance(manager['fake'], FakeDriver)
+
+    def test_stale_target_falls_back_to_entry_points(self):
+        manifest.get_manifest().set(
+            'drivers', 'tacker.test.drivers:fake',
+            [('fake', '%s:MissingDriver' % __name__)], [])
+        ext = driver_manager._Extension('fake', FakeDriver())
+        with mock.patch.object(driver_manager.DriverManager,
+                               '_load_from_entry_points',
+                               return_value=[ext]) as load:
+            manager = driver_manager.DriverManager('tacker.test.drivers',
+                                                   ['fake'])
+        self.assertTrue(load.called)
+        self.assertIs(ext.obj, manager['fake'])
+
+    def test_failing_driver_skipped(self):
+        manifest.get_manifest().set(
+            'drivers', 'tacker.test.drivers:broken,fake',
+            [('broken', '%s:BrokenDriver' % __name__),
+             ('fake', '%s:FakeDriver' % __name__)], [])
+        with mock.patch.object(driver_manager.DriverManager,
+                               '_load_from_entry_points') as load:
+            manager = driver_manager.DriverManager('tacker.test.drivers',
+                                                   ['broken', 'fake'])
+        self.assertFalse(load.called)
+        self.assertIsInstance(manager['fake'], FakeDriver)
@@ -381,3 +381,18 @@ class TestDict2Tuples(base.BaseTestCase):
         expected = ((42, 'baz'), ('aaa', 'zzz'), ('foo', 'bar'))
         output_tuple = utils.dict2tuple(input_dict)
         self.assertEqual(expected, output_tuple)
+
+
+class TestLazyModule(base.BaseTestCase):
+    def test_imported_on_first_use(self):
+        with mock.patch.object(utils.importutils, 'import_module',
+                               return_value=mock.Mock(attr=1)) as imp:
+            lazy = utils.LazyModule('some.module')
+            self.assertFalse(imp.called)
+            self.assertEqual(1, lazy.attr)
+            self.assertEqual(1, lazy.attr)
+        imp.assert_called_once_with('some.module')
+
+    def test_import_error_on_use(self):
+        lazy = utils.LazyModule('tacker.no_such_module')
+        self.assertRaises(ImportError, getattr, lazy, 'attr')
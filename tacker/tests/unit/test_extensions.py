@@ -31,6 +31,7 @@ from tacker.plugins.common import constants
 from tacker.tests import base
 from tacker.tests.unit import extension_stubs as ext_stubs
 import tacker.tests.unit.extensions
+from tacker.tests.unit.extensions import foxinsocks
 from tacker.tests.unit import testlib_api
 from tacker import wsgi
 
@@ -466,6 +467,11 @@ class ExtensionManagerTest(base.BaseTestCase):
         self.assertIn('valid_extension', ext_mgr.extensions)
         self.assertNotIn('invalid_extension', ext_mgr.extensions)
 
+    def test_extension_in_package_imported_by_name(self):
+        ext_mgr = extensions.ExtensionManager(extensions_path)
+        self.assertIsInstance(ext_mgr.extensions['FOXNSOX'],
+                              foxinsocks.Foxinsocks)
+
 
 class PluginAwareExtensionManagerTest(base.BaseTestCase):
 
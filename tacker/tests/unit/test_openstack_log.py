@@ -0,0 +1,194 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import logging
+import threading
+
+from tacker.common import log as common_log
+from tacker.openstack.common import log
+from tacker.tests import base
+
+
+def _record(msg, *args):
+    return logging.LogRecord('tacker', logging.DEBUG, __file__, 1,
+                             msg, args, None)
+
+
+class TestMaskPassword(base.BaseTestCase):
+
+    def test_mask_all_formats(self):
+        self.assertEqual('admin_pass="***" <password>***</password> '
+                         '"adminPass": "***"',
+                         log.mask_password('admin_pass="a" '
+                                           '<password>b</password> '
+                                           '"adminPass": "c"'))
+
+    def test_mask_custom_secret(self):
+        self.assertEqual("'password': 'xxx'",
+                         log.mask_password("'password': 'a'", secret='xxx'))
+
+    def test_no_keys_unchanged(self):
+        self.assertEqual('name="foo"', log.mask_password('name="foo"'))
+
+
+class TestMaskPasswordFilter(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestMaskPasswordFilter, self).setUp()
+        self.filter = log.MaskPasswordFilter()
+
+    def test_structured_args_masked_by_key(self):
+        record = _record('device %s',
+                         {'name': 'vnf', 'attributes': {'password': 'pw'},
+                          'config': ["'admin_pass': 'pw'"]})
+        self.assertTrue(self.filter.filter(record))
+        self.assertEqual({'name': 'vnf', 'attributes': {'password': '***'},
+                          'config': ["'admin_pass': '***'"]},
+                         record.args)
+
+    def test_keys_containing_password_masked(self):
+        record = _record('%(db_password)s %(original_password)s %(name)s',
+                         {'db_password': 'pw', 'original_password': 'pw',
+                          'name': 'vnf', 1: 'one'})
+        self.assertTrue(self.filter.filter(record))
+        self.assertEqual({'db_password': '***', 'original_password': '***',
+                          'name': 'vnf', 1: 'one'}, record.args)
+
+    def test_namedtuple_args_rebuilt(self):
+        Auth = collections.namedtuple('Auth', ['user', 'password'])
+        record = _record('auth %s %s', Auth('admin', "password='pw'"),
+                         ['pw'])
+        self.assertTrue(self.filter.filter(record))
+        self.assertEqual((Auth('admin', "password='***'"), ['pw']),
+                         record.args)
+        self.assertIsInstance(record.args[0], Auth)
+
+    def test_opaque_args_masked_in_message(self):
+        class Opaque(object):
+            def __str__(self):
+                return 'password="pw"'
+
+        record = _record('device %s', Opaque())
+        self.assertTrue(self.filter.filter(record))
+        self.assertIsNone(record.args)
+        self.assertEqual('device password="***"', record.getMessage())
+
+    def test_message_without_args_masked(self):
+        record = _record('password="pw"')
+        self.assertTrue(self.filter.filter(record))
+        self.assertEqual('password="***"', record.getMessage())
+
+    def test_plain_record_untouched(self):
+        args = ('vnf', 1)
+        record = _record('device %s %d', *args)
+        self.assertTrue(self.filter.filter(record))
+        self.assertEqual(args, record.args)
+
+
+class _ListHandler(logging.Handler):
+
+    def __init__(self, gate=None):
+        logging.Handler.__init__(self)
+        self.gate = gate
+        self.entered = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.entered.set()
+        if self.gate:
+            self.gate.wait()
+        self.messages.append(self.format(record))
+
+
+class TestAsyncHandler(base.BaseTestCase):
+
+    def _async_handler(self, target, maxsize=100):
+        handler = log.AsyncHandler([target], maxsize)
+        self.addCleanup(handler.close)
+        return handler
+
+    def test_records_written_by_writer_thread(self):
+        target = _ListHandler()
+        handler = self._async_handler(target)
+        handler.handle(_record('device %s', 'vnf'))
+        handler.flush()
+        self.assertEqual(['device vnf'], target.messages)
+        self.assertEqual(0, handler.dropped)
+
+    def test_target_level_respected(self):
+        target = _ListHandler()
+        target.setLevel(logging.INFO)
+        handler = self._async_handler(target)
+        handler.handle(_record('debug'))
+        handler.flush()
+        self.assertEqual([], target.messages)
+
+    def test_debug_dropped_when_full(self):
+        gate = threading.Event()
+        target = _ListHandler(gate)
+        handler = self._async_handler(target, maxsize=4)
+        # the first record keeps the writer busy until the gate opens
+        handler.handle(_record('debug %d', 0))
+        target.entered.wait()
+        for i in range(1, 20):
+            handler.handle(_record('debug %d', i))
+        self.assertGreater(handler.dropped, 0)
+        gate.set()
+        handler.flush()
+        self.assertIn('Dropped %d log records while the log queue was full'
+                      % handler.dropped, target.messages)
+        self.assertEqual(20 - handler.dropped + 1, len(target.messages))
+
+    def test_warning_dropped_after_wait(self):
+        gate = threading.Event()
+        target = _ListHandler(gate)
+        handler = self._async_handler(target, maxsize=1)
+        handler.WARNING_WAIT = 0.05
+        handler.handle(_record('debug %d', 0))
+        target.entered.wait()
+        handler.handle(_record('debug %d', 1))
+        record = _record('warning')
+        record.levelno = logging.WARNING
+        handler.handle(record)
+        self.assertEqual(1, handler.dropped)
+        gate.set()
+        handler.flush()
+        self.assertEqual(['debug 0',
+                          'Dropped 1 log records while the log queue was '
+                          'full', 'debug 1'], target.messages)
+
+    def test_message_rendered_and_masked_by_caller(self):
+        threads = []
+
+        def render():
+            threads.append(threading.current_thread())
+            return 'vnf'
+
+        gate = threading.Event()
+        target = _ListHandler(gate)
+        handler = self._async_handler(target)
+        handler.handle(_record('device %s %s', common_log.Deferred(render),
+                               {'db_password': 'pw'}))
+        self.assertEqual([threading.current_thread()], threads)
+        gate.set()
+        handler.flush()
+        self.assertEqual(["device vnf {'db_password': '***'}"],
+                         target.messages)
+
+
+class TestJSONLogging(base.BaseTestCase):
+
+    def test_json_formatter_single_line(self):
+        formatter = log.JSONFormatter()
+        line = formatter.format(_record('a\nb %s', {'key': 'value'}))
+        self.assertNotIn('\n', line)
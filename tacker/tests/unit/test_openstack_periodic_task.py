@@ -0,0 +1,111 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from eventlet import event
+from oslo_config import cfg
+
+from tacker.openstack.common import periodic_task
+from tacker.tests import base
+
+
+class Tasks(periodic_task.PeriodicTasks):
+
+    def __init__(self):
+        super(Tasks, self).__init__()
+        self.calls = []
+        self.gate = event.Event()
+
+    @periodic_task.periodic_task(spacing=1, run_immediately=True)
+    def slow(self, context):
+        self.calls.append('slow')
+        self.gate.wait()
+
+    @periodic_task.periodic_task(spacing=1, run_immediately=True)
+    def fast(self, context):
+        self.calls.append('fast')
+
+    @periodic_task.periodic_task(spacing=1, run_immediately=True,
+                                 timeout=0.01)
+    def stuck(self, context):
+        self.calls.append('stuck')
+        eventlet.sleep(10)
+
+
+class FailingTasks(periodic_task.PeriodicTasks):
+
+    @periodic_task.periodic_task(spacing=1, run_immediately=True)
+    def fail(self, context):
+        raise ValueError()
+
+
+class TestPeriodicTasks(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestPeriodicTasks, self).setUp()
+        cfg.CONF.set_override('periodic_task_workers', 4)
+        self.tasks = Tasks()
+
+    def _stats(self, name):
+        return self.tasks.get_periodic_task_stats()['Tasks.' + name]
+
+    def test_slow_task_does_not_delay_others(self):
+        self.tasks.run_periodic_tasks(None)
+        eventlet.sleep(0.05)
+        self.assertEqual(set(['slow', 'fast', 'stuck']),
+                         set(self.tasks.calls))
+        self.assertEqual(1, self._stats('fast')['runs'])
+        self.assertEqual(0, self._stats('slow')['runs'])
+        self.tasks.gate.send()
+        eventlet.sleep(0)
+        self.assertEqual(1, self._stats('slow')['runs'])
+
+    def test_running_task_skipped(self):
+        self.tasks.run_periodic_tasks(None)
+        eventlet.sleep(0)
+        self.tasks._periodic_last_run['slow'] = 0
+        self.tasks.run_periodic_tasks(None)
+        self.assertEqual(1, self.tasks.calls.count('slow'))
+        self.assertEqual(1, self._stats('slow')['skipped'])
+        self.tasks.gate.send()
+
+    def test_task_timeout(self):
+        self.tasks.run_periodic_tasks(None)
+        eventlet.sleep(0.05)
+        stats = self._stats('stuck')
+        self.assertEqual(1, stats['timeouts'])
+        self.assertEqual(1, stats['runs'])
+        self.assertEqual(1, stats['histogram']['<=0.1'])
+        self.tasks.gate.send()
+
+    def test_serial_run_raises(self):
+        cfg.CONF.set_override('periodic_task_workers', 1)
+        tasks = FailingTasks()
+        self.assertRaises(ValueError, tasks.run_periodic_tasks, None,
+                          raise_on_error=True)
+        stats = tasks.get_periodic_task_stats()['FailingTasks.fail']
+        self.assertEqual(1, stats['failures'])
+
+
+class TestPeriodicTaskStats(base.BaseTestCase):
+
+    def test_record(self):
+        stats = periodic_task.PeriodicTaskStats()
+        stats.record(0.05)
+        stats.record(2)
+        stats.record(1000)
+        result = stats.to_dict()
+        self.assertEqual(3, result['runs'])
+        self.assertEqual(1000, result['max_time'])
+        self.assertEqual(1, result['histogram']['<=0.1'])
+        self.assertEqual(1, result['histogram']['<=5'])
+        self.assertEqual(1, result['histogram']['>300'])
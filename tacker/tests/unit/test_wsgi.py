@@ -21,6 +21,7 @@ import urllib2
 
 import mock
 from oslo_config import cfg
+import routes
 import testtools
 import webob
 import webob.exc
@@ -841,6 +842,66 @@ class ResourceTest(base.BaseTestCase):
         self.assertEqual(500, result.status_int)
 
 
+class MapperTest(base.BaseTestCase):
+    def _connect(self, mapper):
+        mapper.resource('vnf', 'vnfs', controller='vnfs',
+                        member={'action': 'POST'})
+        mapper.resource('vnfd', 'vnfds', controller='vnfds',
+                        path_prefix='/v1.0')
+        with mapper.submapper(controller='vnfs', action='bulk',
+                              path_prefix='/v1.0',
+                              conditions=dict(method=['PUT'])) as submap:
+            submap.connect('/vnfs/bulk')
+            submap.connect('/vnfs/bulk.:(format)')
+        mapper.connect('/extensions/:(id)', controller='extensions',
+                       action='show')
+        mapper.connect('/{path_info:.*}', controller='default')
+        return mapper
+
+    def _match(self, mapper, method, url):
+        return mapper.routematch(url, {'REQUEST_METHOD': method})
+
+    def test_same_result_as_routes_mapper(self):
+        expected = self._connect(routes.Mapper())
+        mapper = self._connect(wsgi.Mapper())
+        urls = ['/vnfs', '/vnfs.json', '/vnfs/abc', '/vnfs/abc.xml',
+                '/vnfs/abc/action', '/vnfs/new', '/v1.0/vnfds',
+                '/v1.0/vnfds/abc.json', '/v1.0/vnfs/bulk',
+                '/v1.0/vnfs/bulk.json', '/extensions/foo', '/unknown/path',
+                '/']
+        for method in ('GET', 'POST', 'PUT', 'DELETE'):
+            for url in urls:
+                # twice, to exercise the match cache
+                for _i in range(2):
+                    expected_match = self._match(expected, method, url)
+                    match = self._match(mapper, method, url)
+                    self.assertEqual(expected_match[0], match[0])
+                    self.assertEqual(expected_match[1].routepath,
+                                     match[1].routepath)
+
+    def test_cached_match_is_copied(self):
+        mapper = self._connect(wsgi.Mapper())
+        match, _route = self._match(mapper, 'GET', '/vnfs/abc')
+        del match['controller']
+        match, _route = self._match(mapper, 'GET', '/vnfs/abc')
+        self.assertEqual('vnfs', match['controller'])
+        self.assertEqual('abc', match['id'])
+
+    def test_match_cache_is_bounded(self):
+        mapper = self._connect(wsgi.Mapper(cache_size=4))
+        for i in range(10):
+            self._match(mapper, 'GET', '/vnfs/%d' % i)
+        self.assertEqual(4, len(mapper._match_cache))
+
+    def test_no_match(self):
+        mapper = wsgi.Mapper()
+        mapper.connect('/vnfs', controller='vnfs', action='index',
+                       conditions=dict(method=['GET']))
+        self.assertIsNone(self._match(mapper, 'POST', '/vnfs'))
+        self.assertIsNone(self._match(mapper, 'POST', '/vnfs'))
+        self.assertIsNone(self._match(mapper, 'GET', '/vnfds'))
+
+
 class MiddlewareTest(base.BaseTestCase):
     def test_process_response(self):
         def application(environ, start_response):
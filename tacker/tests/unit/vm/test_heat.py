@@ -0,0 +1,244 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+import yaml
+
+from tacker.extensions import vnfm
+from tacker.openstack.common import jsonutils
+from tacker.tests import base
+from tacker.vm.drivers.heat import heat
+
+STACK_ID = 'da85ea1a-4ec4-4201-bbb2-8d9249eca7ec'
+
+
+def _config(value):
+    return yaml.dump({'vdus': {'vdu1': {'config': {'firewall': value}}}})
+
+
+class TestDeviceHeat(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestDeviceHeat, self).setUp()
+        self.heatclient = mock.Mock()
+        mock.patch.object(heat, 'HeatClient',
+                          return_value=self.heatclient).start()
+        mock.patch('time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+        self.driver = heat.DeviceHeat()
+        template_dict = {
+            'heat_template_version': '2013-05-23',
+            'resources': {
+                'vdu1': {'type': 'OS::Nova::Server',
+                         'properties': {'image': 'cirros',
+                                        'flavor': 'm1.tiny'}},
+                'vdu2': {'type': 'OS::Nova::Server',
+                         'properties': {'image': 'cirros',
+                                        'flavor': 'm1.tiny'}},
+            },
+        }
+        self.driver._apply_config(template_dict, _config('allow'))
+        self.heat_template = yaml.dump(template_dict)
+        self.device_dict = {'attributes': {
+            'heat_template': self.heat_template,
+            'config': _config('allow'),
+            'parameters': jsonutils.dumps({'flavor': 'm1.tiny'}),
+        }}
+
+    def _update(self, **attributes):
+        self.driver.update(None, None, STACK_ID, self.device_dict,
+                           {'device': {'attributes': attributes}})
+
+    def test_changed_resources(self):
+        template_dict = yaml.load(self.heat_template)
+        new_template_dict = yaml.load(self.heat_template)
+        self.assertEqual([], heat._changed_resources(template_dict,
+                                                     new_template_dict))
+        self.driver._apply_config(new_template_dict, _config('deny'))
+        del new_template_dict['resources']['vdu2']
+        new_template_dict['resources']['vdu3'] = {}
+        self.assertEqual(['vdu1', 'vdu2', 'vdu3'],
+                         heat._changed_resources(template_dict,
+                                                 new_template_dict))
+
+    def test_update_config(self):
+        self._update(config=_config('deny'))
+        self.assertEqual(1, self.heatclient.update.call_count)
+        args, kwargs = self.heatclient.update.call_args
+        self.assertEqual((STACK_ID,), args)
+        self.assertEqual(['template'], kwargs.keys())
+        resources = yaml.load(kwargs['template'])['resources']
+        self.assertEqual({'firewall': 'deny'},
+                         resources['vdu1']['properties']['metadata'])
+        self.assertEqual(yaml.load(self.heat_template)['resources']['vdu2'],
+                         resources['vdu2'])
+        self.assertEqual(kwargs['template'],
+                         self.device_dict['attributes']['heat_template'])
+
+    def test_update_unchanged_config(self):
+        self._update(config=_config('allow'))
+        self.assertFalse(self.heatclient.update.called)
+        self.assertEqual(self.heat_template,
+                         self.device_dict['attributes']['heat_template'])
+
+    def test_update_parameters(self):
+        self._update(parameters=jsonutils.dumps({'image': 'cirros-0.3.4'}))
+        self.heatclient.update.assert_called_once_with(
+            STACK_ID, parameters={'image': 'cirros-0.3.4'})
+        self.assertEqual({'flavor': 'm1.tiny', 'image': 'cirros-0.3.4'},
+                         jsonutils.loads(
+                             self.device_dict['attributes']['parameters']))
+
+    def _stack(self, status, updated_time=None):
+        return mock.Mock(stack_status=status, updated_time=updated_time)
+
+    def _update_wait(self, *stacks):
+        self.heatclient.get.side_effect = None
+        self.heatclient.get.return_value = self._stack(
+            'UPDATE_COMPLETE', '2016-01-01T00:00:00')
+        self._update(config=_config('deny'))
+        self.heatclient.get.reset_mock()
+        self.heatclient.get.side_effect = stacks
+        self.driver.update_wait(None, None, self.device_dict, STACK_ID)
+
+    def test_update_wait(self):
+        self._update_wait(
+            self._stack('UPDATE_IN_PROGRESS', '2016-01-02T00:00:00'),
+            self._stack('UPDATE_COMPLETE', '2016-01-02T00:00:00'))
+        self.assertEqual(2, self.heatclient.get.call_count)
+        self.assertNotIn(heat.STACK_UPDATED_TIME, self.device_dict)
+
+    def test_update_wait_not_started(self):
+        # heat has not picked up the update yet
+        self.heatclient.get.return_value = self._stack('CREATE_COMPLETE')
+        self._update(config=_config('deny'))
+        self.heatclient.get.reset_mock()
+        self.heatclient.get.side_effect = [
+            self._stack('CREATE_COMPLETE'),
+            self._stack('UPDATE_IN_PROGRESS', '2016-01-02T00:00:00'),
+            self._stack('UPDATE_COMPLETE', '2016-01-02T00:00:00')]
+        self.driver.update_wait(None, None, self.device_dict, STACK_ID)
+        self.assertEqual(3, self.heatclient.get.call_count)
+
+    def test_update_wait_earlier_update(self):
+        # the stack still shows the previous update as completed
+        self._update_wait(
+            self._stack('UPDATE_COMPLETE', '2016-01-01T00:00:00'),
+            self._stack('UPDATE_COMPLETE', '2016-01-02T00:00:00'))
+        self.assertEqual(2, self.heatclient.get.call_count)
+
+    def test_update_wait_failed(self):
+        self.assertRaises(vnfm.DeviceUpdateWaitFailed, self._update_wait,
+                          self._stack('UPDATE_IN_PROGRESS',
+                                      '2016-01-02T00:00:00'),
+                          self._stack('UPDATE_FAILED',
+                                      '2016-01-02T00:00:00'))
+
+    def test_update_wait_rolled_back(self):
+        self.assertRaises(vnfm.DeviceUpdateWaitFailed, self._update_wait,
+                          self._stack('ROLLBACK_IN_PROGRESS',
+                                      '2016-01-02T00:00:00'),
+                          self._stack('ROLLBACK_COMPLETE',
+                                      '2016-01-02T00:00:00'))
+
+    def test_update_wait_unchanged(self):
+        self._update(config=_config('allow'))
+        self.heatclient.get.reset_mock()
+        self.driver.update_wait(None, None, self.device_dict, STACK_ID)
+        self.assertFalse(self.heatclient.get.called)
+
+    def _vnfd(self):
+        return yaml.dump({'vdus': {'vdu1': {
+            'vm_image': 'cirros', 'instance_type': 'm1.tiny', 'count': 2,
+            'network_interfaces': {
+                'management': {'network': 'net_mgmt', 'management': True},
+                'pkt_in': {'network': 'net0'},
+            }}}})
+
+    def _create_group(self):
+        self.heatclient.create.return_value = {'stack': {'id': STACK_ID}}
+        device = {'id': 'device', 'attributes': {},
+                  'device_template': {'attributes': {'vnfd': self._vnfd()}}}
+        self.assertEqual(STACK_ID, self.driver.create(None, None, device))
+        return device
+
+    def test_create_group(self):
+        device = self._create_group()
+        template_dict = yaml.load(
+            self.heatclient.create.call_args[0][0]['template'])
+        group = template_dict['resources']['vdu1']
+        self.assertEqual(heat.RESOURCE_GROUP, group['type'])
+        self.assertEqual(2, group['properties']['count'])
+        server = group['properties']['resource_def']
+        self.assertEqual('OS::Nova::Server', server['type'])
+        self.assertEqual(
+            sorted([{'network': 'net_mgmt'}, {'network': 'net0'}]),
+            sorted(server['properties']['networks']))
+        self.assertEqual({'get_attr': ['vdu1', 'networks', 'net_mgmt', 0]},
+                         template_dict['outputs']['mgmt_ip-vdu1']['value'])
+        self.assertEqual(['vdu1'], template_dict['resources'].keys())
+        self.assertEqual(yaml.dump(template_dict),
+                         device['attributes']['heat_template'])
+
+    def test_scale(self):
+        device = self._create_group()
+        self.driver.scale(None, None, STACK_ID, device,
+                          {'type': 'out', 'count': 3, 'vdu': None})
+        template = self.heatclient.update.call_args[1]['template']
+        self.assertEqual(5, yaml.load(template)['resources']['vdu1'][
+            'properties']['count'])
+        self.assertEqual(template, device['attributes']['heat_template'])
+        self.assertIn(heat.STACK_UPDATED_TIME, device)
+        self.assertRaises(vnfm.DeviceScaleInvalid, self.driver.scale,
+                          None, None, STACK_ID, device,
+                          {'type': 'in', 'count': 6, 'vdu': 'vdu1'})
+        self.assertRaises(vnfm.DeviceNotScalable, self.driver.scale,
+                          None, None, STACK_ID, device,
+                          {'type': 'in', 'count': 1, 'vdu': 'vdu2'})
+        self.assertEqual(1, self.heatclient.update.call_count)
+
+    def test_respawn_after_scale(self):
+        device = self._create_group()
+        self.driver.scale(None, None, STACK_ID, device,
+                          {'type': 'out', 'count': 1, 'vdu': None})
+        scaled = device['attributes']['heat_template']
+        # the respawned device is created from the VNFD again
+        device['attributes']['failure_count'] = 1
+        self.driver.create(None, None, device)
+        template = self.heatclient.create.call_args[0][0]['template']
+        self.assertEqual(3, yaml.load(template)['resources']['vdu1'][
+            'properties']['count'])
+        self.assertEqual(yaml.load(scaled), yaml.load(template))
+        self.assertEqual(template, device['attributes']['heat_template'])
+
+    def test_scale_not_scalable(self):
+        self.assertRaises(vnfm.DeviceNotScalable, self.driver.scale,
+                          None, None, STACK_ID,
+                          {'id': 'device', 'attributes': self.device_dict[
+                              'attributes']},
+                          {'type': 'out', 'count': 1, 'vdu': None})
+
+    def test_scale_wait(self):
+        stack = self._stack('UPDATE_COMPLETE')
+        stack.outputs = [
+            {'output_key': 'mgmt_ip-vdu1',
+             'output_value': ['10.0.0.1', '10.0.0.2']},
+            {'output_key': 'mgmt_ip-vdu2', 'output_value': '10.0.0.3'},
+        ]
+        stack.updated_time = '2016-01-02T00:00:00'
+        self.heatclient.get.return_value = stack
+        device_dict = {'mgmt_url': None,
+                       heat.STACK_UPDATED_TIME: '2016-01-01T00:00:00'}
+        self.driver.scale_wait(None, None, device_dict, STACK_ID)
+        self.assertEqual({'vdu1-0': '10.0.0.1', 'vdu1-1': '10.0.0.2',
+                          'vdu2': '10.0.0.3'},
+                         jsonutils.loads(device_dict['mgmt_url']))
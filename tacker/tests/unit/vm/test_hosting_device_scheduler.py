@@ -0,0 +1,177 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import uuid
+
+import mock
+
+from tacker import context
+from tacker.db.vm import vm_db
+from tacker.plugins.common import constants
+from tacker.tests.unit.db import base as db_base
+from tacker.vm import hosting_device_scheduler
+
+TEMPLATE_ID = 'eb094833-995e-49f0-a047-dfb56aaf7c4e'
+TENANT_ID = 'ad7ebc56538745a08ef7c5e97f8bd437'
+
+
+class FakePlugin(vm_db.VNFMPluginDb):
+    create_vnf = update_vnf = delete_vnf = scale_vnf = create_vnfd = None
+    get_lifecycle_tasks = get_lifecycle_task = None
+    get_lifecycle_operations = get_lifecycle_operation = None
+
+
+class TestChanceScheduler(db_base.SqlTestCase):
+
+    def setUp(self):
+        super(TestChanceScheduler, self).setUp()
+        self.context = context.get_admin_context()
+        self.plugin = FakePlugin()
+        self.scheduler = hosting_device_scheduler.ChanceScheduler()
+        session = self.context.session
+        session.add(vm_db.DeviceTemplate(
+            id=TEMPLATE_ID, tenant_id=TENANT_ID, name='template',
+            infra_driver='noop', mgmt_driver='noop'))
+        self.service_type_id = str(uuid.uuid4())
+        session.add(vm_db.ServiceType(
+            id=self.service_type_id, tenant_id=TENANT_ID,
+            template_id=TEMPLATE_ID, service_type='firewall'))
+        session.flush()
+
+    def _insert_device(self, device_id, status=constants.ACTIVE):
+        self.context.session.add(vm_db.Device(
+            id=device_id, tenant_id=TENANT_ID, template_id=TEMPLATE_ID,
+            status=status))
+        self.context.session.flush()
+
+    def _schedule(self, service_type='firewall'):
+        return self.scheduler.schedule(self.plugin, self.context,
+                                       service_type, str(uuid.uuid4()),
+                                       'name', [])
+
+    def _status(self, device_id):
+        self.context.session.expire_all()
+        return self.context.session.query(vm_db.Device).get(device_id).status
+
+    def test_schedule(self):
+        self._insert_device('device-1')
+        self._insert_device('device-2')
+        self._insert_device('device-3', constants.PENDING_UPDATE)
+        scheduled = set()
+        for _i in range(2):
+            device_dict, service_instance_dict = self._schedule()
+            self.assertEqual(constants.ACTIVE, device_dict['status'])
+            self.assertEqual(self.service_type_id,
+                             service_instance_dict['service_type_id'])
+            scheduled.add(device_dict['id'])
+        self.assertEqual(set(['device-1', 'device-2']), scheduled)
+        self.assertIsNone(self._schedule())
+        self.assertEqual(constants.ACTIVE, self._status('device-1'))
+        self.assertEqual(2, self.context.session.query(
+            vm_db.ServiceDeviceBinding).count())
+
+    def test_no_capable_device(self):
+        self._insert_device('device-1')
+        self.assertIsNone(self._schedule('loadbalancer'))
+
+    def test_device_taken_concurrently_skipped(self):
+        for i in range(3):
+            self._insert_device('device-%d' % i)
+        claim = self.scheduler._claim
+        claimed = []
+
+        def racing_claim(context, device_id):
+            # the first device tried is taken by another schedule
+            if not claimed:
+                claimed.append(device_id)
+                return 0
+            return claim(context, device_id)
+
+        with mock.patch.object(self.scheduler, '_claim',
+                               side_effect=racing_claim):
+            device_dict, _service_instance_dict = self._schedule()
+        self.assertNotEqual(claimed[0], device_dict['id'])
+
+    def test_device_bound_after_read_skipped(self):
+        self._insert_device('device-1')
+        self._insert_device('device-2')
+        first, _service_instance_dict = self._schedule()
+        candidates = self.scheduler._candidates
+
+        def stale_candidates(context, query):
+            # as read before the first schedule bound its device
+            return [first["id"]] + candidates(context, query)
+
+        with mock.patch.object(self.scheduler, '_candidates',
+                               side_effect=stale_candidates):
+            second, _service_instance_dict = self._schedule()
+        self.assertNotEqual(first['id'], second['id'])
+        self.assertEqual(constants.ACTIVE, self._status(first['id']))
+
+
+class TestLeastLoadedScheduler(TestChanceScheduler):
+
+    def setUp(self):
+        super(TestLeastLoadedScheduler, self).setUp()
+        self.scheduler = hosting_device_scheduler.LeastLoadedScheduler()
+        self.router_type_id = str(uuid.uuid4())
+        self.context.session.add(vm_db.ServiceType(
+            id=self.router_type_id, tenant_id=TENANT_ID,
+            template_id=TEMPLATE_ID, service_type='router'))
+        self.context.session.flush()
+
+    def _insert_bindings(self, device_id, count):
+        service_instance_ids = []
+        for _i in range(count):
+            service_instance_dict = self.plugin._create_service_instance(
+                self.context, device_id,
+                {'name': 'router', 'service_table_id': str(uuid.uuid4()),
+                 'service_type_id': self.router_type_id}, False)
+            service_instance_ids.append(service_instance_dict['id'])
+        return service_instance_ids
+
+    def _delete_bindings(self, service_instance_ids):
+        self.context.session.query(vm_db.ServiceInstance).filter(
+            vm_db.ServiceInstance.id.in_(service_instance_ids)).update(
+                {'status': constants.ACTIVE}, synchronize_session=False)
+        for service_instance_id in service_instance_ids:
+            self.plugin._delete_service_instance(
+                self.context, service_instance_id, False)
+
+    def _load(self, device_id):
+        self.context.session.expire_all()
+        return self.context.session.query(vm_db.Device).get(device_id).load
+
+    def test_idle_device_first(self):
+        self._insert_device('device-1')
+        self._insert_device('device-2')
+        self._insert_bindings('device-1', 2)
+        device_dict, _service_instance_dict = self._schedule()
+        self.assertEqual('device-2', device_dict['id'])
+
+    def test_least_loaded(self):
+        for i, count in enumerate((2, 1, 3)):
+            self._insert_device('device-%d' % i)
+            self._insert_bindings('device-%d' % i, count)
+        scheduled = [self._schedule()[0]['id'] for _i in range(3)]
+        self.assertEqual(['device-1', 'device-0', 'device-2'], scheduled)
+        self.assertEqual([3, 2, 4],
+                         [self._load('device-%d' % i) for i in range(3)])
+
+    def test_unbound_device_preferred(self):
+        self._insert_device('device-1')
+        self._insert_device('device-2')
+        self._insert_bindings('device-1', 1)
+        self._delete_bindings(self._insert_bindings('device-2', 2))
+        self.assertEqual(0, self._load('device-2'))
+        device_dict, _service_instance_dict = self._schedule()
+        self.assertEqual('device-2', device_dict['id'])
@@ -13,14 +13,24 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from eventlet import greenpool
 import mock
+from oslo_config import cfg
+import sqlalchemy as sa
+from sqlalchemy import orm
 import uuid
 
 from tacker import context
+from tacker.db.vm import task_db
 from tacker.db.vm import vm_db
+from tacker.extensions import vnfm
+from tacker.openstack.common import jsonutils
+from tacker.plugins.common import constants
 from tacker.tests.unit.db import base as db_base
 from tacker.tests.unit.db import utils
 from tacker.vm import plugin
+from tacker.vm import readiness
+from tacker.vm import task_executor
 
 
 class FakeDriverManager(mock.Mock):
@@ -41,6 +51,14 @@ class TestVNFMPlugin(db_base.SqlTestCase):
     def setUp(self):
         super(TestVNFMPlugin, self).setUp()
         self.addCleanup(mock.patch.stopall)
+        cfg.CONF.set_override('reconcile_interval', 0, 'servicevm')
+        self.addCleanup(cfg.CONF.clear_override, 'reconcile_interval',
+                        'servicevm')
+        cfg.CONF.set_override('lifecycle_workers', 0, 'servicevm')
+        self.addCleanup(cfg.CONF.clear_override, 'lifecycle_workers',
+                        'servicevm')
+        cfg.CONF.set_override('auth_strategy', 'noauth')
+        self.addCleanup(cfg.CONF.clear_override, 'auth_strategy')
         self.context = context.get_admin_context()
         self._mock_device_manager()
         self._mock_device_status()
@@ -74,6 +92,12 @@ class TestVNFMPlugin(db_base.SqlTestCase):
         patcher = mock.patch(target, new)
         return patcher.start()
 
+    def _assert_task_queued(self, operation, device_id):
+        tasks = self.context.session.query(task_db.LifecycleTask).all()
+        self.assertEqual([(operation, device_id, task_db.TASK_PENDING)],
+                         [(task.operation, task.device_id, task.status)
+                          for task in tasks])
+
     def _insert_dummy_device_template(self):
         session = self.context.session
         device_template = vm_db.DeviceTemplate(
@@ -116,6 +140,57 @@ class TestVNFMPlugin(db_base.SqlTestCase):
                                                             device_template=
                                                             mock.ANY)
 
+    def test_vnfd_stored_once(self):
+        vnfd_yaml = utils.get_dummy_vnfd_obj()['vnfd']['attributes']['vnfd']
+        vnfd_ids = [self.vnfm_plugin.create_vnfd(
+            self.context, utils.get_dummy_vnfd_obj())['id'] for _i in range(2)]
+        self.assertEqual(1, self.context.session.query(
+            vm_db.DeviceTemplateBlob).count())
+        attr_db = self.context.session.query(
+            vm_db.DeviceTemplateAttribute).filter_by(key='vnfd').first()
+        self.assertIsNone(attr_db.value)
+
+        vm_db._blob_cache.pop(attr_db.blob_hash)
+        for vnfd_id in vnfd_ids:
+            self.assertEqual(vnfd_yaml, self.vnfm_plugin.get_vnfd(
+                context.get_admin_context(), vnfd_id)['attributes']['vnfd'])
+
+        self.vnfm_plugin.delete_vnfd(self.context, vnfd_ids[0])
+        self.assertEqual(1, self.context.session.query(
+            vm_db.DeviceTemplateBlob).count())
+        self.vnfm_plugin.delete_vnfd(self.context, vnfd_ids[1])
+        self.assertEqual(0, self.context.session.query(
+            vm_db.DeviceTemplateBlob).count())
+
+    @mock.patch.object(readiness, 'wait_for_mgmt')
+    def test_config_device_waits_if_mgmt_driver_does(self, wait_for_mgmt):
+        device_dict = {'id': 'device', 'attributes': {'config': 'config'}}
+        with mock.patch.object(self.vnfm_plugin, 'update_device'):
+            with mock.patch.object(self.vnfm_plugin, 'mgmt_wait_ready',
+                                   return_value=False):
+                self.vnfm_plugin.config_device(self.context, device_dict)
+            self.assertFalse(wait_for_mgmt.called)
+            with mock.patch.object(self.vnfm_plugin, 'mgmt_wait_ready',
+                                   return_value=True):
+                self.vnfm_plugin.config_device(self.context, device_dict)
+        wait_for_mgmt.assert_called_once_with(device_dict)
+
+    def test_concurrently_stored_blob_reused(self):
+        blob_hash = self.vnfm_plugin._write_template_blob(self.context, 'a')
+        first = orm.Query.first
+        # the blob is missed as if another template stored it meanwhile
+        misses = [None]
+
+        def first_after_miss(query):
+            return misses.pop() if misses else first(query)
+
+        with mock.patch.object(orm.Query, 'first', first_after_miss):
+            self.assertEqual(blob_hash, self.vnfm_plugin._write_template_blob(
+                self.context, 'a'))
+        self.assertEqual([], misses)
+        self.assertEqual(1, self.context.session.query(
+            vm_db.DeviceTemplateBlob).count())
+
     def test_create_vnf(self):
         device_template_obj = self._insert_dummy_device_template()
         vnf_obj = utils.get_dummy_vnf_obj()
@@ -131,7 +206,39 @@ class TestVNFMPlugin(db_base.SqlTestCase):
                                                        plugin=mock.ANY,
                                                        context=mock.ANY,
                                                        device=mock.ANY)
-        self._pool.spawn_n.assert_called_once_with(mock.ANY)
+        self._assert_task_queued('create_device', result['id'])
+        device_db = self.context.session.query(vm_db.Device).get(result['id'])
+        self.assertEqual(result['instance_id'], device_db.instance_id)
+
+    def test_create_service_instance_task(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        service_type_id = str(uuid.uuid4())
+        self.context.session.add(vm_db.ServiceType(
+            id=service_type_id, tenant_id=dummy_device_obj['tenant_id'],
+            template_id=dummy_device_obj['template_id'],
+            service_type='firewall'))
+        self.context.session.flush()
+        service_instance_dict = self.vnfm_plugin.create_service_instance(
+            self.context, {'service_instance': {
+                'name': 'fake_service_instance',
+                'service_type_id': service_type_id,
+                'service_table_id': str(uuid.uuid4()),
+                'devices': [dummy_device_obj['id']]}})
+        self._assert_task_queued('create_service_instance',
+                                 dummy_device_obj['id'])
+
+        executor = self.vnfm_plugin._task_executor
+        executor._pool = greenpool.GreenPool(1)
+        executor.poll()
+        executor._pool.waitall()
+        self.context.session.expire_all()
+        self.assertEqual([], self.context.session.query(
+            task_db.LifecycleTask).all())
+        self.assertEqual(constants.ACTIVE,
+                         self.vnfm_plugin.get_service_instance(
+                             self.context,
+                             service_instance_dict['id'])['status'])
 
     def test_delete_vnf(self):
         self._insert_dummy_device_template()
@@ -143,8 +250,7 @@ class TestVNFMPlugin(db_base.SqlTestCase):
                                                        context=mock.ANY,
                                                        device_id=mock.ANY)
         self._device_status.delete_hosting_device.assert_called_with(mock.ANY)
-        self._pool.spawn_n.assert_called_once_with(mock.ANY, mock.ANY,
-                                                   mock.ANY)
+        self._assert_task_queued('delete_device', dummy_device_obj['id'])
 
     def test_update_vnf(self):
         self._insert_dummy_device_template()
@@ -158,5 +264,264 @@ class TestVNFMPlugin(db_base.SqlTestCase):
         self.assertIn('status', result)
         self.assertIn('attributes', result)
         self.assertIn('mgmt_url', result)
-        self._pool.spawn_n.assert_called_once_with(mock.ANY, mock.ANY,
-                                                   mock.ANY)
\ No newline at end of file
+        self._assert_task_queued('update_device', dummy_device_obj['id'])
+
+    def test_update_vnf_pending_update(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        dummy_device_obj.status = constants.PENDING_UPDATE
+        self.context.session.flush()
+        self.assertRaises(vnfm.DeviceInUse, self.vnfm_plugin.update_vnf,
+                          self.context, dummy_device_obj['id'],
+                          utils.get_dummy_vnf_config_obj())
+        dummy_device_obj.status = constants.DEAD
+        self.context.session.flush()
+        self.assertRaises(vnfm.DeviceNotFound, self.vnfm_plugin.update_vnf,
+                          self.context, dummy_device_obj['id'],
+                          utils.get_dummy_vnf_config_obj())
+
+    def test_update_device_wait(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        device_dict = self.vnfm_plugin.update_vnf(
+            self.context, dummy_device_obj['id'],
+            utils.get_dummy_vnf_config_obj())
+        self.assertEqual(constants.PENDING_UPDATE, dummy_device_obj.status)
+        self.vnfm_plugin._update_device_wait(self.context, device_dict)
+        self.context.session.expire_all()
+        device = self.vnfm_plugin.get_device(self.context,
+                                             dummy_device_obj['id'])
+        self.assertEqual(constants.ACTIVE, device['status'])
+        self.assertEqual(device_dict['attributes'], device['attributes'])
+        self.assertFalse(self.vnfm_plugin._transition_device_status(
+            self.context, dummy_device_obj['id'], constants.PENDING_UPDATE,
+            constants.ACTIVE))
+
+    def test_scale_vnf(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        device_id = dummy_device_obj['id']
+        self.assertRaises(vnfm.DeviceScaleInvalid, self.vnfm_plugin.scale_vnf,
+                          self.context, device_id,
+                          {'scale': {'type': 'up', 'count': 1}})
+        self.assertRaises(vnfm.DeviceScaleInvalid, self.vnfm_plugin.scale_vnf,
+                          self.context, device_id,
+                          {'scale': {'type': 'out', 'count': 0}})
+        device_dict = self.vnfm_plugin.scale_vnf(
+            self.context, device_id, {'scale': {'type': 'out', 'count': 2}})
+        self.assertEqual(constants.PENDING_UPDATE, dummy_device_obj.status)
+        self._assert_task_queued('scale_device', device_id)
+        self._device_manager.invoke.assert_any_call(
+            'fake_driver', 'scale', plugin=self.vnfm_plugin,
+            context=self.context, device_id=dummy_device_obj['instance_id'],
+            device_dict=device_dict,
+            scale={'type': 'out', 'count': 2, 'vdu': None})
+
+        device_dict['mgmt_url'] = '{"vdu1-0": "10.0.0.1"}'
+        self.vnfm_plugin._scale_device_wait(self.context, device_dict)
+        self.context.session.expire_all()
+        device = self.vnfm_plugin.get_device(self.context, device_id)
+        self.assertEqual(constants.ACTIVE, device['status'])
+        self.assertEqual('{"vdu1-0": "10.0.0.1"}', device['mgmt_url'])
+
+    def test_scale_vnf_not_scalable(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        self._device_manager.invoke.side_effect = NotImplementedError()
+        self.assertRaises(vnfm.DeviceNotScalable, self.vnfm_plugin.scale_vnf,
+                          self.context, dummy_device_obj['id'],
+                          {'scale': {'type': 'in', 'count': 1}})
+        self.context.session.expire_all()
+        self.assertEqual(constants.ACTIVE, self.vnfm_plugin.get_device(
+            self.context, dummy_device_obj['id'])['status'])
+
+    def test_write_device_attributes(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        device_id = dummy_device_obj['id']
+        self.vnfm_plugin._write_device_attributes(
+            self.context, device_id, {'a': '1', 'b': '2', 'c': '3'})
+        self.assertEqual({'a': '1', 'b': '2', 'c': '3'},
+                         self.vnfm_plugin.get_device(
+                             self.context, device_id)['attributes'])
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement.split()[0])
+        engine = self.context.session.get_bind()
+        sa.event.listen(engine, 'before_cursor_execute', record)
+        self.addCleanup(sa.event.remove, engine, 'before_cursor_execute',
+                        record)
+        self.vnfm_plugin._write_device_attributes(
+            self.context, device_id, {'a': '1', 'b': '20', 'd': '4'},
+            delete_stale=True)
+        self.assertEqual(['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'UPDATE'],
+                         statements)
+        self.assertEqual({'a': '1', 'b': '20', 'd': '4'},
+                         self.vnfm_plugin.get_device(
+                             self.context, device_id)['attributes'])
+
+    def test_mgmt_endpoints(self):
+        self.assertEqual(
+            [{'vdu': 'vdu1', 'ip': '10.0.0.1', 'port': None},
+             {'vdu': 'vdu2', 'ip': '10.0.0.2', 'port': 830}],
+            vm_db.mgmt_endpoints('{"vdu2": {"ip": "10.0.0.2", "port": 830},'
+                                 ' "vdu1": "10.0.0.1", "vdu3": null}'))
+        self.assertEqual([], vm_db.mgmt_endpoints(None))
+        self.assertEqual([], vm_db.mgmt_endpoints('http://10.0.0.1'))
+
+    def test_write_mgmt_endpoints(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        device_id = dummy_device_obj['id']
+        self.assertEqual([], self.vnfm_plugin.get_device(
+            self.context, device_id)['mgmt_endpoints'])
+        mgmt_url = jsonutils.dumps(dict(
+            ('vdu%d' % i, '10.0.%d.%d' % (i // 256, i % 256))
+            for i in range(100)))
+        self.assertTrue(len(mgmt_url) > 255)
+        self.vnfm_plugin._write_mgmt_endpoints(self.context, device_id,
+                                               mgmt_url)
+        endpoints = self.vnfm_plugin.get_device(
+            self.context, device_id)['mgmt_endpoints']
+        self.assertEqual(100, len(endpoints))
+        self.assertEqual({'vdu': 'vdu42', 'ip': '10.0.0.42', 'port': None},
+                         dict((e['vdu'], e) for e in endpoints)['vdu42'])
+        self.assertEqual([device_id],
+                         self.vnfm_plugin._get_device_ids_by_mgmt_ip(
+                             self.context, '10.0.0.42'))
+        self.vnfm_plugin._write_mgmt_endpoints(self.context, device_id,
+                                               '{"vdu1": "10.0.1.1"}')
+        self.assertEqual([{'vdu': 'vdu1', 'ip': '10.0.1.1', 'port': None}],
+                         self.vnfm_plugin.get_device(
+                             self.context, device_id)['mgmt_endpoints'])
+        self.assertEqual([], self.vnfm_plugin._get_device_ids_by_mgmt_ip(
+            self.context, '10.0.0.42'))
+
+    def _record_statements(self):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement.split()[0])
+        engine = self.context.session.get_bind()
+        sa.event.listen(engine, 'before_cursor_execute', record)
+        self.addCleanup(sa.event.remove, engine, 'before_cursor_execute',
+                        record)
+        return statements
+
+    def test_device_dict_cached(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        device_id = dummy_device_obj['id']
+        self.vnfm_plugin._write_device_attributes(
+            self.context, device_id, {'a': '1'})
+        device_dict = self.vnfm_plugin.get_device(self.context, device_id)
+        device_dict['attributes']['a'] = '2'
+
+        statements = self._record_statements()
+        device_dict = self.vnfm_plugin.get_device(
+            context.get_admin_context(), device_id)
+        # the device and template rows only
+        self.assertEqual(['SELECT', 'SELECT'], statements)
+        self.assertEqual({'a': '1'}, device_dict['attributes'])
+        self.assertEqual('fake_driver',
+                         device_dict['device_template']['infra_driver'])
+
+    def test_device_dict_without_template(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        with mock.patch.object(self.vnfm_plugin,
+                               '_make_template_dict') as make_template_dict:
+            device_dict = self.vnfm_plugin.get_device(
+                self.context, dummy_device_obj['id'], fields=['id', 'status'])
+        self.assertEqual({'id': dummy_device_obj['id'],
+                          'status': constants.ACTIVE}, device_dict)
+        self.assertFalse(make_template_dict.called)
+
+    def test_device_dict_cache_invalidated(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        device_id = dummy_device_obj['id']
+        self.vnfm_plugin.get_device(self.context, device_id)
+        # written by another process, known by the row version only
+        plugin.VNFMPlugin()._mark_device_dead(device_id)
+        self.vnfm_plugin.update_device_template(
+            self.context, dummy_device_obj['template_id'],
+            {'device_template': {'name': 'new_name'}})
+
+        device_dict = self.vnfm_plugin.get_device(
+            context.get_admin_context(), device_id)
+        self.assertEqual(constants.DEAD, device_dict['status'])
+        self.assertEqual('new_name', device_dict['device_template']['name'])
+
+    def _vnf_ids(self):
+        return [vnf['id'] for vnf in self.vnfm_plugin.get_vnfs(self.context)]
+
+    def test_get_vnfs_hides_internal_devices(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        device_id = dummy_device_obj['id']
+        self.assertEqual([device_id], self._vnf_ids())
+        self.vnfm_plugin._create_device_pre(self.context, {'device': {
+            'id': device_id + '-RESPAWN-1', 'tenant_id': 'tenant',
+            'template_id': dummy_device_obj['template_id']}})
+        self.assertEqual([device_id], self._vnf_ids())
+
+    def _respawn(self, device_id):
+        device_dict = self.vnfm_plugin.get_device(self.context, device_id)
+        device_dict['attributes']['failure_count'] = '1'
+        self.vnfm_plugin.respawn_device(self.context, device_dict)
+        self._assert_task_queued('respawn_device', device_id)
+        self.vnfm_plugin._respawn_device_task(
+            self.context, task_executor.Task(mock.Mock(), 'task', ''),
+            device_dict)
+        self.context.session.expire_all()
+        return self.vnfm_plugin.get_device(self.context, device_id)
+
+    def test_respawn_device(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        device_id = dummy_device_obj['id']
+        dead_instance_id = dummy_device_obj['instance_id']
+        dummy_device_obj.status = constants.DEAD
+        self.context.session.flush()
+        device = self._respawn(device_id)
+        self.assertEqual(constants.ACTIVE, device['status'])
+        self.assertNotEqual(dead_instance_id, device['instance_id'])
+        self.assertEqual({'failure_count': '1'}, device['attributes'])
+        self.assertEqual([device_id], self._vnf_ids())
+        # the dead stack is deleted in the background
+        self.assertTrue(self._pool.spawn_n.called)
+
+    def test_respawn_deleted_device(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        dummy_device_obj.status = constants.DEAD
+        self.context.session.flush()
+        with mock.patch.object(self.vnfm_plugin, '_replace_device_instance',
+                               return_value=False) as mock_replace:
+            device = self._respawn(dummy_device_obj['id'])
+        self.assertTrue(mock_replace.called)
+        self.assertEqual(constants.DEAD, device['status'])
+        self.assertEqual(dummy_device_obj['instance_id'],
+                         device['instance_id'])
+
+    def test_get_lifecycle_operations(self):
+        self._insert_dummy_device_template()
+        dummy_device_obj = self._insert_dummy_device()
+        self.vnfm_plugin.delete_vnf(self.context, dummy_device_obj['id'])
+        operations = self.vnfm_plugin.get_lifecycle_operations(self.context)
+        self.assertEqual(['delete_device'], [op['id'] for op in operations])
+        self.assertEqual(1, operations[0]['queued'])
+        self.assertEqual(0, operations[0]['worker_stats']['completed'])
+        task, = self.vnfm_plugin.get_lifecycle_tasks(self.context)
+        self.assertEqual(dummy_device_obj['id'], task['device_id'])
+        self.assertEqual(task, self.vnfm_plugin.get_lifecycle_task(
+            self.context, task['id']))
+        self.assertRaises(vnfm.LifecycleOperationNotFound,
+                          self.vnfm_plugin.get_lifecycle_operation,
+                          self.context, 'create_device')
+        self.assertRaises(vnfm.LifecycleTaskNotFound,
+                          self.vnfm_plugin.get_lifecycle_task,
+                          self.context, 'unknown')
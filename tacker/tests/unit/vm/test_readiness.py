@@ -0,0 +1,121 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import threading
+
+import mock
+from oslo_config import cfg
+
+from tacker.db.vm import vm_db
+from tacker.openstack.common import jsonutils
+from tacker.tests import base
+from tacker.vm import readiness
+
+
+class TestReadiness(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestReadiness, self).setUp()
+        self._override('mgmt_ready_timeout', 10)
+        self._override('mgmt_ready_backoff', 1)
+        self._override('mgmt_ready_max_backoff', 3)
+        self.now = [1000.0]
+        self.sleeps = []
+        mock.patch('time.time', side_effect=lambda: self.now[0]).start()
+        mock.patch('eventlet.sleep', side_effect=self._sleep).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _override(self, name, value):
+        cfg.CONF.set_override(name, value, 'servicevm')
+        self.addCleanup(cfg.CONF.clear_override, name, 'servicevm')
+
+    def _sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now[0] += seconds
+
+    def _device(self, mgmt_url):
+        return {'id': 'device', 'mgmt_endpoints': vm_db.mgmt_endpoints(
+            jsonutils.dumps(mgmt_url))}
+
+    def _listen(self, banner):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        self.addCleanup(server.close)
+
+        def serve():
+            conn, _addr = server.accept()
+            conn.sendall(banner)
+            conn.close()
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        return server.getsockname()[1]
+
+    def test_ssh_banner(self):
+        port = self._listen('SSH-2.0-dropbear\r\n')
+        self.assertTrue(readiness.is_reachable('127.0.0.1', port, True))
+
+    def test_no_ssh_banner(self):
+        port = self._listen('HTTP/1.0 400 Bad Request\r\n')
+        self.assertFalse(readiness.is_reachable('127.0.0.1', port, True))
+
+    def test_connection_refused(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        port = server.getsockname()[1]
+        server.close()
+        self.assertFalse(readiness.is_reachable('127.0.0.1', port, False))
+
+    def test_mgmt_addresses(self):
+        self.assertEqual(
+            [('10.0.0.1', 22), ('10.0.0.2', 22), ('10.0.0.3', 8080)],
+            readiness.mgmt_addresses(self._device(
+                {'vdu1': '10.0.0.2', 'vdu2': '10.0.0.1', 'vdu3': '10.0.0.1',
+                 'vdu4': {'ip': '10.0.0.3', 'port': 8080}}), 22))
+        self.assertEqual([], readiness.mgmt_addresses({'mgmt_url': None}, 22))
+
+    @mock.patch.object(readiness, 'is_reachable')
+    def test_wait_with_backoff(self, is_reachable):
+        answers = {'10.0.0.1': [False, False, True],
+                   '10.0.0.2': [False, True]}
+        is_reachable.side_effect = (
+            lambda address, port, banner: answers[address].pop(0))
+        self.assertTrue(readiness.wait_for_mgmt(
+            self._device({'vdu1': '10.0.0.1', 'vdu2': '10.0.0.2'})))
+        self.assertEqual([1, 2], self.sleeps)
+        # reachable addresses are not probed again
+        self.assertEqual(5, is_reachable.call_count)
+        is_reachable.assert_called_with('10.0.0.1', 22, True)
+
+    @mock.patch.object(readiness, 'is_reachable', return_value=True)
+    def test_endpoint_port_probed_without_banner(self, is_reachable):
+        self.assertTrue(readiness.wait_for_mgmt(self._device(
+            {'vdu1': {'ip': '10.0.0.1', 'port': 8080}})))
+        is_reachable.assert_called_once_with('10.0.0.1', 8080, False)
+
+    @mock.patch.object(readiness, 'is_reachable', return_value=False)
+    def test_wait_deadline(self, is_reachable):
+        self.assertFalse(readiness.wait_for_mgmt(
+            self._device({'vdu1': '10.0.0.1'})))
+        self.assertEqual([1, 2, 3, 3, 1], self.sleeps)
+        self.assertEqual(1010, self.now[0])
+
+    @mock.patch.object(readiness, 'is_reachable')
+    def test_no_wait(self, is_reachable):
+        self.assertTrue(readiness.wait_for_mgmt({'id': 'device'}))
+        self._override('mgmt_ready_port', 0)
+        self.assertTrue(readiness.wait_for_mgmt(
+            self._device({'vdu1': '10.0.0.1'})))
+        self.assertFalse(is_reachable.called)
+        self.assertEqual([], self.sleeps)
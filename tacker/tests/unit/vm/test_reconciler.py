@@ -0,0 +1,202 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo_config import cfg
+
+from tacker import context
+from tacker.db.vm import task_db
+from tacker.db.vm import vm_db
+from tacker.plugins.common import constants
+from tacker.tests.unit.db import base as db_base
+from tacker.vm import plugin
+from tacker.vm import reconciler
+
+TEMPLATE_ID = 'eb094833-995e-49f0-a047-dfb56aaf7c4e'
+TENANT_ID = 'ad7ebc56538745a08ef7c5e97f8bd437'
+
+
+class TestDeviceReconciler(db_base.SqlTestCase):
+
+    def setUp(self):
+        super(TestDeviceReconciler, self).setUp()
+        self.addCleanup(mock.patch.stopall)
+        self._override('reconcile_interval', 0)
+        self._override('reconcile_grace', 0)
+        self._override('lifecycle_workers', 0)
+        self.context = context.get_admin_context()
+        self.statuses = {}
+        self.device_manager = mock.Mock()
+        self.device_manager.invoke.side_effect = self._invoke
+        mock.patch('tacker.common.driver_manager.DriverManager',
+                   return_value=self.device_manager).start()
+        mock.patch('tacker.vm.monitor.DeviceStatus').start()
+        self.pool = mock.Mock()
+        mock.patch('eventlet.GreenPool', return_value=self.pool).start()
+        self.vnfm_plugin = plugin.VNFMPlugin()
+        self.reconciler = self.vnfm_plugin._reconciler
+        self._insert_device_template()
+
+    def _override(self, name, value):
+        cfg.CONF.set_override(name, value, 'servicevm')
+        self.addCleanup(cfg.CONF.clear_override, name, 'servicevm')
+
+    def _invoke(self, driver_name, method, **kwargs):
+        if method == 'get_statuses':
+            return dict((instance_id, self.statuses[instance_id])
+                        for instance_id in kwargs['device_ids']
+                        if instance_id in self.statuses)
+
+    def _insert_device_template(self):
+        session = self.context.session
+        session.add(vm_db.DeviceTemplate(
+            id=TEMPLATE_ID, tenant_id=TENANT_ID, name='fake_template',
+            infra_driver='fake_driver', mgmt_driver='fake_mgmt_driver'))
+        session.flush()
+
+    def _insert_device(self, device_id, status, instance_id=None):
+        session = self.context.session
+        session.add(vm_db.Device(
+            id=device_id, tenant_id=TENANT_ID, name=device_id,
+            instance_id=instance_id, template_id=TEMPLATE_ID,
+            status=status))
+        session.add(vm_db.DeviceAttribute(
+            id=device_id + '-attr', device_id=device_id, key='key',
+            value='value'))
+        session.flush()
+
+    def _status(self, device_id):
+        device_db = (self.context.session.query(vm_db.Device).
+                     filter_by(id=device_id).first())
+        return device_db and device_db.status
+
+    def test_transitions(self):
+        self._insert_device('create-no-instance', constants.PENDING_CREATE)
+        self._insert_device('create-failed', constants.PENDING_CREATE, 'i1')
+        self._insert_device('create-running', constants.PENDING_CREATE,
+                            'i2')
+        self._insert_device('update-done', constants.PENDING_UPDATE, 'i3')
+        self._insert_device('update-gone', constants.PENDING_UPDATE, 'i4')
+        self._insert_device('delete-gone', constants.PENDING_DELETE, 'i5')
+        self._insert_device('active', constants.ACTIVE, 'i6')
+        self.statuses.update({'i1': constants.ERROR,
+                              'i2': constants.PENDING_CREATE,
+                              'i3': constants.ACTIVE,
+                              'i6': constants.ACTIVE})
+
+        self.reconciler.reconcile()
+
+        self.assertEqual(constants.ERROR, self._status('create-no-instance'))
+        self.assertEqual(constants.ERROR, self._status('create-failed'))
+        self.assertEqual(constants.PENDING_CREATE,
+                         self._status('create-running'))
+        self.assertEqual(constants.ACTIVE, self._status('update-done'))
+        self.assertEqual(constants.ERROR, self._status('update-gone'))
+        self.assertIsNone(self._status('delete-gone'))
+        self.assertEqual(0, self.context.session.query(
+            vm_db.DeviceAttribute).filter_by(device_id='delete-gone').count())
+        self.assertEqual(constants.ACTIVE, self._status('active'))
+        self.assertFalse(self.pool.spawn_n.called)
+
+    def test_statuses_queried_per_page(self):
+        self._override('reconcile_page_size', 2)
+        for i in range(5):
+            self._insert_device('update-%d' % i, constants.PENDING_UPDATE,
+                                'i%d' % i)
+            self.statuses['i%d' % i] = constants.ACTIVE
+
+        self.reconciler.reconcile()
+
+        calls = [c for c in self.device_manager.invoke.call_args_list
+                 if c[0][1] == 'get_statuses']
+        self.assertEqual([2, 2, 1],
+                         [len(c[1]['device_ids']) for c in calls])
+        for i in range(5):
+            self.assertEqual(constants.ACTIVE, self._status('update-%d' % i))
+
+    def test_grace_period(self):
+        self._override('reconcile_grace', 900)
+        self._insert_device('create-no-instance', constants.PENDING_CREATE)
+        with mock.patch('time.time', return_value=1000):
+            self.reconciler.reconcile()
+        self.assertEqual(constants.PENDING_CREATE,
+                         self._status('create-no-instance'))
+        with mock.patch('time.time', return_value=1900):
+            self.reconciler.reconcile()
+        self.assertEqual(constants.ERROR, self._status('create-no-instance'))
+
+    def test_completed_create_finished_once(self):
+        self._insert_device('create-done', constants.PENDING_CREATE, 'i1')
+        self.statuses['i1'] = constants.ACTIVE
+
+        with mock.patch.object(self.vnfm_plugin, 'spawn_n') as spawn_n:
+            self.reconciler.reconcile()
+            self.reconciler.reconcile()
+
+        spawn_n.assert_called_once_with(
+            'create_device', self.reconciler._finish_create, mock.ANY,
+            'create-done')
+        with mock.patch.object(self.vnfm_plugin,
+                               '_create_device_complete') as complete:
+            self.reconciler._finish_create(self.context, 'create-done')
+        self.assertEqual('create-done', complete.call_args[0][1]['id'])
+        self.assertEqual(set(), self.reconciler._in_flight)
+
+    def test_device_with_task_skipped(self):
+        self._insert_device('create-queued', constants.PENDING_CREATE)
+        self.vnfm_plugin.submit(self.context, 'create_device',
+                                device_id='create-queued', device_dict={})
+
+        self.reconciler.reconcile()
+
+        self.assertEqual(constants.PENDING_CREATE,
+                         self._status('create-queued'))
+
+    def test_only_lease_holder_reconciles(self):
+        self._override('reconcile_interval', 60)
+        other = reconciler.DeviceReconciler(self.vnfm_plugin)
+        self.reconciler.reconcile()
+        self._insert_device('create-no-instance', constants.PENDING_CREATE)
+
+        other.reconcile()
+        self.assertEqual(constants.PENDING_CREATE,
+                         self._status('create-no-instance'))
+
+        # handed over when the holder stops
+        self.vnfm_plugin._release_lease(self.context, reconciler.LEASE_NAME,
+                                        self.reconciler._owner)
+        other.reconcile()
+        self.assertEqual(constants.ERROR, self._status('create-no-instance'))
+        self.reconciler.reconcile()
+        self.assertEqual(1, self.context.session.query(
+            task_db.LifecycleLease).count())
+
+    def test_active_instance_deleted_again(self):
+        self._insert_device('delete-lost', constants.PENDING_DELETE, 'i1')
+        self.statuses['i1'] = constants.ACTIVE
+
+        self.reconciler.reconcile()
+
+        self.device_manager.invoke.assert_called_with(
+            'fake_driver', 'delete', plugin=self.vnfm_plugin,
+            context=mock.ANY, device_id='i1')
+        self.assertEqual(constants.PENDING_DELETE, self._status('delete-lost'))
+
+    def test_driver_without_statuses_skipped(self):
+        self._insert_device('update', constants.PENDING_UPDATE, 'i1')
+        self.device_manager.invoke.side_effect = NotImplementedError
+
+        self.reconciler.reconcile()
+        self.reconciler.reconcile()
+
+        self.assertEqual(1, self.device_manager.invoke.call_count)
+        self.assertEqual(constants.PENDING_UPDATE, self._status('update'))
@@ -0,0 +1,81 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+from oslo_config import cfg
+
+from tacker.plugins.common import constants
+from tacker.tests import base
+from tacker.vm import status_batcher
+
+
+class TestStatusBatcher(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestStatusBatcher, self).setUp()
+        self.plugin = mock.Mock()
+        # d3 left PENDING_CREATE before its transition was written
+        self.plugin._bulk_update_device_status.side_effect = (
+            lambda context, device_ids, current_status, new_status:
+            [device_id for device_id in device_ids if device_id != 'd3'])
+        self.batcher = status_batcher.StatusBatcher(self.plugin)
+
+    def _override(self, name, value):
+        cfg.CONF.set_override(name, value, 'servicevm')
+        self.addCleanup(cfg.CONF.clear_override, name, 'servicevm')
+
+    def _update(self, transitions):
+        pool = eventlet.GreenPool()
+        results = {}
+
+        def update(device_id, new_status):
+            try:
+                results[device_id] = self.batcher.update(
+                    device_id, constants.PENDING_CREATE, new_status)
+            except ValueError:
+                results[device_id] = 'error'
+        for device_id, new_status in transitions:
+            pool.spawn_n(update, device_id, new_status)
+        pool.waitall()
+        return results
+
+    def _calls(self):
+        return sorted((sorted(c[0][1]), c[0][2], c[0][3]) for c in
+                      self.plugin._bulk_update_device_status.call_args_list)
+
+    def test_transitions_coalesced(self):
+        results = self._update([('d1', constants.ACTIVE),
+                                ('d2', constants.ERROR),
+                                ('d3', constants.ACTIVE)])
+        self.assertEqual({'d1': True, 'd2': True, 'd3': False}, results)
+        self.assertEqual(
+            [(['d1', 'd3'], constants.PENDING_CREATE, constants.ACTIVE),
+             (['d2'], constants.PENDING_CREATE, constants.ERROR)],
+            self._calls())
+
+    def test_failure_raised_to_waiters(self):
+        self.plugin._bulk_update_device_status.side_effect = ValueError
+        results = self._update([('d1', constants.ACTIVE),
+                                ('d2', constants.ACTIVE)])
+        self.assertEqual({'d1': 'error', 'd2': 'error'}, results)
+        self.assertEqual(1, self.plugin._bulk_update_device_status.call_count)
+
+    def test_no_window(self):
+        self._override('status_batch_window', 0)
+        results = self._update([('d1', constants.ACTIVE),
+                                ('d3', constants.ACTIVE)])
+        self.assertEqual({'d1': True, 'd3': False}, results)
+        self.assertEqual(
+            [(['d1'], constants.PENDING_CREATE, constants.ACTIVE),
+             (['d3'], constants.PENDING_CREATE, constants.ACTIVE)],
+            self._calls())
@@ -0,0 +1,249 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from eventlet import event
+import mock
+from oslo_config import cfg
+
+from tacker import context
+from tacker.db.vm import task_db
+from tacker.openstack.common import timeutils
+from tacker.tests.unit.db import base as db_base
+from tacker.vm import monitor
+from tacker.vm import task_executor
+
+
+class FakePlugin(task_db.LifecycleTaskDbMixin):
+    pass
+
+
+class TestTaskExecutor(db_base.SqlTestCase):
+
+    def setUp(self):
+        super(TestTaskExecutor, self).setUp()
+        self._override('lifecycle_retry_backoff', 10)
+        self._override('lifecycle_max_attempts', 2)
+        cfg.CONF.set_override('auth_strategy', 'noauth')
+        self.addCleanup(cfg.CONF.clear_override, 'auth_strategy')
+        self.context = context.get_admin_context()
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.calls = []
+        self.gate = event.Event()
+        self.executor = self._executor()
+
+    def _override(self, name, value):
+        cfg.CONF.set_override(name, value, 'servicevm')
+        self.addCleanup(cfg.CONF.clear_override, name, 'servicevm')
+
+    def _executor(self, workers=4):
+        executor = task_executor.TaskExecutor(FakePlugin(), workers)
+        executor.register('record', self._record)
+        executor.register('fail', self._fail)
+        executor.register('steps', self._steps)
+        executor.register('block', self._block)
+        return executor
+
+    def _record(self, context, task, value):
+        self.calls.append((context.tenant_id, value))
+
+    def _fail(self, context, task):
+        self.calls.append('fail')
+        raise ValueError('boom')
+
+    def _block(self, context, task, value):
+        self.calls.append(value)
+        self.gate.wait()
+
+    def _steps(self, context, task):
+        task.step('first', self.calls.append, 'first')
+        if not task.done('second'):
+            self.calls.append('second')
+            raise ValueError('second failed')
+
+    def _run(self, executor=None):
+        executor = executor or self.executor
+        executor.poll()
+        executor._pool.waitall()
+
+    def _tasks(self):
+        self.context.session.expire_all()
+        return self.context.session.query(task_db.LifecycleTask).all()
+
+    def test_task_run_and_removed(self):
+        user_context = context.Context('user', 'tenant')
+        self.executor.submit(user_context, 'record', value=[1])
+        self._run()
+        self.assertEqual([('tenant', [1])], self.calls)
+        self.assertEqual([], self._tasks())
+
+    @mock.patch.object(monitor, 'service_token',
+                       return_value={'id': 'service-token'})
+    def test_caller_token_not_queued(self, service_token):
+        cfg.CONF.set_override('auth_strategy', 'keystone')
+        contexts = []
+        self.executor.register(
+            'context', lambda context, task: contexts.append(context))
+        self.executor.submit(context.Context('user', 'tenant',
+                                             roles=['member'],
+                                             auth_token='user-token'),
+                             'context')
+        self.assertNotIn('user-token', self._tasks()[0].payload)
+        self._run()
+        self.assertEqual(
+            [('user', 'tenant', ['member'], 'service-token')],
+            [(ctx.user_id, ctx.tenant_id, ctx.roles, ctx.auth_token)
+             for ctx in contexts])
+
+    def test_failed_task_retried_with_backoff(self):
+        self.executor.submit(self.context, 'fail')
+        self._run()
+        task, = self._tasks()
+        self.assertEqual(task_db.TASK_PENDING, task.status)
+        self.assertEqual(1, task.attempts)
+        self.assertEqual('ValueError: boom', task.last_error)
+        self._run()
+        self.assertEqual(['fail'], self.calls)
+
+        timeutils.advance_time_seconds(10)
+        self._run()
+        task, = self._tasks()
+        self.assertEqual(['fail', 'fail'], self.calls)
+        self.assertEqual(task_db.TASK_FAILED, task.status)
+        timeutils.advance_time_seconds(3600)
+        self._run()
+        self.assertEqual(2, len(self.calls))
+
+    def test_done_steps_not_run_again(self):
+        self.executor.submit(self.context, 'steps')
+        self._run()
+        self.assertEqual('first', self._tasks()[0].steps)
+        timeutils.advance_time_seconds(10)
+        self._run()
+        self.assertEqual(['first', 'second', 'second'], self.calls)
+
+    def test_expired_lease_taken_over(self):
+        self.executor.submit(self.context, 'record', value=1)
+        plugin = self.executor._plugin
+        leased = plugin._lease_tasks(self.context, 'dead-worker', 10, 60)
+        self.assertEqual(1, len(leased))
+
+        other = self._executor()
+        self._run(other)
+        self.assertEqual([], self.calls)
+        timeutils.advance_time_seconds(61)
+        self._run(other)
+        self.assertEqual([(None, 1)], self.calls)
+        self.assertEqual([], self._tasks())
+
+    def test_lease_renewed_while_running(self):
+        self.executor.submit(self.context, 'record', value=1)
+        plugin = self.executor._plugin
+        task, = plugin._lease_tasks(self.context, self.executor.owner, 10, 60)
+        self.executor._running.add(task.id)
+        timeutils.advance_time_seconds(50)
+        self.executor.poll()
+        timeutils.advance_time_seconds(50)
+        self.assertEqual(
+            [], plugin._lease_tasks(self.context, 'other-worker', 10, 60))
+
+    def test_operation_limit(self):
+        self._override('lifecycle_operation_workers', {'block': '2'})
+        executor = self._executor()
+        for i in range(4):
+            executor.submit(self.context, 'block', value=i)
+        executor.submit(self.context, 'record', value='other')
+        executor.poll()
+        self._sleep()
+        self.assertEqual(3, len(self.calls))
+        self.assertIn((None, 'other'), self.calls)
+        stats = executor.get_stats()
+        self.assertEqual(2, stats['block']['running'])
+        self.assertEqual(1, stats['record']['completed'])
+        self.gate.send()
+        executor._pool.waitall()
+        self.assertEqual(2, executor.get_stats()['block']['completed'])
+
+    def test_drain_hands_over_running_tasks(self):
+        self.executor.submit(self.context, 'block', value=1)
+        self.executor.poll()
+        self._sleep()
+        self.executor.drain(0.01)
+        task, = self._tasks()
+        self.assertEqual(task_db.TASK_PENDING, task.status)
+        self.assertIsNone(task.lease_owner)
+        self.executor.poll()
+        self.assertEqual([1], self.calls)
+        self.gate.send()
+
+    def test_local_operation_accounted(self):
+        self.executor.spawn_n('local', self.calls.append, 'local')
+        self.executor._pool.waitall()
+        self.assertEqual(['local'], self.calls)
+        self.assertEqual(1, self.executor.get_stats()['local']['completed'])
+
+    def _sleep(self):
+        for i in range(10):
+            eventlet.sleep(0)
+
+    def _wait(self, context, task, value):
+        with self.executor.stage('block', 'wait', unbounded=True):
+            self.calls.append(value)
+            self.gate.wait()
+
+    def test_unbounded_stage(self):
+        self._override('lifecycle_operation_workers', {'block': '1'})
+        self.executor = self._executor()
+        self.executor.register('block', self._wait)
+        for i in range(3):
+            self.executor.submit(self.context, 'block', value=i)
+        self.executor.poll()
+        self._sleep()
+        self.executor.poll()
+        self._sleep()
+        self.assertEqual([0, 1], self.calls)
+        stats = self.executor.get_stats()['block']
+        # both wait, so the third task would be leased by the next poll
+        self.assertEqual(2, stats['running'])
+        self.assertEqual(2, stats['waiting'])
+        self.gate.send()
+        self.executor._pool.waitall()
+        stats = self.executor.get_stats()['block']
+        self.assertEqual(0, stats['waiting'])
+        self.assertEqual(2, stats['stages']['wait']['<=1'])
+
+    def test_waiting_creates_leave_workers_for_delete(self):
+        self._override('lifecycle_operation_workers', {'block': '2'})
+        self._override('lifecycle_wait_workers', 2)
+        self.executor = self._executor()
+        self.executor.register('block', self._wait)
+        for i in range(6):
+            self.executor.submit(self.context, 'block', value=i)
+        for i in range(3):
+            self.executor.poll()
+            self._sleep()
+        # two waiting tasks are parked, the other two use workers
+        self.assertEqual([0, 1, 2, 3], sorted(self.calls))
+        self.executor.submit(self.context, 'record', value='delete')
+        self.executor.poll()
+        self._sleep()
+        self.assertEqual((None, 'delete'), self.calls[-1])
+        self.assertEqual(4, self.executor.get_stats()['block']['running'])
+        self.gate.send()
+        self.executor._pool.waitall()
+
+    def test_stage_outside_executor_bounded(self):
+        with self.executor.stage('record', 'sync', unbounded=True):
+            self.assertEqual(0, self.executor.get_stats()['record']['waiting'])
+        self.assertEqual(
+            1, self.executor.get_stats()['record']['stages']['sync']['<=1'])
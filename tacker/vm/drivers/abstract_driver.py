@@ -64,8 +64,22 @@ class DeviceAbstractDriver(extensions.PluginInterface):
         pass
 
     @abc.abstractmethod
-    def update_wait(self, plugin, context, device_id):
-        pass
+    def update_wait(self, plugin, context, device_dict, device_id):
+        """wait for device update to complete."""
+
+    # @abc.abstractmethod
+    def scale(self, plugin, context, device_id, device_dict, scale):
+        """Add or remove instances of the scalable vdus of the device.
+
+        scale is a dict of type, 'out' or 'in', count and optionally the
+        vdu to scale, all of them when it is missing.
+        """
+        raise NotImplementedError()
+
+    # @abc.abstractmethod
+    def scale_wait(self, plugin, context, device_dict, device_id):
+        """Wait for scale and refresh mgmt_url of device_dict."""
+        raise NotImplementedError()
 
     @abc.abstractmethod
     def delete(self, plugin, context, device_id):
@@ -75,6 +89,16 @@ class DeviceAbstractDriver(extensions.PluginInterface):
     def delete_wait(self, plugin, context, device_id):
         pass
 
+    # @abc.abstractmethod
+    def get_statuses(self, plugin, context, device_ids):
+        """Return the status of many devices with as few calls as possible.
+
+        Returns a dict from device id to one of ACTIVE, ERROR or
+        PENDING_{CREATE,UPDATE,DELETE}. Devices which no longer exist are
+        left out.
+        """
+        raise NotImplementedError()
+
     @abc.abstractmethod
     def attach_interface(self, plugin, context, device_id, port_id):
         pass
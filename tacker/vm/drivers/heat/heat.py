@@ -21,21 +21,27 @@
 # @author: Isaku Yamahata, Intel Corporation.
 # shamelessly many codes are stolen from gbp simplechain_driver.py
 
+import copy
 import sys
 import time
-import yaml
 
-from heatclient import client as heat_client
-from heatclient import exc as heatException
-from keystoneclient.v2_0 import client as ks_client
 from oslo_config import cfg
 
 from tacker.common import log
+from tacker.common import utils
 from tacker.extensions import vnfm
 from tacker.openstack.common import jsonutils
 from tacker.openstack.common import log as logging
+from tacker.plugins.common import constants
 from tacker.vm.drivers import abstract_driver
 
+# NOTE: imported on first use, API workers which never talk to heat do not
+# pay for the client libraries.
+yaml = utils.LazyModule('yaml')
+heat_client = utils.LazyModule('heatclient.client')
+heatException = utils.LazyModule('heatclient.exc')
+ks_client = utils.LazyModule('keystoneclient.v2_0.client')
+
 
 LOG = logging.getLogger(__name__)
 CONF = cfg.CONF
@@ -56,10 +62,87 @@ CONF.register_opts(OPTS, group='servicevm_heat')
 STACK_RETRIES = cfg.CONF.servicevm_heat.stack_retries
 STACK_RETRY_WAIT = cfg.CONF.servicevm_heat.stack_retry_wait
 
+# stacks listed per request when querying many devices at once, keeps the
+# id filter in the query string well below common URL length limits
+STACK_LIST_BATCH = 50
+
 HEAT_TEMPLATE_BASE = """
 heat_template_version: 2013-05-23
 """
 
+# a vdu with a count is a group of identical servers which can be scaled
+RESOURCE_GROUP = 'OS::Heat::ResourceGroup'
+# device_dict key holding the updated_time of the stack before the driver
+# updated it, missing when update() sent nothing to heat
+STACK_UPDATED_TIME = 'stack_updated_time'
+
+
+def _device_status(stack_status):
+    """Map a heat stack status to a device status, None for deleted."""
+    action, _sep, state = stack_status.partition('_')
+    if state == 'IN_PROGRESS':
+        if action in ('CREATE', 'DELETE'):
+            return 'PENDING_' + action
+        return constants.PENDING_UPDATE
+    if state == 'FAILED':
+        return constants.ERROR
+    if action == 'DELETE':
+        return None
+    return constants.ACTIVE
+
+
+def _server_dict(resource_dict):
+    """Return the server definition of a vdu resource."""
+    if resource_dict.get('type') == RESOURCE_GROUP:
+        return resource_dict['properties']['resource_def']
+    return resource_dict
+
+
+def _apply_group_counts(template_dict, heat_template_yaml):
+    """Size the groups of template_dict like in heat_template_yaml.
+
+    A device keeps the size it was scaled to when its stack is created
+    again from the VNFD, e.g. by a respawn.
+    """
+    old_resources = (yaml.load(heat_template_yaml or '{}') or
+                     {}).get('resources') or {}
+    for name, resource in (template_dict.get('resources') or {}).items():
+        old_resource = old_resources.get(name) or {}
+        if (resource.get('type') == RESOURCE_GROUP and
+                old_resource.get('type') == RESOURCE_GROUP):
+            resource['properties']['count'] = (
+                old_resource['properties']['count'])
+
+
+def _mgmt_ips(outputs):
+    """Return the management addresses of the vdus found in outputs.
+
+    The output of a resource group lists one address per member, they
+    are reported as <vdu>-<index>.
+    """
+    PREFIX = 'mgmt_ip-'
+    mgmt_ips = {}
+    for output in outputs:
+        key = output.get('output_key', '')
+        if not key.startswith(PREFIX):
+            continue
+        vdu_id = key[len(PREFIX):]
+        value = output['output_value']
+        if isinstance(value, list):
+            for index, address in enumerate(value):
+                mgmt_ips['%s-%d' % (vdu_id, index)] = address
+        else:
+            mgmt_ips[vdu_id] = value
+    return mgmt_ips
+
+
+def _changed_resources(template_dict, new_template_dict):
+    """Return the names of the resources added, removed or modified."""
+    resources = template_dict.get('resources') or {}
+    new_resources = new_template_dict.get('resources') or {}
+    return sorted(name for name in set(resources) | set(new_resources)
+                  if resources.get(name) != new_resources.get(name))
+
 
 class DeviceHeat(abstract_driver.DeviceAbstractDriver):
 
@@ -135,9 +218,9 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
         if param_vattrs_yaml:
             try:
                 param_vattrs_dict = yaml.load(param_vattrs_yaml)
-                LOG.debug('param_vattrs_yaml', param_vattrs_dict)
+                LOG.debug('param_vattrs_yaml %s', param_vattrs_dict)
             except Exception as e:
-                LOG.debug("Not Well Formed: %s", str(e))
+                LOG.debug("Not Well Formed: %s", e)
                 raise vnfm.ParamYAMLNotWellFormed(
                     error_msg_details=str(e))
             else:
@@ -145,6 +228,27 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
         else:
             raise vnfm.ParamYAMLInputMissing()
 
+    @log.log
+    def _process_vdu_group_network_interfaces(self, vdu_id, vdu_dict,
+                                              properties, template_dict):
+        # ports in the parent template would be shared by all the members,
+        # so the servers of a group are plugged into the networks directly
+        networks_list = []
+        outputs_dict = template_dict.setdefault('outputs', {})
+        properties['networks'] = networks_list
+        for network_param in vdu_dict['network_interfaces'].values():
+            if 'addresses' in network_param:
+                raise vnfm.ScalableVDUAddresses(vdu_id=vdu_id)
+            if network_param.pop('management', False):
+                outputs_dict['mgmt_ip-%s' % vdu_id] = {
+                    'description': 'management ip addresses',
+                    'value': {
+                        'get_attr': [vdu_id, 'networks',
+                                     network_param['network'], 0]
+                    }
+                }
+            networks_list.append(network_param)
+
     @log.log
     def _process_vdu_network_interfaces(self, vdu_id, vdu_dict, properties,
                                         template_dict):
@@ -257,9 +361,12 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
                 for (key, vdu_key) in KEY_LIST:
                     properties[key] = vdu_dict[vdu_key]
                 if 'network_interfaces' in vdu_dict:
-                    self._process_vdu_network_interfaces(vdu_id, vdu_dict,
-                                                         properties,
-                                                         template_dict)
+                    if 'count' in vdu_dict:
+                        self._process_vdu_group_network_interfaces(
+                            vdu_id, vdu_dict, properties, template_dict)
+                    else:
+                        self._process_vdu_network_interfaces(
+                            vdu_id, vdu_dict, properties, template_dict)
                 if 'user_data' in vdu_dict and 'user_data_format' in vdu_dict:
                     properties['user_data_format'] = vdu_dict[
                         'user_data_format']
@@ -277,6 +384,15 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
                     for key, value in metadata.items():
                         metadata[key] = value[:255]
 
+                if 'count' in vdu_dict:
+                    template_dict['resources'][vdu_id] = {
+                        'type': RESOURCE_GROUP,
+                        'properties': {
+                            'count': int(vdu_dict['count']),
+                            'resource_def': resource_dict,
+                        }
+                    }
+
                 # monitoring_policy = vdu_dict.get('monitoring_policy', None)
                 # failure_policy = vdu_dict.get('failure_policy', None)
 
@@ -288,25 +404,13 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
                             'attributes', {})[key] = vdu_dict[key]
 
             if config_yaml is not None:
-                config_dict = yaml.load(config_yaml)
-                resources = template_dict.setdefault('resources', {})
-                for vdu_id, vdu_dict in config_dict.get('vdus', {}).items():
-                    if vdu_id not in resources:
-                        continue
-                    config = vdu_dict.get('config', None)
-                    if not config:
-                        continue
-                    properties = resources[vdu_id].setdefault('properties', {})
-                    properties['config_drive'] = True
-                    metadata = properties.setdefault('metadata', {})
-                    metadata.update(config)
-                    for key, value in metadata.items():
-                        metadata[key] = value[:255]
+                self._apply_config(template_dict, config_yaml)
+            _apply_group_counts(template_dict,
+                                device['attributes'].get('heat_template'))
 
             heat_template_yaml = yaml.dump(template_dict)
             fields['template'] = heat_template_yaml
-            if not device['attributes'].get('heat_template'):
-                device['attributes']['heat_template'] = heat_template_yaml
+            device['attributes']['heat_template'] = heat_template_yaml
 
         if 'stack_name' not in fields:
             name = (__name__ + '_' + self.__class__.__name__ + '-' +
@@ -323,6 +427,25 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
         stack = heatclient_.create(fields)
         return stack['stack']['id']
 
+    @staticmethod
+    def _apply_config(template_dict, config_yaml):
+        """Pass the config of every vdu to its server as metadata."""
+        config_dict = yaml.load(config_yaml) or {}
+        resources = template_dict.setdefault('resources', {})
+        for vdu_id, vdu_dict in config_dict.get('vdus', {}).items():
+            if vdu_id not in resources:
+                continue
+            config = vdu_dict.get('config', None)
+            if not config:
+                continue
+            properties = _server_dict(resources[vdu_id]).setdefault(
+                'properties', {})
+            properties['config_drive'] = True
+            metadata = properties.setdefault('metadata', {})
+            metadata.update(config)
+            for key, value in metadata.items():
+                metadata[key] = value[:255]
+
     def create_wait(self, plugin, context, device_dict, device_id):
         heatclient_ = HeatClient(context)
 
@@ -344,7 +467,7 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
             stack_retries = stack_retries - 1
 
         LOG.debug(_('stack status: %(stack)s %(status)s'),
-                  {'stack': str(stack), 'status': status})
+                  {'stack': stack, 'status': status})
         if stack_retries == 0:
             LOG.warn(_("Resource creation is"
                        " not completed within %(wait)s seconds as "
@@ -355,11 +478,7 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
             raise vnfm.DeviceCreateWaitFailed(device_id=device_id)
         outputs = stack.outputs
         LOG.debug(_('outputs %s'), outputs)
-        PREFIX = 'mgmt_ip-'
-        mgmt_ips = dict((output['output_key'][len(PREFIX):],
-                         output['output_value'])
-                        for output in outputs
-                        if output.get('output_key', '').startswith(PREFIX))
+        mgmt_ips = _mgmt_ips(outputs)
         if mgmt_ips:
             device_dict['mgmt_url'] = jsonutils.dumps(mgmt_ips)
 
@@ -367,16 +486,22 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
     def update(self, plugin, context, device_id, device_dict, device):
         # checking if the stack exists at the moment
         heatclient_ = HeatClient(context)
-        heatclient_.get(device_id)
+        stack = heatclient_.get(device_id)
+
+        dev_attrs = device_dict.setdefault('attributes', {})
+        update_attrs = device['device'].get('attributes', {})
+        parameters = {}
+        if 'parameters' in update_attrs:
+            parameters = jsonutils.loads(update_attrs['parameters'])
 
         # update config attribute
-        config_yaml = device_dict.get('attributes', {}).get('config', '')
-        update_yaml = device['device'].get('attributes', {}).get('config', '')
+        config_yaml = dev_attrs.get('config', '')
+        update_yaml = update_attrs.get('config', '')
         LOG.debug('yaml orig %(orig)s update %(update)s',
                   {'orig': config_yaml, 'update': update_yaml})
         config_dict = yaml.load(config_yaml) or {}
         update_dict = yaml.load(update_yaml)
-        if not update_dict:
+        if not update_dict and not parameters:
             return
 
         @log.log
@@ -389,18 +514,131 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
 
                 orig_dict[key] = value
 
-        LOG.debug('dict orig %(orig)s update %(update)s',
-                  {'orig': config_dict, 'update': update_dict})
-        deep_update(config_dict, update_dict)
-        LOG.debug('dict new %(new)s update %(update)s',
-                  {'new': config_dict, 'update': update_dict})
-        new_yaml = yaml.dump(config_dict)
-        device_dict.setdefault('attributes', {})['config'] = new_yaml
+        if update_dict:
+            LOG.debug('dict orig %(orig)s update %(update)s',
+                      {'orig': config_dict, 'update': update_dict})
+            deep_update(config_dict, update_dict)
+            LOG.debug('dict new %(new)s update %(update)s',
+                      {'new': config_dict, 'update': update_dict})
+            new_yaml = yaml.dump(config_dict)
+            dev_attrs['config'] = new_yaml
+
+        if self._update_stack(heatclient_, device_id, dev_attrs, parameters):
+            device_dict[STACK_UPDATED_TIME] = stack.updated_time
+
+    def _update_stack(self, heatclient_, stack_id, dev_attrs, parameters):
+        """Apply the new config and parameters to the running stack.
+
+        The template rendered with the new config is diffed against the
+        heat_template attribute and only sent when some resource changed.
+        The update is a PATCH, so heat keeps the parameters not given and
+        touches only the changed resources instead of rebuilding the VMs.
+        Return whether an update was sent.
+        """
+        fields = {}
+        heat_template_yaml = dev_attrs.get('heat_template')
+        if heat_template_yaml and dev_attrs.get('config'):
+            template_dict = yaml.load(heat_template_yaml)
+            new_template_dict = copy.deepcopy(template_dict)
+            self._apply_config(new_template_dict, dev_attrs['config'])
+            changed = _changed_resources(template_dict, new_template_dict)
+            if changed:
+                LOG.debug(_('resources %(changed)s of stack %(stack)s '
+                            'changed'),
+                          {'changed': changed, 'stack': stack_id})
+                fields['template'] = yaml.dump(new_template_dict)
+        if parameters:
+            fields['parameters'] = parameters
+        if not fields:
+            return False
+
+        heatclient_.update(stack_id, **fields)
+        if 'template' in fields:
+            dev_attrs['heat_template'] = fields['template']
+        if parameters:
+            current = jsonutils.loads(dev_attrs.get('parameters') or '{}')
+            current.update(parameters)
+            dev_attrs['parameters'] = jsonutils.dumps(current)
+        return True
+
+    def update_wait(self, plugin, context, device_dict, device_id):
+        if STACK_UPDATED_TIME in device_dict:
+            self._wait_update(HeatClient(context), device_id,
+                              device_dict.pop(STACK_UPDATED_TIME))
+
+    def _wait_update(self, heatclient_, device_id, updated_time):
+        """Wait for the update sent to the stack to finish.
+
+        Heat only moves the stack to UPDATE_IN_PROGRESS after the update
+        request returned, so the stack is polled until it finished an
+        update or rollback after updated_time. Anything but UPDATE_COMPLETE
+        means the update failed.
+        """
+        stack_retries = STACK_RETRIES
+        while True:
+            stack = heatclient_.get(device_id)
+            status = stack.stack_status
+            action, _sep, state = status.partition('_')
+            if (stack.updated_time != updated_time and
+                    action in ('UPDATE', 'ROLLBACK') and
+                    state != 'IN_PROGRESS'):
+                break
+            if stack_retries == 0:
+                LOG.warn(_("update of stack %(stack)s is not completed "
+                           "within %(wait)s seconds"),
+                         {'stack': device_id,
+                          'wait': STACK_RETRIES * STACK_RETRY_WAIT})
+                break
+            stack_retries = stack_retries - 1
+            time.sleep(STACK_RETRY_WAIT)
+
+        LOG.debug(_('stack status: %(stack)s %(status)s'),
+                  {'stack': device_id, 'status': status})
+        if status != 'UPDATE_COMPLETE':
+            raise vnfm.DeviceUpdateWaitFailed(device_id=device_id)
+        return stack
 
-    def update_wait(self, plugin, context, device_id):
-        # do nothing but checking if the stack exists at the moment
+    @log.log
+    def scale(self, plugin, context, device_id, device_dict, scale):
+        dev_attrs = device_dict.setdefault('attributes', {})
+        template_dict = yaml.load(dev_attrs.get('heat_template') or '{}')
+        groups = dict((name, resource) for name, resource in
+                      (template_dict.get('resources') or {}).items()
+                      if resource.get('type') == RESOURCE_GROUP)
+        names = sorted(groups)
+        if scale.get('vdu') is not None:
+            names = [name for name in names if name == scale['vdu']]
+        if not names:
+            raise vnfm.DeviceNotScalable(device_id=device_dict['id'])
+
+        delta = scale['count']
+        if scale['type'] == 'in':
+            delta = -delta
+        for name in names:
+            properties = groups[name]['properties']
+            count = properties['count'] + delta
+            if count < 0:
+                raise vnfm.DeviceScaleInvalid(
+                    msg=_('vdu %(vdu)s has only %(count)d instances') %
+                    {'vdu': name, 'count': properties['count']})
+            properties['count'] = count
+        LOG.debug(_('scaling %(names)s of stack %(stack)s by %(delta)d'),
+                  {'names': names, 'stack': device_id, 'delta': delta})
+
+        heat_template_yaml = yaml.dump(template_dict)
         heatclient_ = HeatClient(context)
-        heatclient_.get(device_id)
+        stack = heatclient_.get(device_id)
+        heatclient_.update(device_id, template=heat_template_yaml)
+        dev_attrs['heat_template'] = heat_template_yaml
+        device_dict[STACK_UPDATED_TIME] = stack.updated_time
+
+    def scale_wait(self, plugin, context, device_dict, device_id):
+        stack = self._wait_update(HeatClient(context), device_id,
+                                  device_dict.pop(STACK_UPDATED_TIME, None))
+        # members were added or removed
+        mgmt_ips = _mgmt_ips(stack.outputs)
+        if mgmt_ips:
+            device_dict['mgmt_url'] = jsonutils.dumps(mgmt_ips)
 
     def delete(self, plugin, context, device_id):
         heatclient_ = HeatClient(context)
@@ -439,6 +677,17 @@ class DeviceHeat(abstract_driver.DeviceAbstractDriver):
                        "%(stack_status)s"),
                      {'device_id': device_id, 'stack_status': status})
 
+    def get_statuses(self, plugin, context, device_ids):
+        heatclient_ = HeatClient(context)
+        statuses = {}
+        for start in range(0, len(device_ids), STACK_LIST_BATCH):
+            batch = device_ids[start:start + STACK_LIST_BATCH]
+            for stack in heatclient_.list(filters={'id': batch}):
+                status = _device_status(stack.stack_status)
+                if status is not None:
+                    statuses[stack.id] = status
+        return statuses
+
     @log.log
     def attach_interface(self, plugin, context, device_id, port_id):
         raise NotImplementedError()
@@ -485,6 +734,13 @@ class HeatClient:
             type_, value, tb = sys.exc_info()
             raise vnfm.HeatClientException(msg=value)
 
+    def update(self, stack_id, **fields):
+        try:
+            return self.stacks.update(stack_id, existing=True, **fields)
+        except heatException.HTTPException:
+            type_, value, tb = sys.exc_info()
+            raise vnfm.HeatClientException(msg=value)
+
     def delete(self, stack_id):
         try:
             self.stacks.delete(stack_id)
@@ -494,3 +750,6 @@ class HeatClient:
 
     def get(self, stack_id):
         return self.stacks.get(stack_id)
+
+    def list(self, **kwargs):
+        return self.stacks.list(**kwargs)
@@ -24,6 +24,7 @@ import uuid
 
 from tacker.common import log
 from tacker.openstack.common import log as logging
+from tacker.plugins.common import constants
 from tacker.vm.drivers import abstract_driver
 
 
@@ -64,7 +65,7 @@ class DeviceNoop(abstract_driver.DeviceAbstractDriver):
             raise ValueError('No instance %s' % device_id)
 
     @log.log
-    def update_wait(self, plugin, context, device_id):
+    def update_wait(self, plugin, context, device_dict, device_id):
         pass
 
     @log.log
@@ -74,3 +75,8 @@ class DeviceNoop(abstract_driver.DeviceAbstractDriver):
     @log.log
     def delete_wait(self, plugin, context, device_id):
         pass
+
+    @log.log
+    def get_statuses(self, plugin, context, device_ids):
+        return dict((device_id, constants.ACTIVE) for device_id in device_ids
+                    if device_id in self._instances)
@@ -245,7 +245,7 @@ class DeviceNova(abstract_driver.DeviceAbstractDriver):
         nova = self._nova_client()
         nova.servers.get(device_id)
 
-    def update_wait(self, plugin, context, device_id):
+    def update_wait(self, plugin, context, device_dict, device_id):
         # do nothing but checking if the instance exists at the moment
         nova = self._nova_client()
         nova.servers.get(device_id)
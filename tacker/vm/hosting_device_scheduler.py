@@ -20,8 +20,11 @@
 #
 # @author: Isaku Yamahata, Intel Corporation.
 
+import abc
 import random
+import uuid
 
+import six
 import sqlalchemy as sa
 
 from tacker.db.vm import vm_db
@@ -31,10 +34,138 @@ from tacker.plugins.common import constants
 
 LOG = logging.getLogger(__name__)
 
+# number of candidate devices read at once
+CANDIDATE_BATCH = 16
+# number of batches read before giving up when all candidates are taken
+# by concurrent schedules
+MAX_BATCHES = 4
 
-class ChanceScheduler(object):
 
-    """Select a Device that can serve a service in a random way."""
+@six.add_metaclass(abc.ABCMeta)
+class HostingDeviceScheduler(object):
+
+    """Select a Device that can serve a service and bind it.
+
+    Candidates are read without locks in the order chosen by the
+    subclass. The chosen device is claimed with a conditional UPDATE of
+    its status, so a device taken by a concurrent schedule is skipped
+    instead of waited for.
+    """
+
+    @abc.abstractmethod
+    def _candidates(self, context, query):
+        """Return a bounded list of device ids to try in that order.
+
+        :param query: query of the ids of the ACTIVE devices able to
+                      serve the service
+        """
+        pass
+
+    def _candidate_query(self, context, service_type, service_context):
+        # select hosting device that is capable of service_type, but
+        # not yet used for it.
+        # i.e.
+        # device.service_type in
+        #     [st.service_types for st in
+        #      device.template.service_types]
+        # and
+        # device.sevice_type not in
+        #     [ls.service_type for ls in device.services]
+        query = (
+            context.session.query(vm_db.Device.id).
+            filter(
+                sa.exists().
+                where(sa.and_(
+                    vm_db.Device.template_id == vm_db.DeviceTemplate.id,
+                    vm_db.DeviceTemplate.id ==
+                    vm_db.ServiceType.template_id,
+                    vm_db.ServiceType.service_type == service_type))).
+            filter(
+                ~sa.exists().
+                where(sa.and_(
+                    vm_db.Device.id ==
+                    vm_db.ServiceDeviceBinding.device_id,
+                    vm_db.ServiceDeviceBinding.service_instance_id ==
+                    vm_db.ServiceInstance.id,
+                    vm_db.ServiceInstance.service_type_id ==
+                    vm_db.ServiceType.id,
+                    vm_db.ServiceType.service_type == service_type))))
+
+        for sc_entry in service_context:
+            network_id = sc_entry.get('network_id')
+            subnet_id = sc_entry.get('subnet_id')
+            port_id = sc_entry.get('port_id')
+            router_id = sc_entry.get('router_id')
+            role = sc_entry.get('role')
+            index = sc_entry.get('index')
+
+            expr = [
+                vm_db.Device.id == vm_db.DeviceServiceContext.device_id]
+            if network_id is not None:
+                expr.append(
+                    vm_db.DeviceServiceContext.network_id == network_id)
+            if subnet_id is not None:
+                expr.append(
+                    vm_db.DeviceServiceContext.subnet_id == subnet_id)
+            if port_id is not None:
+                expr.append(vm_db.DeviceServiceContext.port_id == port_id)
+            if router_id is not None:
+                expr.append(
+                    vm_db.DeviceServiceContext.router_id == router_id)
+            if role is not None:
+                expr.append(vm_db.DeviceServiceContext.role == role)
+            if index is not None:
+                expr.append(vm_db.DeviceServiceContext.index == index)
+            query = query.filter(sa.exists().where(sa.and_(*expr)))
+        return query
+
+    def _claim(self, context, device_id):
+        with context.session.begin(subtransactions=True):
+            return (context.session.query(vm_db.Device).
+                    filter(vm_db.Device.id == device_id).
+                    filter(vm_db.Device.status == constants.ACTIVE).
+                    update({'status': constants.PENDING_UPDATE,
+                            'version': vm_db.Device.version + 1},
+                           synchronize_session=False))
+
+    def _release(self, context, device_id):
+        with context.session.begin(subtransactions=True):
+            (context.session.query(vm_db.Device).
+             filter(vm_db.Device.id == device_id).
+             filter(vm_db.Device.status == constants.PENDING_UPDATE).
+             update({'status': constants.ACTIVE,
+                     'version': vm_db.Device.version + 1},
+                    synchronize_session=False))
+
+    def _bind(self, plugin, context, device_id, query,
+              service_type, service_instance_id, name):
+        """Bind a new service instance to the claimed device.
+
+        Return None if the device was used for service_type by a schedule
+        which released it after the candidates were read.
+        """
+        try:
+            if not query.filter(vm_db.Device.id == device_id).count():
+                return
+            device = (context.session.query(vm_db.Device).
+                      filter(vm_db.Device.id == device_id).one())
+            service_type_id = [s.id for s in device.template.service_types
+                               if s.service_type == service_type][0]
+
+            service_instance_param = {
+                'name': name,
+                'service_table_id': service_instance_id,
+                'service_type': service_type,
+                'service_type_id': service_type_id,
+            }
+            service_instance_dict = plugin._create_service_instance(
+                context, device.id, service_instance_param, False)
+        finally:
+            self._release(context, device_id)
+        device = (context.session.query(vm_db.Device).
+                  filter(vm_db.Device.id == device_id).
+                  populate_existing().one())
+        return (plugin._make_device_dict(device), service_instance_dict)
 
     def schedule(self, plugin, context,
                  service_type, service_instance_id, name, service_context):
@@ -50,81 +181,62 @@ class ChanceScheduler(object):
         ... ]
         They can be missing or None = don't care
         """
-        with context.session.begin(subtransactions=True):
-            # Race. prevent from inserting ServiceDeviceBinding
-
-            # select hosting device that is capable of service_type, but
-            # not yet used for it.
-            # i.e.
-            # device.service_type in
-            #     [st.service_types for st in
-            #      device.template.service_types]
-            # and
-            # device.sevice_type not in
-            #     [ls.service_type for ls in device.services]
-            query = (
-                context.session.query(vm_db.Device).
-                filter(vm_db.Device.status == constants.ACTIVE).
-                filter(
-                    sa.exists().
-                    where(sa.and_(
-                        vm_db.Device.template_id == vm_db.DeviceTemplate.id,
-                        vm_db.DeviceTemplate.id ==
-                        vm_db.ServiceType.template_id,
-                        vm_db.ServiceType.service_type == service_type))).
-                filter(
-                    ~sa.exists().
-                    where(sa.and_(
-                        vm_db.Device.id ==
-                        vm_db.ServiceDeviceBinding.device_id,
-                        vm_db.ServiceDeviceBinding.service_instance_id ==
-                        vm_db.ServiceInstance.id,
-                        vm_db.ServiceInstance.service_type_id ==
-                        vm_db.ServiceType.id,
-                        vm_db.ServiceType.service_type == service_type))))
-
-            for sc_entry in service_context:
-                network_id = sc_entry.get('network_id')
-                subnet_id = sc_entry.get('subnet_id')
-                port_id = sc_entry.get('port_id')
-                router_id = sc_entry.get('router_id')
-                role = sc_entry.get('role')
-                index = sc_entry.get('index')
-
-                expr = [
-                    vm_db.Device.id == vm_db.DeviceServiceContext.device_id]
-                if network_id is not None:
-                    expr.append(
-                        vm_db.DeviceServiceContext.network_id == network_id)
-                if subnet_id is not None:
-                    expr.append(
-                        vm_db.DeviceServiceContext.subnet_id == subnet_id)
-                if port_id is not None:
-                    expr.append(vm_db.DeviceServiceContext.port_id == port_id)
-                if router_id is not None:
-                    expr.append(
-                        vm_db.DeviceServiceContext.router_id == router_id)
-                if role is not None:
-                    expr.append(vm_db.DeviceServiceContext.role == role)
-                if index is not None:
-                    expr.append(vm_db.DeviceServiceContext.index == index)
-                query = query.filter(sa.exists().where(sa.and_(*expr)))
-
-            candidates = query.with_lockmode("update").all()
-            if not candidates:
-                LOG.debug(_('no hosting device supporing %s'), service_type)
-                return
-            device = random.choice(candidates)
+        query = self._candidate_query(context, service_type, service_context)
+        active = query.filter(vm_db.Device.status == constants.ACTIVE)
+        for _batch in range(MAX_BATCHES):
+            device_ids = self._candidates(context, active)
+            if not device_ids:
+                break
+            for device_id in device_ids:
+                if not self._claim(context, device_id):
+                    # taken by a concurrent schedule
+                    continue
+                result = self._bind(plugin, context, device_id, query,
+                                    service_type, service_instance_id, name)
+                if result is not None:
+                    return result
+        LOG.debug(_('no hosting device supporing %s'), service_type)
 
-            service_type_id = [s.id for s in device.template.service_types
-                               if s.service_type == service_type][0]
 
-            service_instance_param = {
-                'name': name,
-                'service_table_id': service_instance_id,
-                'service_type': service_type,
-                'service_type_id': service_type_id,
-            }
-            service_instance_dict = plugin._create_service_instance(
-                context, device.id, service_instance_param, False)
-            return (plugin._make_device_dict(device), service_instance_dict)
+class ChanceScheduler(HostingDeviceScheduler):
+
+    """Select a Device that can serve a service in a random way.
+
+    The candidates are a batch starting at a random point of the device
+    id index.
+    """
+
+    def _candidates(self, context, query):
+        pivot = str(uuid.uuid4())
+        device_ids = [device_id for (device_id,) in
+                      query.filter(vm_db.Device.id >= pivot).
+                      order_by(vm_db.Device.id).limit(CANDIDATE_BATCH)]
+        if len(device_ids) < CANDIDATE_BATCH:
+            # wrap around the index
+            device_ids.extend(
+                device_id for (device_id,) in
+                query.filter(vm_db.Device.id < pivot).
+                order_by(vm_db.Device.id).
+                limit(CANDIDATE_BATCH - len(device_ids)))
+        random.shuffle(device_ids)
+        return device_ids
+
+
+class LeastLoadedScheduler(HostingDeviceScheduler):
+
+    """Select the Device hosting the fewest service instances.
+
+    The eligible devices are read from the index of Device.load, which
+    the plugin updates with every bind and unbind, so those of every
+    process are seen. Devices with the same load are tried in a random
+    order.
+    """
+
+    def _candidates(self, context, query):
+        candidates = (query.add_columns(vm_db.Device.load).
+                      order_by(vm_db.Device.load).
+                      limit(CANDIDATE_BATCH).all())
+        random.shuffle(candidates)
+        # the sort is stable, so ties stay shuffled
+        candidates.sort(key=lambda candidate: candidate[1])
+        return [device_id for device_id, _load in candidates]
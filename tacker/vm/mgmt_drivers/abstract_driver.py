@@ -79,6 +79,12 @@ class DeviceMGMTAbstractDriver(extensions.PluginInterface):
         """
         return {}
 
+    def mgmt_wait_ready(self, plugin, context, device):
+        """Whether to wait for the management addresses to answer before
+        the device is configured.
+        """
+        return True
+
     @abc.abstractmethod
     def mgmt_url(self, plugin, context, device):
         pass
@@ -37,6 +37,9 @@ class DeviceMgmtNoop(abstract_driver.DeviceMGMTAbstractDriver):
     def get_description(self):
         return 'Tacker DeviceMgmt Noop Driver'
 
+    def mgmt_wait_ready(self, plugin, context, device):
+        return False
+
     def mgmt_url(self, plugin, context, device):
         LOG.debug(_('mgmt_url %s'), device)
         return 'noop-mgmt-url'
@@ -18,17 +18,17 @@
 #
 # @author: Isaku Yamahata, Intel Corporation.
 
-import yaml
-
 from oslo_config import cfg
 
 from tacker.agent.linux import utils
 from tacker.common import log
-from tacker.openstack.common import jsonutils
+from tacker.common import utils as common_utils
 from tacker.openstack.common import log as logging
 from tacker.vm.mgmt_drivers import abstract_driver
 from tacker.vm.mgmt_drivers import constants as mgmt_constants
 
+yaml = common_utils.LazyModule('yaml')
+
 
 LOG = logging.getLogger(__name__)
 OPTS = [
@@ -71,8 +71,9 @@ class DeviceMgmtOpenWRT(abstract_driver.DeviceMGMTAbstractDriver):
         service_type = dev_attrs.get('service_type')
         if not service_type:
             return
-        mgmt_url = jsonutils.loads(device.get('mgmt_url', '{}'))
-        if not mgmt_url:
+        mgmt_ips = dict((endpoint['vdu'], endpoint['ip'])
+                        for endpoint in device.get('mgmt_endpoints', []))
+        if not mgmt_ips:
             return
 
         vdus_config = dev_attrs.get('config', '')
@@ -86,7 +87,7 @@ class DeviceMgmtOpenWRT(abstract_driver.DeviceMGMTAbstractDriver):
                 KNOWN_SERVICES = ('firewall', )
                 if key not in KNOWN_SERVICES:
                     continue
-                mgmt_ip_address = mgmt_url.get(vdu, '')
+                mgmt_ip_address = mgmt_ips.get(vdu, '')
                 if not mgmt_ip_address:
                     LOG.warn(_('tried to configure unknown mgmt address %s'),
                              vdu)
@@ -23,16 +23,16 @@ import six
 import threading
 import time
 
-from keystoneclient.v2_0 import client as ks_client
 from oslo_config import cfg
 from oslo_utils import timeutils
 
 from tacker.agent.linux import utils as linux_utils
+from tacker.common import utils
 from tacker import context as t_context
 from tacker.i18n import _LW
-from tacker.openstack.common import jsonutils
 from tacker.openstack.common import log as logging
-from tacker.vm.drivers.heat import heat
+
+ks_client = utils.LazyModule('keystoneclient.v2_0.client')
 
 
 LOG = logging.getLogger(__name__)
@@ -111,8 +111,9 @@ class DeviceStatus(object):
     def to_hosting_device(device_dict, down_cb):
         return {
             'id': device_dict['id'],
-            'management_ip_addresses': jsonutils.loads(
-                device_dict['mgmt_url']),
+            'management_ip_addresses': dict(
+                (endpoint['vdu'], endpoint['ip'])
+                for endpoint in device_dict['mgmt_endpoints']),
             'boot_wait': cfg.CONF.monitor.boot_wait,
             'down_cb': down_cb,
             'device': device_dict,
@@ -196,6 +197,32 @@ class FailurePolicy(object):
         pass
 
 
+def service_token():
+    """Return the keystone token of the tacker service user."""
+    # keystone v2.0 specific
+    auth_url = CONF.keystone_authtoken.auth_uri + '/v2.0'
+    authtoken = CONF.keystone_authtoken
+    kc = ks_client.Client(
+        tenant_name=authtoken.project_name,
+        username=authtoken.username,
+        password=authtoken.password,
+        auth_url=auth_url)
+    return kc.service_catalog.get_token()
+
+
+def _failure_policy_context():
+    authtoken = CONF.keystone_authtoken
+    token = service_token()
+
+    context = t_context.get_admin_context()
+    context.tenant_name = authtoken.project_name
+    context.user_name = authtoken.username
+    context.auth_token = token['id']
+    context.tenant_id = token['tenant_id']
+    context.user_id = token['user_id']
+    return context
+
+
 @FailurePolicy.register('respawn')
 class Respawn(FailurePolicy):
     @classmethod
@@ -208,22 +235,7 @@ class Respawn(FailurePolicy):
             new_device[key] = device_dict[key]
         LOG.debug(_('new_device %s'), new_device)
 
-        # keystone v2.0 specific
-        auth_url = CONF.keystone_authtoken.auth_uri + '/v2.0'
-        authtoken = CONF.keystone_authtoken
-        kc = ks_client.Client(
-            tenant_name=authtoken.project_name,
-            username=authtoken.username,
-            password=authtoken.password,
-            auth_url=auth_url)
-        token = kc.service_catalog.get_token()
-
-        context = t_context.get_admin_context()
-        context.tenant_name = authtoken.project_name
-        context.user_name = authtoken.username
-        context.auth_token = token['id']
-        context.tenant_id = token['tenant_id']
-        context.user_id = token['user_id']
+        context = _failure_policy_context()
         new_device_dict = plugin.create_device(context, {'device': new_device})
         LOG.info(_('respawned new device %s'), new_device_dict['id'])
 
@@ -235,63 +247,15 @@ class RespawnHeat(FailurePolicy):
         device_id = device_dict['id']
         LOG.error(_('device %s dead'), device_id)
         attributes = device_dict['attributes']
-        config = attributes.get('config')
-        LOG.debug(_('device config %s dead'), config)
         failure_count = int(attributes.get('failure_count', '0')) + 1
         failure_count_str = str(failure_count)
         attributes['failure_count'] = failure_count_str
         attributes['dead_instance_id_' + failure_count_str] = device_dict[
             'instance_id']
 
-        new_device_id = device_id + '-RESPAWN-' + failure_count_str
-        attributes = device_dict['attributes'].copy()
-        attributes['dead_device_id'] = device_id
-        new_device = {'id': new_device_id, 'attributes': attributes}
-        for key in ('tenant_id', 'template_id', 'name'):
-            new_device[key] = device_dict[key]
-        LOG.debug(_('new_device %s'), new_device)
-
-        # kill heat stack
-        heatclient = heat.HeatClient(None)
-        heatclient.delete(device_dict['instance_id'])
-
-        # keystone v2.0 specific
-        auth_url = CONF.keystone_authtoken.auth_uri + '/v2.0'
-        authtoken = CONF.keystone_authtoken
-        kc = ks_client.Client(
-            tenant_name=authtoken.project_name,
-            username=authtoken.username,
-            password=authtoken.password,
-            auth_url=auth_url)
-        token = kc.service_catalog.get_token()
-
-        context = t_context.get_admin_context()
-        context.tenant_name = authtoken.project_name
-        context.user_name = authtoken.username
-        context.auth_token = token['id']
-        context.tenant_id = token['tenant_id']
-        context.user_id = token['user_id']
-
-        new_device_dict = plugin.create_device_sync(
-            context, {'device': new_device})
-        LOG.info(_('respawned new device %s'), new_device_dict['id'])
-
-        # ungly hack to keep id unchanged
-        dead_device_id = device_id + '-DEAD-' + failure_count_str
-        LOG.debug(_('%(dead)s %(new)s %(cur)s'),
-                  {'dead': dead_device_id,
-                   'new': new_device_id,
-                   'cur': device_id})
-        with context.session.begin(subtransactions=True):
-            plugin.rename_device_id(context, device_id, dead_device_id)
-            plugin.rename_device_id(context, new_device_id, device_id)
-        plugin.delete_device(context, dead_device_id)
-        new_device_dict['id'] = device_id
-        if config:
-            new_device_dict.setdefault('attributes', {})['config'] = config
-        plugin.config_device(context, new_device_dict)
-
-        plugin.add_device_to_monitor(new_device_dict)
+        # the device keeps its id, only its heat stack is replaced
+        plugin.respawn_device(_failure_policy_context(), device_dict)
+        LOG.info(_('respawning device %s'), device_id)
 
 
 @FailurePolicy.register('log_and_kill')
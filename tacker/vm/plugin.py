@@ -21,7 +21,6 @@
 # @author: Isaku Yamahata, Intel Corporation.
 
 import copy
-import eventlet
 import inspect
 
 from oslo_config import cfg
@@ -31,6 +30,7 @@ from tacker.api.v1 import attributes
 from tacker.common import driver_manager
 from tacker import context as t_context
 from tacker.db.vm import proxy_db  # noqa
+from tacker.db.vm import task_db
 from tacker.db.vm import vm_db
 from tacker.extensions import vnfm
 from tacker.openstack.common import excutils
@@ -38,9 +38,17 @@ from tacker.openstack.common import log as logging
 from tacker.plugins.common import constants
 from tacker.vm.mgmt_drivers import constants as mgmt_constants
 from tacker.vm import monitor
+from tacker.vm import readiness
+from tacker.vm import reconciler
+from tacker.vm import status_batcher
+from tacker.vm import task_executor
 
 LOG = logging.getLogger(__name__)
 
+# device attribute recording the instance created by a respawn until it
+# replaces the dead one
+RESPAWN_INSTANCE_ID = 'respawn_instance_id'
+
 
 class VNFMMgmtMixin(object):
     OPTS = [
@@ -90,6 +98,10 @@ class VNFMMgmtMixin(object):
         return self._invoke(
             device_dict, plugin=self, context=context, device=device_dict)
 
+    def mgmt_wait_ready(self, context, device_dict):
+        return self._invoke(
+            device_dict, plugin=self, context=context, device=device_dict)
+
     def mgmt_url(self, context, device_dict):
         return self._invoke(
             device_dict, plugin=self, context=context, device=device_dict)
@@ -153,7 +165,8 @@ class VNFMMgmtMixin(object):
             service_instance=service_instance_dict, kwargs=kwargs)
 
 
-class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
+class VNFMPlugin(task_db.LifecycleTaskDbMixin, vm_db.VNFMPluginDb,
+                 VNFMMgmtMixin):
     """ServiceVMPlugin which supports ServiceVM framework
     """
     OPTS = [
@@ -166,14 +179,64 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
 
     def __init__(self):
         super(VNFMPlugin, self).__init__()
-        self._pool = eventlet.GreenPool()
         self._device_manager = driver_manager.DriverManager(
             'tacker.servicevm.device.drivers',
             cfg.CONF.servicevm.infra_driver)
         self._device_status = monitor.DeviceStatus()
-
-    def spawn_n(self, function, *args, **kwargs):
-        self._pool.spawn_n(function, *args, **kwargs)
+        self._task_executor = task_executor.TaskExecutor(
+            self, cfg.CONF.servicevm.lifecycle_workers)
+        self._register_tasks()
+        self._status_batcher = status_batcher.StatusBatcher(self)
+        if cfg.CONF.servicevm.lifecycle_workers > 0:
+            self._task_executor.start()
+        self._reconciler = reconciler.DeviceReconciler(self)
+        if cfg.CONF.servicevm.reconcile_interval > 0:
+            self._reconciler.start(cfg.CONF.servicevm.reconcile_interval)
+
+    def spawn_n(self, operation, function, *args, **kwargs):
+        self._task_executor.spawn_n(operation, function, *args, **kwargs)
+
+    def drain(self):
+        """Let running lifecycle operations finish before shutdown."""
+        self._reconciler.stop()
+        self._task_executor.drain(cfg.CONF.servicevm.lifecycle_drain_timeout)
+
+    def _register_tasks(self):
+        executor = self._task_executor
+        executor.register('create_device', self._create_device_task)
+        executor.register('respawn_device', self._respawn_device_task)
+        for operation, function in (
+                ('update_device', self._update_device_wait),
+                ('scale_device', self._scale_device_wait),
+                ('delete_device', self._delete_device_wait),
+                ('create_service_instance',
+                 self._create_service_instance_wait),
+                ('update_service_instance',
+                 self._update_service_instance_wait),
+                ('delete_service_instance',
+                 self._delete_service_instance_wait)):
+            executor.register(operation, self._wait_task(function))
+
+    @staticmethod
+    def _wait_task(function):
+        def run(context, task, **kwargs):
+            task.step('wait', function, context, **kwargs)
+        return run
+
+    def submit(self, context, operation, device_id=None, **kwargs):
+        return self._task_executor.submit(context, operation,
+                                          device_id=device_id, **kwargs)
+
+    def _transition_device_status(self, context, device_id, current_status,
+                                  new_status):
+        return self._status_batcher.update(device_id, current_status,
+                                           new_status)
+
+    def _create_stage(self, name, unbounded=False):
+        return self._task_executor.stage('create_device', name, unbounded)
+
+    def _respawn_stage(self, name, unbounded=False):
+        return self._task_executor.stage('respawn_device', name, unbounded)
 
     ###########################################################################
     # hosting device template
@@ -240,7 +303,9 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
         config = device_dict['attributes'].get('config')
         if not config:
             return
-        eventlet.sleep(30)      # wait for vm to be ready
+        if self.mgmt_wait_ready(context, device_dict):
+            with self._create_stage('mgmt_ready', unbounded=True):
+                readiness.wait_for_mgmt(device_dict)
         device_id = device_dict['id']
         update = {
             'device': {
@@ -256,9 +321,12 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
         instance_id = self._instance_id(device_dict)
 
         try:
-            self._device_manager.invoke(
-                driver_name, 'create_wait', plugin=self, context=context,
-                device_dict=device_dict, device_id=instance_id)
+            # heat only polls the stack here, do not let it hold one of the
+            # create_device workers
+            with self._create_stage('infra_create_wait', unbounded=True):
+                self._device_manager.invoke(
+                    driver_name, 'create_wait', plugin=self, context=context,
+                    device_dict=device_dict, device_id=instance_id)
         except vnfm.DeviceCreateWaitFailed:
             instance_id = None
             del device_dict['instance_id']
@@ -270,8 +338,9 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
             # FIXME(yamahata):
             mgmt_url = device_dict['mgmt_url']
 
-        self._create_device_post(
-            context, device_id, instance_id, mgmt_url, device_dict)
+        with self._create_stage('db_post'):
+            self._create_device_post(
+                context, device_id, instance_id, mgmt_url, device_dict)
         if instance_id is None:
             self.mgmt_create_post(context, device_dict)
             return
@@ -285,12 +354,22 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
         }
         new_status = constants.ACTIVE
         try:
-            self.mgmt_call(context, device_dict, kwargs)
+            with self._create_stage('mgmt_call'):
+                self.mgmt_call(context, device_dict, kwargs)
         except Exception:
             LOG.exception(_('create_device_wait'))
             new_status = constants.ERROR
         device_dict['status'] = new_status
-        self._create_device_status(context, device_id, new_status)
+        with self._create_stage('db_status'):
+            if not self._create_device_status(context, device_id,
+                                              new_status):
+                LOG.warn(_('device %s left PENDING_CREATE meanwhile'),
+                         device_id)
+
+    def _create_device_complete(self, context, device_dict):
+        self._create_device_wait(context, device_dict)
+        self.add_device_to_monitor(device_dict)
+        self.config_device(context, device_dict)
 
     def _create_device(self, context, device):
         device_dict = self._create_device_pre(context, device)
@@ -299,9 +378,10 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
         LOG.debug(_('device_dict %s'), device_dict)
         self.mgmt_create_pre(context, device_dict)
         try:
-            instance_id = self._device_manager.invoke(
-                driver_name, 'create', plugin=self,
-                context=context, device=device_dict)
+            with self._create_stage('infra_create'):
+                instance_id = self._device_manager.invoke(
+                    driver_name, 'create', plugin=self,
+                    context=context, device=device_dict)
         except Exception:
             with excutils.save_and_reraise_exception():
                 self.delete_device(context, device_id)
@@ -311,17 +391,23 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
                 device_dict)
             return
 
+        self._create_device_instance(context, device_id, instance_id)
         device_dict['instance_id'] = instance_id
         return device_dict
 
+    def _create_device_task(self, context, task, device_dict):
+        if task.done('wait'):
+            # the device was created by an earlier attempt of the task
+            device_dict = self.get_device(context, device_dict['id'])
+        else:
+            task.step('wait', self._create_device_wait, context, device_dict)
+        self.add_device_to_monitor(device_dict)
+        task.step('config', self.config_device, context, device_dict)
+
     def create_device(self, context, device):
         device_dict = self._create_device(context, device)
-
-        def create_device_wait():
-            self._create_device_wait(context, device_dict)
-            self.add_device_to_monitor(device_dict)
-            self.config_device(context, device_dict)
-        self.spawn_n(create_device_wait)
+        self.submit(context, 'create_device', device_id=device_dict['id'],
+                    device_dict=device_dict)
         return device_dict
 
     # not for wsgi, but for service to create hosting device
@@ -342,7 +428,8 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
         try:
             self._device_manager.invoke(
                 driver_name, 'update_wait', plugin=self,
-                context=context, device_id=instance_id)
+                context=context, device_dict=device_dict,
+                device_id=instance_id)
             self.mgmt_call(context, device_dict, kwargs)
         except Exception:
             LOG.exception(_('_update_device_wait'))
@@ -369,7 +456,61 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
                 self.mgmt_update_post(context, device_dict)
                 self._update_device_post(context, device_id, constants.ERROR)
 
-        self.spawn_n(self._update_device_wait, context, device_dict)
+        self.submit(context, 'update_device', device_id=device_id,
+                    device_dict=device_dict)
+        return device_dict
+
+    def _scale_device_wait(self, context, device_dict):
+        driver_name = self._infra_driver_name(device_dict)
+        instance_id = self._instance_id(device_dict)
+        kwargs = {
+            mgmt_constants.KEY_ACTION: mgmt_constants.ACTION_UPDATE_DEVICE,
+            mgmt_constants.KEY_KWARGS: {'device': device_dict},
+        }
+        new_status = constants.ACTIVE
+        try:
+            self._device_manager.invoke(
+                driver_name, 'scale_wait', plugin=self, context=context,
+                device_dict=device_dict, device_id=instance_id)
+            self.mgmt_call(context, device_dict, kwargs)
+        except Exception:
+            LOG.exception(_('_scale_device_wait'))
+            new_status = constants.ERROR
+        device_dict['status'] = new_status
+        self.mgmt_update_post(context, device_dict)
+
+        self._update_device_post(context, device_dict['id'], new_status,
+                                 device_dict,
+                                 mgmt_url=device_dict['mgmt_url'])
+        if new_status == constants.ACTIVE:
+            # monitor the members added by the scale
+            self.add_device_to_monitor(device_dict)
+
+    def scale_device(self, context, device_id, scale):
+        device_dict = self._update_device_pre(context, device_id)
+        driver_name = self._infra_driver_name(device_dict)
+        instance_id = self._instance_id(device_dict)
+
+        try:
+            self.mgmt_update_pre(context, device_dict)
+            self._device_manager.invoke(
+                driver_name, 'scale', plugin=self, context=context,
+                device_id=instance_id, device_dict=device_dict, scale=scale)
+        except (NotImplementedError, vnfm.DeviceNotScalable,
+                vnfm.DeviceScaleInvalid) as e:
+            # nothing was changed, the device stays usable
+            self._update_device_post(context, device_id, constants.ACTIVE)
+            if isinstance(e, NotImplementedError):
+                raise vnfm.DeviceNotScalable(device_id=device_id)
+            raise
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                device_dict['status'] = constants.ERROR
+                self.mgmt_update_post(context, device_dict)
+                self._update_device_post(context, device_id, constants.ERROR)
+
+        self.submit(context, 'scale_device', device_id=device_id,
+                    device_dict=device_dict)
         return device_dict
 
     def _delete_device_wait(self, context, device_dict):
@@ -414,7 +555,97 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
                 self._delete_device_post(context, device_id, e)
 
         self._delete_device_post(context, device_id, None)
-        self.spawn_n(self._delete_device_wait, context, device_dict)
+        self.submit(context, 'delete_device', device_id=device_id,
+                    device_dict=device_dict)
+
+    def _delete_instance(self, context, driver_name, instance_id):
+        # nothing waits for the instance to go away
+        def delete():
+            self._device_manager.invoke(
+                driver_name, 'delete', plugin=self, context=context,
+                device_id=instance_id)
+            self._device_manager.invoke(
+                driver_name, 'delete_wait', plugin=self, context=context,
+                device_id=instance_id)
+        self.spawn_n('delete_instance', delete)
+
+    def _respawn_device_create(self, context, device_dict):
+        driver_name = self._infra_driver_name(device_dict)
+        with self._respawn_stage('infra_create'):
+            instance_id = self._device_manager.invoke(
+                driver_name, 'create', plugin=self, context=context,
+                device=device_dict)
+        # a later attempt of the task finds the new instance here
+        dev_attrs = dict(device_dict['attributes'])
+        dev_attrs[RESPAWN_INSTANCE_ID] = instance_id
+        self._write_device_attributes(context, device_dict['id'], dev_attrs)
+
+    def _respawn_device_replace(self, context, device_id, dead_instance_id):
+        device_dict = self.get_device(context, device_id)
+        driver_name = self._infra_driver_name(device_dict)
+        dev_attrs = device_dict['attributes']
+        instance_id = dev_attrs.pop(RESPAWN_INSTANCE_ID, None)
+        if instance_id is None:
+            LOG.warn(_('device %s lost its respawned instance'), device_id)
+            return
+
+        try:
+            with self._respawn_stage('infra_create_wait', unbounded=True):
+                self._device_manager.invoke(
+                    driver_name, 'create_wait', plugin=self,
+                    context=context, device_dict=device_dict,
+                    device_id=instance_id)
+        except vnfm.DeviceCreateWaitFailed:
+            LOG.error(_('respawned instance %(instance_id)s of device '
+                        '%(device_id)s failed'),
+                      {'instance_id': instance_id, 'device_id': device_id})
+            self._delete_instance(context, driver_name, instance_id)
+            self._transition_device_status(context, device_id,
+                                           constants.DEAD, constants.ERROR)
+            return
+
+        with self._respawn_stage('db_replace'):
+            replaced = self._replace_device_instance(
+                context, device_id, dead_instance_id, instance_id,
+                device_dict['mgmt_url'], dev_attrs)
+        if not replaced:
+            LOG.warn(_('device %s deleted or respawned while respawning'),
+                     device_id)
+            self._delete_instance(context, driver_name, instance_id)
+            return
+        self._delete_instance(context, driver_name, dead_instance_id)
+
+    def _respawn_device_task(self, context, task, device_dict):
+        device_id = device_dict['id']
+        dead_instance_id = device_dict['instance_id']
+        task.step('create', self._respawn_device_create, context,
+                  device_dict)
+        task.step('replace', self._respawn_device_replace, context,
+                  device_id, dead_instance_id)
+        try:
+            device_dict = self.get_device(context, device_id)
+        except vnfm.DeviceNotFound:
+            return
+        if (device_dict['status'] != constants.ACTIVE or
+                device_dict['instance_id'] == dead_instance_id):
+            return
+        LOG.info(_('respawned device %(device_id)s on %(instance_id)s'),
+                 {'device_id': device_id,
+                  'instance_id': device_dict['instance_id']})
+        self.add_device_to_monitor(device_dict)
+        task.step('config', self.config_device, context, device_dict)
+
+    # used by failure policy
+    def respawn_device(self, context, device_dict):
+        """Replace the dead instance of the device by a new one.
+
+        The device keeps its id and row. The new instance is created by a
+        lifecycle task, so that many dead devices are respawned in
+        parallel, and the dead one is deleted without waiting for it.
+        """
+        return self.submit(context, 'respawn_device',
+                           device_id=device_dict['id'],
+                           device_dict=device_dict)
 
     ###########################################################################
     # logical service instance
@@ -508,9 +739,10 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
         finally:
             self._update_device_post(context, device_dict['id'], new_status)
 
-    def _create_service_instance_wait(self, context, device_id,
-                                      service_instance_dict):
-        device_dict = self.get_device(context, device_id)
+    def _create_service_instance_wait(self, context, service_instance_dict):
+        devices = service_instance_dict['devices']
+        assert len(devices) == 1
+        device_dict = self.get_device(context, devices[0])
 
         new_status = constants.ACTIVE
         try:
@@ -530,8 +762,8 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
                                  service_instance_param, managed_by_user):
         service_instance_dict = self._create_service_instance_db(
             context, device_id, service_instance_param, managed_by_user)
-        self.spawn_n(self._create_service_instance_wait, context,
-                     device_id, service_instance_dict)
+        self.submit(context, 'create_service_instance', device_id=device_id,
+                    service_instance_dict=service_instance_dict)
         return service_instance_dict
 
     def create_service_instance(self, context, service_instance):
@@ -584,7 +816,10 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
                                  mgmt_kwargs, callback, errorback):
         service_instance_dict = self._update_service_instance_pre(
             context, service_instance_id, {})
-        self.spawn_n(self._update_service_instance_wait, context,
+        # callbacks of service drivers can not be queued as tasks, these
+        # operations keep running in this process
+        self.spawn_n('update_service_instance',
+                     self._update_service_instance_wait, context,
                      service_instance_dict, mgmt_kwargs, callback, errorback)
 
     # for service drivers. e.g. hosting_driver of loadbalancer
@@ -594,7 +829,8 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
             context, service_table_id)
         service_instance_dict = self._update_service_instance_pre(
             context, service_instance_dict['id'], {})
-        self.spawn_n(self._update_service_instance_wait, context,
+        self.spawn_n('update_service_instance',
+                     self._update_service_instance_wait, context,
                      service_instance_dict, mgmt_kwargs, callback, errorback)
 
     def update_service_instance(self, context, service_instance_id,
@@ -603,8 +839,9 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
         service_instance_dict = self._update_service_instance_pre(
             context, service_instance_id, service_instance)
 
-        self.spawn_n(self._update_service_instance_wait, context,
-                     service_instance_dict, mgmt_kwargs, None, None)
+        self.submit(context, 'update_service_instance',
+                    service_instance_dict=service_instance_dict,
+                    mgmt_kwargs=mgmt_kwargs, callback=None, errorback=None)
         return service_instance_dict
 
     def _delete_service_instance_wait(self, context, device, service_instance,
@@ -652,6 +889,7 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
         self._delete_service_instance_pre(context, service_instance['id'],
                                           False)
         self.spawn_n(
+            'delete_service_instance',
             self._delete_service_instance_wait, context, device,
             service_instance, mgmt_kwargs, callback, errorback)
 
@@ -660,9 +898,42 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
         device, service_instance = self.get_by_service_instance_id(
             context, service_instance_id)
         self._delete_service_instance_pre(context, service_instance_id, True)
-        self.spawn_n(
-            self._delete_service_instance_wait, context, device,
-            service_instance, {}, None, None)
+        self.submit(context, 'delete_service_instance', device_id=device['id'],
+                    device=device, service_instance=service_instance,
+                    mgmt_kwargs={}, callback=None, errorback=None)
+
+    ###########################################################################
+    # lifecycle operations
+
+    def _make_lifecycle_operation_dict(self, operation, counts, stats,
+                                       fields=None):
+        res = {
+            'id': operation,
+            'limit': self._task_executor.limit(operation),
+            'queued': counts.get(task_db.TASK_PENDING, 0),
+            'running': counts.get(task_db.TASK_RUNNING, 0),
+            'failed': counts.get(task_db.TASK_FAILED, 0),
+            'worker_stats': stats or task_executor.OperationStats().to_dict(),
+        }
+        return self._fields(res, fields)
+
+    def get_lifecycle_operations(self, context, filters=None, fields=None):
+        counts = self._count_tasks(context)
+        stats = self._task_executor.get_stats()
+        operations = sorted(set(counts) | set(stats))
+        if filters and 'id' in filters:
+            operations = [operation for operation in operations
+                          if operation in filters['id']]
+        return [self._make_lifecycle_operation_dict(
+                operation, counts.get(operation, {}), stats.get(operation),
+                fields) for operation in operations]
+
+    def get_lifecycle_operation(self, context, id, fields=None):
+        operations = self.get_lifecycle_operations(
+            context, filters={'id': [id]}, fields=fields)
+        if not operations:
+            raise vnfm.LifecycleOperationNotFound(operation=id)
+        return operations[0]
 
     def create_vnf(self, context, vnf):
         vnf['device'] = vnf.pop('vnf')
@@ -681,6 +952,22 @@ class VNFMPlugin(vm_db.VNFMPluginDb, VNFMMgmtMixin):
     def delete_vnf(self, context, vnf_id):
         self.delete_device(context, vnf_id)
 
+    def scale_vnf(self, context, vnf_id, scale):
+        scale = scale.get('scale') or {}
+        if scale.get('type') not in ('out', 'in'):
+            raise vnfm.DeviceScaleInvalid(
+                msg=_("type must be 'out' or 'in'"))
+        try:
+            count = int(scale.get('count', 1))
+        except (TypeError, ValueError):
+            count = 0
+        if count < 1:
+            raise vnfm.DeviceScaleInvalid(
+                msg=_('count must be a positive integer'))
+        scale = {'type': scale['type'], 'count': count,
+                 'vdu': scale.get('vdu')}
+        return self.scale_device(context, vnf_id, scale)
+
     def create_vnfd(self, context, vnfd):
         vnfd['device_template'] = vnfd.pop('vnfd')
         new_dict = self.create_device_template(context, vnfd)
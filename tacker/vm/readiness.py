@@ -0,0 +1,117 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Wait for the management addresses of a device to answer.
+
+A freshly booted VNF can only be configured once its management service
+listens. Instead of sleeping for a fixed time, every management endpoint
+is probed on its own port, or mgmt_ready_port when it has none, with an
+exponential backoff until all of them answer or a deadline passes. Devices
+whose management driver does not talk to them are not probed.
+"""
+
+import socket
+import time
+
+import eventlet
+from oslo_config import cfg
+
+from tacker.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt('mgmt_ready_port', default=22,
+               help=_('TCP port of the management addresses without a '
+                      'port of their own probed before a device is '
+                      'configured, 0 disables the probe')),
+    cfg.BoolOpt('mgmt_ready_ssh_banner', default=True,
+                help=_('Wait for the SSH banner on mgmt_ready_port rather '
+                       'than only for the TCP connection. Ports reported '
+                       'by the infra driver are only connected to')),
+    cfg.IntOpt('mgmt_ready_timeout', default=300,
+               help=_('Seconds to wait for the management addresses of a '
+                      'device before it is configured anyway')),
+    cfg.FloatOpt('mgmt_ready_backoff', default=0.5,
+                 help=_('Seconds between the first two probes of a '
+                        'management address, doubled for every further '
+                        'probe')),
+    cfg.FloatOpt('mgmt_ready_max_backoff', default=10.0,
+                 help=_('Maximum number of seconds between two probes of a '
+                        'management address')),
+]
+cfg.CONF.register_opts(OPTS, 'servicevm')
+
+# seconds a single connect or banner read may take
+PROBE_TIMEOUT = 5
+
+
+def mgmt_addresses(device_dict, default_port):
+    """Return the (ip, port) pairs the device is managed through."""
+    return sorted(set((endpoint['ip'], endpoint.get('port') or default_port)
+                      for endpoint in
+                      device_dict.get('mgmt_endpoints') or []))
+
+
+def is_reachable(address, port, ssh_banner):
+    try:
+        sock = socket.create_connection((address, port), PROBE_TIMEOUT)
+    except socket.error:
+        return False
+    try:
+        if not ssh_banner:
+            return True
+        # the server sends its identification string first, RFC 4253
+        return sock.recv(255).startswith('SSH-')
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+def wait_for_mgmt(device_dict):
+    """Wait until every management address of the device answers.
+
+    Return True once all of them answered and False when the deadline
+    passed first. A device without management addresses is ready.
+    """
+    conf = cfg.CONF.servicevm
+    if not conf.mgmt_ready_port:
+        return True
+    pending = mgmt_addresses(device_dict, conf.mgmt_ready_port)
+    if not pending:
+        return True
+    start = time.time()
+    deadline = start + conf.mgmt_ready_timeout
+    backoff = conf.mgmt_ready_backoff
+    while True:
+        pending = [(address, port) for address, port in pending
+                   if not is_reachable(
+                       address, port,
+                       conf.mgmt_ready_ssh_banner and
+                       port == conf.mgmt_ready_port)]
+        now = time.time()
+        if not pending:
+            LOG.debug(_('device %(id)s reachable after %(seconds).1f '
+                        'seconds'),
+                      {'id': device_dict['id'], 'seconds': now - start})
+            return True
+        if now >= deadline:
+            LOG.warn(_('management addresses %(addresses)s of device %(id)s '
+                       'not reachable after %(timeout)d seconds'),
+                     {'addresses': ', '.join('%s:%d' % address
+                                             for address in pending),
+                      'id': device_dict['id'],
+                      'timeout': conf.mgmt_ready_timeout})
+            return False
+        eventlet.sleep(min(backoff, deadline - now))
+        backoff = min(backoff * 2, conf.mgmt_ready_max_backoff)
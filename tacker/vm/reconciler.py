@@ -0,0 +1,246 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Converge devices left in a PENDING_* status with their infra driver.
+
+A device stays pending when the thread waiting for its driver dies, e.g.
+when the server is restarted in the middle of a create. The reconciler
+periodically walks the pending devices a page at a time, asks each infra
+driver for the status of a whole page in one call and applies the
+resulting transitions with one statement per kind of transition.
+
+Every process loading the plugin runs a reconciler, but only the one
+holding the reconciler lease in the database sweeps. Devices with an
+unfinished lifecycle task are left to the worker running the task.
+"""
+
+import collections
+import os
+import socket
+import time
+import uuid
+
+from oslo_config import cfg
+
+from tacker import context as t_context
+from tacker.openstack.common import log as logging
+from tacker.openstack.common import loopingcall
+from tacker.plugins.common import constants
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt('reconcile_interval', default=60,
+               help=_('Seconds between two sweeps over the devices in a '
+                      'PENDING_* status, 0 disables the reconciler')),
+    cfg.IntOpt('reconcile_grace', default=900,
+               help=_('Seconds a device has to stay in the same PENDING_* '
+                      'status before the reconciler acts on it')),
+    cfg.IntOpt('reconcile_page_size', default=200,
+               help=_('Number of pending devices read and queried from '
+                      'the infra driver at once')),
+]
+cfg.CONF.register_opts(OPTS, 'servicevm')
+
+LEASE_NAME = 'device_reconciler'
+
+
+class _Transitions(object):
+
+    def __init__(self):
+        self.error = collections.defaultdict(list)
+        self.active = []
+        self.purge = []
+        self.finish_create = []
+        self.redo_delete = []
+
+
+class DeviceReconciler(object):
+
+    def __init__(self, plugin):
+        self._plugin = plugin
+        # device id -> (status, first time the sweep saw it in that status)
+        self._first_seen = {}
+        # devices whose create is being finished by a green thread
+        self._in_flight = set()
+        self._unsupported = set()
+        self._timer = None
+        self._owner = '%s:%d:%s' % (socket.gethostname(), os.getpid(),
+                                    uuid.uuid4().hex[:8])
+
+    def start(self, interval):
+        self._timer = loopingcall.FixedIntervalLoopingCall(self.reconcile)
+        self._timer.start(interval, initial_delay=interval)
+
+    def stop(self):
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+            try:
+                # let another process take over without waiting
+                self._plugin._release_lease(t_context.get_admin_context(),
+                                            LEASE_NAME, self._owner)
+            except Exception:
+                LOG.exception(_('failed to release the reconciler lease'))
+
+    def _acquire(self, context):
+        # held for two sweeps, so that the holder renews it in time
+        return self._plugin._acquire_lease(
+            context, LEASE_NAME, self._owner,
+            2 * cfg.CONF.servicevm.reconcile_interval)
+
+    def reconcile(self):
+        context = t_context.get_admin_context()
+        try:
+            if not self._acquire(context):
+                # another process reconciles the devices
+                self._first_seen = {}
+                return
+            self._reconcile(context)
+        except Exception:
+            LOG.exception(_('device reconciliation failed'))
+
+    def _reconcile(self, context):
+        conf = cfg.CONF.servicevm
+        now = time.time()
+        first_seen = {}
+        marker = None
+        while True:
+            rows = self._plugin._get_pending_devices(
+                context, marker, conf.reconcile_page_size)
+            if not rows:
+                break
+            marker = rows[-1].id
+            busy = set(self._plugin._get_devices_with_tasks(
+                context, [row.id for row in rows]))
+            stale = []
+            for row in rows:
+                if row.id in busy:
+                    # driven by its task, whichever worker runs it
+                    continue
+                seen = self._first_seen.get(row.id)
+                if seen is None or seen[0] != row.status:
+                    seen = (row.status, now)
+                first_seen[row.id] = seen
+                if (now - seen[1] >= conf.reconcile_grace and
+                        row.id not in self._in_flight):
+                    stale.append(row)
+            if stale:
+                self._apply(context, self._classify(context, stale))
+            if len(rows) < conf.reconcile_page_size:
+                break
+            if not self._acquire(context):
+                LOG.warn(_('reconciler lease lost, sweep interrupted'))
+                return
+        self._first_seen = first_seen
+
+    def _driver_statuses(self, context, driver_name, instance_ids):
+        if not instance_ids or driver_name in self._unsupported:
+            return None
+        try:
+            return self._plugin._device_manager.invoke(
+                driver_name, 'get_statuses', plugin=self._plugin,
+                context=context, device_ids=instance_ids)
+        except NotImplementedError:
+            LOG.warn(_('infra driver %s can not report device statuses, '
+                       'its pending devices are not reconciled'),
+                     driver_name)
+            self._unsupported.add(driver_name)
+        except Exception:
+            LOG.exception(_('failed to get device statuses from %s'),
+                          driver_name)
+        return None
+
+    def _classify(self, context, rows):
+        transitions = _Transitions()
+        by_driver = collections.defaultdict(list)
+        for row in rows:
+            if row.instance_id is None:
+                # the driver never returned an instance
+                if row.status == constants.PENDING_DELETE:
+                    transitions.purge.append(row.id)
+                else:
+                    transitions.error[row.status].append(row.id)
+            else:
+                by_driver[row.infra_driver].append(row)
+
+        for driver_name, driver_rows in by_driver.items():
+            statuses = self._driver_statuses(
+                context, driver_name, [row.instance_id for row in driver_rows])
+            if statuses is None:
+                continue
+            for row in driver_rows:
+                status = statuses.get(row.instance_id)
+                if status in (constants.PENDING_CREATE,
+                              constants.PENDING_UPDATE,
+                              constants.PENDING_DELETE):
+                    # the infra driver is still working on it
+                    continue
+                if row.status == constants.PENDING_DELETE:
+                    if status is None:
+                        transitions.purge.append(row.id)
+                    elif status == constants.ACTIVE:
+                        transitions.redo_delete.append(row)
+                    else:
+                        transitions.error[row.status].append(row.id)
+                elif status == constants.ACTIVE:
+                    if row.status == constants.PENDING_CREATE:
+                        transitions.finish_create.append(row.id)
+                    else:
+                        transitions.active.append(row.id)
+                else:
+                    transitions.error[row.status].append(row.id)
+        return transitions
+
+    def _apply(self, context, transitions):
+        plugin = self._plugin
+        for status, device_ids in transitions.error.items():
+            count = len(plugin._bulk_update_device_status(
+                context, device_ids, status, constants.ERROR))
+            LOG.info(_('reconciled %(count)d devices from %(status)s to '
+                       'ERROR'), {'count': count, 'status': status})
+        if transitions.active:
+            count = len(plugin._bulk_update_device_status(
+                context, transitions.active, constants.PENDING_UPDATE,
+                constants.ACTIVE))
+            LOG.info(_('reconciled %d devices from PENDING_UPDATE to '
+                       'ACTIVE'), count)
+        if transitions.purge:
+            count = plugin._bulk_delete_devices(context, transitions.purge)
+            LOG.info(_('purged %d deleted devices'), count)
+        for row in transitions.redo_delete:
+            LOG.info(_('deleting instance %(instance_id)s of device '
+                       '%(device_id)s again'),
+                     {'instance_id': row.instance_id, 'device_id': row.id})
+            try:
+                plugin._device_manager.invoke(
+                    row.infra_driver, 'delete', plugin=plugin,
+                    context=context, device_id=row.instance_id)
+            except Exception:
+                LOG.exception(_('failed to delete instance %s'),
+                              row.instance_id)
+        for device_id in transitions.finish_create:
+            self._in_flight.add(device_id)
+            plugin.spawn_n('create_device', self._finish_create, context,
+                           device_id)
+
+    def _finish_create(self, context, device_id):
+        try:
+            LOG.info(_('finishing creation of device %s'), device_id)
+            device_dict = self._plugin.get_device(context, device_id)
+            if device_dict['status'] == constants.PENDING_CREATE:
+                self._plugin._create_device_complete(context, device_dict)
+        except Exception:
+            LOG.exception(_('failed to finish creation of device %s'),
+                          device_id)
+        finally:
+            self._in_flight.discard(device_id)
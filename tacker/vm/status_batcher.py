@@ -0,0 +1,89 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Coalesce the device status transitions of concurrent operations.
+
+When many devices are created, updated or deleted at once their lifecycle
+tasks finish in bursts. Instead of one transaction per device, the
+transitions requested within status_batch_window seconds are written with
+one UPDATE statement per (current status, new status) pair.
+"""
+
+import collections
+
+import eventlet
+from eventlet import event
+from oslo_config import cfg
+
+from tacker import context as t_context
+from tacker.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.FloatOpt('status_batch_window', default=0.05,
+                 help=_('Seconds device status transitions are collected '
+                        'before they are written together, 0 writes each '
+                        'transition right away')),
+]
+cfg.CONF.register_opts(OPTS, 'servicevm')
+
+
+class StatusBatcher(object):
+
+    def __init__(self, plugin):
+        self._plugin = plugin
+        # (current status, new status) -> [(device id, event)]
+        self._pending = collections.defaultdict(list)
+        self._flusher = None
+
+    def update(self, device_id, current_status, new_status):
+        """Move the device from current_status to new_status.
+
+        Return once the transition is written, together with the ones
+        other green threads requested meanwhile, whether the device was
+        in current_status.
+        """
+        window = cfg.CONF.servicevm.status_batch_window
+        if window <= 0:
+            return device_id in self._plugin._bulk_update_device_status(
+                t_context.get_admin_context(), [device_id],
+                current_status, new_status)
+        done = event.Event()
+        self._pending[(current_status, new_status)].append((device_id, done))
+        if self._flusher is None:
+            self._flusher = eventlet.spawn_after(window, self.flush)
+        return done.wait()
+
+    def flush(self):
+        pending, self._pending = (self._pending,
+                                  collections.defaultdict(list))
+        self._flusher = None
+        context = t_context.get_admin_context()
+        for (current_status, new_status), waiters in pending.items():
+            device_ids = [device_id for device_id, _done in waiters]
+            try:
+                moved = set(self._plugin._bulk_update_device_status(
+                    context, device_ids, current_status, new_status))
+            except Exception as e:
+                LOG.exception(_('failed to move devices %(ids)s to '
+                                '%(status)s'),
+                              {'ids': device_ids, 'status': new_status})
+                for _device_id, done in waiters:
+                    done.send_exception(e)
+                continue
+            LOG.debug(_('moved %(count)d of %(total)d devices from '
+                        '%(current)s to %(new)s'),
+                      {'count': len(moved), 'total': len(device_ids),
+                       'current': current_status, 'new': new_status})
+            for device_id, done in waiters:
+                done.send(device_id in moved)
@@ -0,0 +1,391 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Run device lifecycle operations from the database backed task queue.
+
+Any number of tacker-server or tacker-lifecycle-worker processes, on any
+host sharing the database, lease tasks from the queue and run them. A
+task survives the process which queued it as well as the one running it.
+"""
+
+import bisect
+import collections
+import contextlib
+import os
+import socket
+import uuid
+
+import eventlet
+from oslo_config import cfg
+
+from tacker import context as t_context
+from tacker.openstack.common import jsonutils
+from tacker.openstack.common import log as logging
+from tacker.openstack.common import loopingcall
+from tacker.openstack.common import timeutils
+from tacker.vm import monitor
+
+LOG = logging.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt('lifecycle_workers', default=16,
+               help=_('Number of lifecycle tasks run concurrently by this '
+                      'process. 0 only queues tasks for other processes')),
+    cfg.DictOpt('lifecycle_operation_workers',
+                default={'create_device': '8', 'update_device': '4'},
+                help=_('Maximum number of tasks of an operation run '
+                       'concurrently by this process, e.g. '
+                       'create_device:8,update_device:4. Operations not '
+                       'listed may use all lifecycle_workers')),
+    cfg.IntOpt('lifecycle_wait_workers', default=16,
+               help=_('Number of tasks, beyond lifecycle_workers, which '
+                      'only wait for the infra driver and do not count '
+                      'against the limit of their operation')),
+    cfg.FloatOpt('lifecycle_poll_interval', default=1.0,
+                 help=_('Seconds between two polls of the lifecycle task '
+                        'queue')),
+    cfg.IntOpt('lifecycle_lease', default=60,
+               help=_('Seconds a worker owns a task it does not renew. '
+                      'Tasks of a dead worker are taken over after it')),
+    cfg.IntOpt('lifecycle_max_attempts', default=5,
+               help=_('Number of times a lifecycle task is run before it '
+                      'is marked FAILED')),
+    cfg.IntOpt('lifecycle_retry_backoff', default=10,
+               help=_('Seconds before a failed lifecycle task is run '
+                      'again, doubled for every further attempt')),
+    cfg.IntOpt('lifecycle_drain_timeout', default=30,
+               help=_('Seconds given to running lifecycle tasks to finish '
+                      'on shutdown before they are handed to other '
+                      'workers')),
+]
+cfg.CONF.register_opts(OPTS, 'servicevm')
+
+# cap of the exponential retry delay
+MAX_RETRY_BACKOFF = 600
+# the identity of the caller queued with a task, but not its token
+_CONTEXT_KEYS = ('user_id', 'tenant_id', 'user_name', 'tenant_name',
+                 'roles', 'is_admin', 'request_id')
+
+
+def _task_context(identity):
+    """Rebuild the context a queued task runs with.
+
+    The token of the caller is not queued. It would be readable in the
+    task table and expired by the time a retry or another worker runs
+    the task. The task runs on behalf of the caller with a token of the
+    tacker service user instead, as failure policies do.
+    """
+    context = t_context.Context(
+        load_admin_roles=False,
+        **dict((key, identity.get(key)) for key in _CONTEXT_KEYS))
+    if cfg.CONF.auth_strategy == 'keystone':
+        context.auth_token = monitor.service_token()['id']
+    return context
+
+
+class Task(object):
+    """Handle given to the operation running a task."""
+
+    def __init__(self, executor, task_id, steps):
+        self._executor = executor
+        self.id = task_id
+        self.steps = [step for step in steps.split(',') if step]
+
+    def done(self, name):
+        return name in self.steps
+
+    def step(self, name, function, *args, **kwargs):
+        """Run function unless an earlier attempt of the task already did."""
+        if self.done(name):
+            return
+        function(*args, **kwargs)
+        self.steps.append(name)
+        self._executor.mark_step(self)
+
+
+class OperationStats(object):
+    """Counters and latency histograms of one operation in this process."""
+
+    # upper bounds in seconds of the histogram buckets, the last bucket
+    # counts the operations taking longer than all of them
+    BUCKETS = (1, 5, 10, 30, 60, 300, 600, 1800)
+
+    def __init__(self):
+        self.running = 0
+        # running operations in a stage not bounded by the limit
+        self.waiting = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        # time spent runnable in the queue before a worker leased the task
+        self.wait_time = self._histogram()
+        self.run_time = self._histogram()
+        self.stages = collections.defaultdict(self._histogram)
+
+    def _histogram(self):
+        return [0] * (len(self.BUCKETS) + 1)
+
+    def record(self, histogram, seconds):
+        histogram[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+
+    def to_dict(self):
+        bounds = ['<=%s' % bound for bound in self.BUCKETS]
+        bounds.append('>%s' % self.BUCKETS[-1])
+        return {'running': self.running,
+                'waiting': self.waiting,
+                'completed': self.completed,
+                'retried': self.retried,
+                'failed': self.failed,
+                'wait_time': dict(zip(bounds, self.wait_time)),
+                'run_time': dict(zip(bounds, self.run_time)),
+                'stages': dict((name, dict(zip(bounds, histogram)))
+                               for name, histogram in self.stages.items())}
+
+
+class TaskExecutor(object):
+    """Bounded pool running queued tasks and in-process operations.
+
+    Queued tasks are only leased while the pool has room and each
+    operation listed in lifecycle_operation_workers is kept below its own
+    limit, so a storm of creates leaves workers for deletes. Tasks
+    waiting in an unbounded stage are held in lifecycle_wait_workers
+    extra slots of the pool, and only as many of them as fit there are
+    not counted against their operation.
+    """
+
+    def __init__(self, plugin, workers):
+        self._plugin = plugin
+        self._operations = {}
+        self.owner = '%s:%d:%s' % (socket.gethostname(), os.getpid(),
+                                   uuid.uuid4().hex[:8])
+        # a process only queueing tasks still runs the operations which
+        # can not be queued
+        self._workers = max(workers, 1)
+        self._wait_workers = (
+            cfg.CONF.servicevm.lifecycle_wait_workers if workers > 0 else 0)
+        self._pool = eventlet.GreenPool(self._workers + self._wait_workers)
+        self._limits = dict(
+            (operation, int(limit)) for operation, limit in
+            cfg.CONF.servicevm.lifecycle_operation_workers.items())
+        self._stats = collections.defaultdict(OperationStats)
+        # ids of the queued tasks leased by this process
+        self._running = set()
+        # green thread -> operation it runs
+        self._current = {}
+        self._timer = None
+        self._draining = False
+
+    def register(self, operation, function):
+        """function(context, task, **kwargs) runs the operation."""
+        self._operations[operation] = function
+
+    def submit(self, context, operation, device_id=None, **kwargs):
+        """Queue operation to be run with kwargs by some worker.
+
+        kwargs are stored as json and must only hold plain data.
+        """
+        identity = context.to_dict()
+        payload = {'context': dict((key, identity[key])
+                                   for key in _CONTEXT_KEYS),
+                   'kwargs': kwargs}
+        task_id = self._plugin._enqueue_task(context, operation, device_id,
+                                             payload)
+        if self._timer is not None:
+            eventlet.spawn_n(self.poll)
+        return task_id
+
+    def spawn_n(self, operation, function, *args, **kwargs):
+        """Run function in this process, accounted as operation."""
+        self._pool.spawn_n(self._run_local, operation, function, args,
+                           kwargs)
+
+    def start(self):
+        self._timer = loopingcall.FixedIntervalLoopingCall(self.poll)
+        self._timer.start(cfg.CONF.servicevm.lifecycle_poll_interval)
+
+    def stop(self):
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+
+    def wait(self):
+        if self._timer:
+            self._timer.wait()
+        self._pool.waitall()
+
+    def drain(self, timeout):
+        """Stop leasing tasks and wait up to timeout for running ones.
+
+        Tasks still running afterwards are handed back to the queue so
+        that other workers do not wait for their lease to expire.
+        """
+        self._draining = True
+        self.stop()
+        LOG.info(_('draining %d lifecycle operations'), self._pool.running())
+        with eventlet.Timeout(timeout, False):
+            self._pool.waitall()
+        if self._running:
+            LOG.warn(_('handing over unfinished lifecycle tasks %s'),
+                     ', '.join(self._running))
+            self._plugin._release_tasks(t_context.get_admin_context(),
+                                        self.owner, list(self._running))
+
+    @contextlib.contextmanager
+    def stage(self, operation, name, unbounded=False):
+        """Time the stage name of operation.
+
+        An operation run by this executor in an unbounded stage, e.g. one
+        only waiting for the infra driver, does not count against the
+        limit of the operation while it fits in lifecycle_wait_workers,
+        so that more tasks of it are leased meanwhile.
+        """
+        stats = self._stats[operation]
+        waiting = (unbounded and
+                   self._current.get(eventlet.getcurrent()) == operation)
+        if waiting:
+            stats.waiting += 1
+        start = timeutils.utcnow()
+        try:
+            yield
+        finally:
+            if waiting:
+                stats.waiting -= 1
+            stats.record(stats.stages[name],
+                         timeutils.delta_seconds(start, timeutils.utcnow()))
+
+    def limit(self, operation):
+        return self._limits.get(operation)
+
+    def get_stats(self):
+        """Return {operation: stats of the operation in this process}."""
+        return dict((operation, stats.to_dict())
+                    for operation, stats in self._stats.items())
+
+    def poll(self):
+        if self._draining:
+            return
+        conf = cfg.CONF.servicevm
+        context = t_context.get_admin_context()
+        try:
+            self._plugin._renew_task_leases(
+                context, self.owner, list(self._running),
+                conf.lifecycle_lease)
+            tasks = self._lease(context, conf.lifecycle_lease)
+        except Exception:
+            LOG.exception(_('failed to poll the lifecycle task queue'))
+            return
+        for task_db in tasks:
+            self._running.add(task_db.id)
+            self._stats[task_db.operation].running += 1
+            self._stats[task_db.operation].record(
+                self._stats[task_db.operation].wait_time,
+                timeutils.delta_seconds(task_db.run_at,
+                                        timeutils.utcnow()))
+            self._pool.spawn_n(self._run, task_db.id, task_db.operation,
+                               task_db.payload, task_db.steps,
+                               task_db.attempts)
+
+    def _lease(self, context, lease):
+        # waiting tasks beyond lifecycle_wait_workers take up workers
+        # like running ones
+        room = self._wait_workers
+        parked = {}
+        running = 0
+        for operation, stats in self._stats.items():
+            parked[operation] = min(stats.waiting, room)
+            room -= parked[operation]
+            running += stats.running - parked[operation]
+        free = min(self._pool.free(), self._workers - running)
+        tasks = []
+        for operation, limit in self._limits.items():
+            stats = self._stats[operation]
+            count = min(free, limit - stats.running +
+                        parked.get(operation, 0))
+            if count > 0:
+                leased = self._plugin._lease_tasks(
+                    context, self.owner, count, lease,
+                    operations=[operation])
+                tasks.extend(leased)
+                free -= len(leased)
+        if free > 0:
+            tasks.extend(self._plugin._lease_tasks(
+                context, self.owner, free, lease,
+                exclude=list(self._limits)))
+        return tasks
+
+    def mark_step(self, task):
+        self._plugin._mark_task_step(t_context.get_admin_context(),
+                                     self.owner, task.id, task.steps)
+
+    def _run_local(self, operation, function, args, kwargs):
+        stats = self._stats[operation]
+        stats.running += 1
+        self._current[eventlet.getcurrent()] = operation
+        start = timeutils.utcnow()
+        try:
+            function(*args, **kwargs)
+        except Exception:
+            stats.failed += 1
+            LOG.exception(_('%s failed'), operation)
+        else:
+            stats.completed += 1
+        finally:
+            stats.running -= 1
+            del self._current[eventlet.getcurrent()]
+            stats.record(stats.run_time,
+                         timeutils.delta_seconds(start, timeutils.utcnow()))
+
+    def _run(self, task_id, operation, payload, steps, attempts):
+        admin_context = t_context.get_admin_context()
+        stats = self._stats[operation]
+        self._current[eventlet.getcurrent()] = operation
+        start = timeutils.utcnow()
+        try:
+            payload = jsonutils.loads(payload)
+            context = _task_context(payload['context'])
+            function = self._operations[operation]
+            LOG.debug(_('running %(operation)s task %(task_id)s '
+                        'attempt %(attempts)d'),
+                      {'operation': operation, 'task_id': task_id,
+                       'attempts': attempts})
+            function(context, Task(self, task_id, steps), **payload['kwargs'])
+        except Exception as e:
+            LOG.exception(_('%(operation)s task %(task_id)s failed'),
+                          {'operation': operation, 'task_id': task_id})
+            self._retry(admin_context, task_id, attempts, e, stats)
+        else:
+            stats.completed += 1
+            self._plugin._complete_task(admin_context, self.owner, task_id)
+        finally:
+            stats.running -= 1
+            del self._current[eventlet.getcurrent()]
+            stats.record(stats.run_time,
+                         timeutils.delta_seconds(start, timeutils.utcnow()))
+            self._running.discard(task_id)
+
+    def _retry(self, context, task_id, attempts, error, stats):
+        conf = cfg.CONF.servicevm
+        if attempts >= conf.lifecycle_max_attempts:
+            LOG.error(_('giving up lifecycle task %(task_id)s after '
+                        '%(attempts)d attempts'),
+                      {'task_id': task_id, 'attempts': attempts})
+            stats.failed += 1
+            delay = None
+        else:
+            stats.retried += 1
+            delay = min(conf.lifecycle_retry_backoff * 2 ** (attempts - 1),
+                        MAX_RETRY_BACKOFF)
+        try:
+            self._plugin._retry_task(context, self.owner, task_id, delay,
+                                     '%s: %s' % (type(error).__name__, error))
+        except Exception:
+            LOG.exception(_('failed to release lifecycle task %s'), task_id)
@@ -38,6 +38,7 @@ import webob.exc
 
 from tacker.common import constants
 from tacker.common import exceptions as exception
+from tacker.common import utils
 from tacker import context
 from tacker.db import api
 from tacker.openstack.common import excutils
@@ -81,6 +82,13 @@ CONF.register_opts(socket_opts)
 
 LOG = logging.getLogger(__name__)
 
+_CONTENT_TYPES = ['application/json', 'application/xml']
+# Content negotiation results keyed by Accept/Accept-Language header value.
+_ACCEPT_CACHE = utils.LRUCache(256)
+_LANGUAGE_CACHE = utils.LRUCache(256)
+# Serializers are stateless and reused across requests.
+_CONTROLLER_SERIALIZERS = {}
+
 
 class WorkerService(object):
     """Wraps a worker to be handled by ProcessLauncher"""
@@ -332,11 +340,15 @@ class Request(webob.Request):
         type_from_header = self.get_content_type()
         if type_from_header:
             return type_from_header
-        ctypes = ['application/json', 'application/xml']
 
         #Finally search in Accept-* headers
-        bm = self.accept.best_match(ctypes)
-        return bm or 'application/json'
+        accept = self.headers.get('Accept')
+        bm = _ACCEPT_CACHE.get(accept)
+        if bm is None:
+            bm = (self.accept.best_match(_CONTENT_TYPES) or
+                  'application/json')
+            _ACCEPT_CACHE.set(accept, bm)
+        return bm
 
     def get_content_type(self):
         allowed_types = ("application/xml", "application/json")
@@ -354,10 +366,16 @@ class Request(webob.Request):
         :returns: the best language match or None if the 'Accept-Language'
                   header was not available in the request.
         """
-        if not self.accept_language:
+        accept_language = self.headers.get('Accept-Language')
+        if not accept_language:
             return None
-        all_languages = gettextutils.get_available_languages('tacker')
-        return self.accept_language.best_match(all_languages)
+        # '' records that none of the available languages is acceptable
+        language = _LANGUAGE_CACHE.get(accept_language)
+        if language is None:
+            all_languages = gettextutils.get_available_languages('tacker')
+            language = self.accept_language.best_match(all_languages) or ''
+            _LANGUAGE_CACHE.set(accept_language, language)
+        return language or None
 
     @property
     def context(self):
@@ -398,6 +416,9 @@ class JSONDictSerializer(DictSerializer):
         return jsonutils.dumps(data, default=sanitizer)
 
 
+_JSON_SERIALIZER = JSONDictSerializer()
+
+
 class XMLDictSerializer(DictSerializer):
 
     def __init__(self, metadata=None, xmlns=None):
@@ -620,6 +641,9 @@ class JSONDeserializer(TextDeserializer):
         return {'body': self._from_json(datastring)}
 
 
+_JSON_DESERIALIZER = JSONDeserializer()
+
+
 class ProtectedXMLParser(etree.XMLParser):
     def __init__(self, *args, **kwargs):
         etree.XMLParser.__init__(self, *args, **kwargs)
@@ -968,6 +992,130 @@ class Debug(Middleware):
         print()
 
 
+class _DispatchNode(object):
+    """A node of the static-prefix trie used by Mapper."""
+
+    __slots__ = ('children', 'routes')
+
+    def __init__(self):
+        self.children = {}
+        self.routes = []
+
+
+class Mapper(routes.Mapper):
+    """routes.Mapper with a precompiled dispatch table.
+
+    routes.Mapper resolves a request by trying the regular expression of
+    every connected route in turn.  This mapper indexes the routes once per
+    request method in a trie keyed on the literal path segments in front of
+    their first variable, so only routes that can possibly match are tried,
+    and keeps the results of recent matches in a bounded LRU cache so hot
+    URLs are resolved without any regular expression matching.
+
+    Matching order and results are identical to routes.Mapper.  All routes
+    must be connected before the first match.
+    """
+
+    def __init__(self, *args, **kwargs):
+        cache_size = kwargs.pop('cache_size', 1024)
+        super(Mapper, self).__init__(*args, **kwargs)
+        self._dispatch_tables = {}
+        self._dispatch_routes = 0
+        self._match_cache = utils.LRUCache(cache_size)
+        self._cacheable = False
+
+    def _create_regs(self, clist=None):
+        super(Mapper, self)._create_regs(clist)
+        self._reset_dispatch_tables()
+
+    def _reset_dispatch_tables(self):
+        self._dispatch_tables = {}
+        self._dispatch_routes = len(self.matchlist)
+        self._match_cache.clear()
+        # A match only depends on the method and the path unless routes
+        # look at the host or at arbitrary environ values.
+        self._cacheable = not self.sub_domains and not any(
+            route.conditions and 'function' in route.conditions
+            for route in self.matchlist)
+
+    @staticmethod
+    def _literal_prefix(route):
+        if route.minimization:
+            # minimized routes may match with their static parts left out
+            return ''
+        prefix = []
+        for part in route.routelist:
+            if isinstance(part, dict):
+                break
+            prefix.append(part)
+        return ''.join(prefix)
+
+    def _build_dispatch_table(self, method):
+        root = _DispatchNode()
+        for index, route in enumerate(self.matchlist):
+            if route.static:
+                continue
+            conditions = route.conditions or {}
+            if 'method' in conditions and method not in conditions['method']:
+                continue
+            prefix = self._literal_prefix(route)
+            node = root
+            # only complete segments are used as trie keys; the partial
+            # tail is checked with startswith() at match time.
+            for segment in prefix.split('/')[:-1]:
+                node = node.children.setdefault(segment, _DispatchNode())
+            node.routes.append((index, prefix, route))
+        self._dispatch_tables[method] = root
+        return root
+
+    def _candidates(self, method, url):
+        root = self._dispatch_tables.get(method)
+        if root is None:
+            root = self._build_dispatch_table(method)
+        candidates = list(root.routes)
+        node = root
+        for segment in url.split('/')[:-1]:
+            node = node.children.get(segment)
+            if node is None:
+                break
+            candidates.extend(node.routes)
+        candidates.sort(key=lambda candidate: candidate[0])
+        return [route for _index, prefix, route in candidates
+                if url.startswith(prefix)]
+
+    def _match(self, url, environ):
+        environ = environ or self.environ
+        if (not environ or self.prefix or self.debug or self.always_scan or
+                not self._created_regs):
+            return super(Mapper, self)._match(url, environ)
+        if self._dispatch_routes != len(self.matchlist):
+            self._reset_dispatch_tables()
+
+        method = environ['REQUEST_METHOD']
+        key = (method, url)
+        if self._cacheable:
+            cached = self._match_cache.get(key)
+            if cached is not None:
+                match, route = cached
+                if match is not None:
+                    match = dict(match)
+                return (match, route, [])
+
+        match, route = None, None
+        for candidate in self._candidates(method, url):
+            result = candidate.match(url, environ, self.sub_domains,
+                                     self.sub_domains_ignore,
+                                     self.domain_match)
+            if isinstance(result, dict) or result:
+                match, route = result, candidate
+                break
+
+        if self._cacheable:
+            self._match_cache.set(
+                key, (dict(match) if match is not None else None, route))
+        return (match, route, [])
+
+
 class Router(object):
     """WSGI middleware that maps incoming requests to WSGI apps."""
 
@@ -1158,12 +1306,11 @@ class Fault(webob.exc.HTTPException):
         """Generate a WSGI response based on the exception passed to ctor."""
         # Replace the body with fault details.
         fault_data, metadata = self._body_function(self.wrapped_exc)
-        xml_serializer = XMLDictSerializer(metadata, self._xmlns)
         content_type = req.best_match_content_type()
-        serializer = {
-            'application/xml': xml_serializer,
-            'application/json': JSONDictSerializer(),
-        }[content_type]
+        if content_type == 'application/xml':
+            serializer = XMLDictSerializer(metadata, self._xmlns)
+        else:
+            serializer = _JSON_SERIALIZER
 
         self.wrapped_exc.body = serializer.serialize(fault_data)
         self.wrapped_exc.content_type = content_type
@@ -1224,9 +1371,7 @@ class Controller(object):
         MIME types to information needed to serialize to that type.
 
         """
-        _metadata = getattr(type(self), '_serialization_metadata', {})
-
-        serializer = Serializer(_metadata, default_xmlns)
+        serializer = self._get_serializer(default_xmlns)
         try:
             return serializer.serialize(data, content_type)
         except exception.InvalidContentType:
@@ -1240,10 +1385,20 @@ class Controller(object):
         MIME types to information needed to serialize to that type.
 
         """
-        _metadata = getattr(type(self), '_serialization_metadata', {})
-        serializer = Serializer(_metadata)
+        serializer = self._get_serializer()
         return serializer.deserialize(data, content_type)['body']
 
+    def _get_serializer(self, default_xmlns=None):
+        """Return the Serializer for this controller class, built once."""
+        cls = type(self)
+        key = (cls, default_xmlns)
+        serializer = _CONTROLLER_SERIALIZERS.get(key)
+        if serializer is None:
+            _metadata = getattr(cls, '_serialization_metadata', {})
+            serializer = Serializer(_metadata, default_xmlns)
+            _CONTROLLER_SERIALIZERS[key] = serializer
+        return serializer
+
     def get_default_xmlns(self, req):
         """Provide the XML namespace to use if none is otherwise specified."""
         return None
@@ -1263,17 +1418,20 @@ class Serializer(object):
         """
         self.metadata = metadata or {}
         self.default_xmlns = default_xmlns
+        self._serialize_handlers = {}
+        self._deserialize_handlers = {}
 
     def _get_serialize_handler(self, content_type):
-        handlers = {
-            'application/json': JSONDictSerializer(),
-            'application/xml': XMLDictSerializer(self.metadata),
-        }
-
-        try:
-            return handlers[content_type]
-        except Exception:
-            raise exception.InvalidContentType(content_type=content_type)
+        handler = self._serialize_handlers.get(content_type)
+        if handler is None:
+            if content_type == 'application/json':
+                handler = _JSON_SERIALIZER
+            elif content_type == 'application/xml':
+                handler = XMLDictSerializer(self.metadata)
+            else:
+                raise exception.InvalidContentType(content_type=content_type)
+            self._serialize_handlers[content_type] = handler
+        return handler
 
     def serialize(self, data, content_type):
         """Serialize a dictionary into the specified content type."""
@@ -1292,12 +1450,13 @@ class Serializer(object):
             raise webob.exc.HTTPBadRequest(_("Could not deserialize data"))
 
     def get_deserialize_handler(self, content_type):
-        handlers = {
-            'application/json': JSONDeserializer(),
-            'application/xml': XMLDeserializer(self.metadata),
-        }
-
-        try:
-            return handlers[content_type]
-        except Exception:
-            raise exception.InvalidContentType(content_type=content_type)
+        handler = self._deserialize_handlers.get(content_type)
+        if handler is None:
+            if content_type == 'application/json':
+                handler = _JSON_DESERIALIZER
+            elif content_type == 'application/xml':
+                handler = XMLDeserializer(self.metadata)
+            else:
+                raise exception.InvalidContentType(content_type=content_type)
+            self._deserialize_handlers[content_type] = handler
+        return handler
@@ -0,0 +1,123 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the cost of building device dicts.
+
+Populates an in-memory sqlite database with devices and times
+VNFMPluginDb._make_device_dict() over all of them, with debug logging on
+and off for devices already loaded, and with the device dict cache cold
+and warm for devices each read by a new session, as API requests do.
+
+    tools/with_venv.sh python tools/bench_device_dict.py [devices]
+"""
+
+from __future__ import print_function
+
+import logging
+import sys
+import timeit
+import uuid
+
+from oslo_config import cfg
+
+from tacker.db import api as db_api
+from tacker.db import model_base
+from tacker.db.vm import vm_db
+
+
+class Plugin(vm_db.VNFMPluginDb):
+    # only the db mixin is exercised; the API entry points are unused
+    create_vnf = update_vnf = delete_vnf = scale_vnf = create_vnfd = None
+    get_lifecycle_tasks = get_lifecycle_task = None
+    get_lifecycle_operations = get_lifecycle_operation = None
+
+
+class UncachedPlugin(Plugin):
+    # builds every dict from the rows
+    def _make_device_dict(self, device_db, fields=None):
+        self._device_cache.pop(device_db.id)
+        self._template_cache.pop(device_db.template_id)
+        return super(UncachedPlugin, self)._make_device_dict(device_db,
+                                                             fields)
+
+
+def populate(session, count):
+    template = vm_db.DeviceTemplate(id=str(uuid.uuid4()), tenant_id='bench',
+                                    name='bench', infra_driver='noop',
+                                    mgmt_driver='noop')
+    session.add(template)
+    session.add(vm_db.DeviceTemplateAttribute(
+        id=str(uuid.uuid4()), template_id=template.id, key='vnfd',
+        value='vdus: {}\n' * 100))
+    for _i in range(count):
+        device = vm_db.Device(id=str(uuid.uuid4()), tenant_id='bench',
+                              template_id=template.id, status='ACTIVE')
+        session.add(device)
+        for key in ('config', 'param_values', 'heat_template',
+                    'monitoring_policy', 'failure_policy'):
+            session.add(vm_db.DeviceAttribute(
+                id=str(uuid.uuid4()), device_id=device.id, key=key,
+                value='x' * 256))
+    session.flush()
+
+
+def run(plugin, devices, level, iterations):
+    logging.getLogger('tacker').setLevel(level)
+
+    def build():
+        for device_db in devices:
+            plugin._make_device_dict(device_db)
+    build()
+    seconds = min(timeit.repeat(build, number=iterations, repeat=3))
+    return seconds / (iterations * len(devices)) * 1e6
+
+
+def run_sessions(plugin_factory, device_ids, iterations):
+    logging.getLogger('tacker').setLevel(logging.INFO)
+    plugin = plugin_factory()
+
+    def build():
+        for device_id in device_ids:
+            session = db_api.get_session()
+            device_db = session.query(vm_db.Device).get(device_id)
+            plugin._make_device_dict(device_db)
+    build()
+    seconds = min(timeit.repeat(build, number=iterations, repeat=3))
+    return seconds / (iterations * len(device_ids)) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cfg.CONF([], project='tacker')
+    cfg.CONF.set_override('connection', 'sqlite://', group='database')
+    model_base.BASE.metadata.create_all(db_api.get_engine())
+    logging.getLogger('tacker').addHandler(logging.NullHandler())
+
+    session = db_api.get_session()
+    with session.begin():
+        populate(session, count)
+    devices = session.query(vm_db.Device).all()
+    plugin = Plugin()
+    for name, level in (('debug enabled', logging.DEBUG),
+                        ('debug disabled', logging.INFO)):
+        usec = run(plugin, devices, level, 20)
+        print('%-16s %8.2f usec/device' % (name, usec))
+
+    device_ids = [device.id for device in devices]
+    for name, plugin_factory in (('cache cold', UncachedPlugin),
+                                 ('cache warm', Plugin)):
+        usec = run_sessions(plugin_factory, device_ids, 5)
+        print('%-16s %8.2f usec/device' % (name, usec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure route dispatch overhead per request.
+
+Compares routes.Mapper with tacker.wsgi.Mapper on a mapper shaped like the
+one built by the extension middleware.
+
+    tools/with_venv.sh python tools/bench_routing.py [iterations]
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+import uuid
+
+import routes
+
+from tacker import wsgi
+
+COLLECTIONS = ['vnfs', 'vnfds', 'devices', 'device-templates',
+               'service-instances', 'extensions']
+
+
+def build(mapper):
+    for collection in COLLECTIONS:
+        with mapper.submapper(controller=collection, action='bulk',
+                              path_prefix='/v1.0',
+                              conditions=dict(method=['PUT'])) as submap:
+            submap.connect('/%s/bulk' % collection)
+            submap.connect('/%s/bulk.:(format)' % collection)
+        mapper.resource(collection, collection, controller=collection,
+                        path_prefix='/v1.0')
+    return mapper
+
+
+def requests():
+    ids = [str(uuid.uuid4()) for _i in range(50)]
+    reqs = []
+    for collection in COLLECTIONS:
+        reqs.append(('GET', '/v1.0/%s.json' % collection))
+        reqs.append(('POST', '/v1.0/%s.json' % collection))
+        for id_ in ids:
+            reqs.append(('GET', '/v1.0/%s/%s.json' % (collection, id_)))
+    return reqs
+
+
+def run(mapper, reqs, iterations):
+    environs = [{'REQUEST_METHOD': method, 'PATH_INFO': url}
+                for method, url in reqs]
+
+    def dispatch():
+        for environ in environs:
+            mapper.routematch(environ=environ)
+    dispatch()
+    seconds = min(timeit.repeat(dispatch, number=iterations, repeat=3))
+    return seconds / (iterations * len(environs)) * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    reqs = requests()
+    for name, mapper in (('routes.Mapper', routes.Mapper()),
+                         ('tacker.wsgi.Mapper', wsgi.Mapper())):
+        usec = run(build(mapper), reqs, iterations)
+        print('%-20s %8.2f usec/request' % (name, usec))
+
+
+if __name__ == '__main__':
+    main()
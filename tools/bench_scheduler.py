@@ -0,0 +1,115 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure hosting device schedule throughput with parallel callers.
+
+Populates the database with devices able to serve one service type and
+lets 1, 2, 4 and 8 threads schedule service instances on them until
+every device serves it once, with each scheduler.
+
+    tools/with_venv.sh python tools/bench_scheduler.py [devices] [connection]
+
+The default connection is a sqlite file, which serializes writers. Give
+a MySQL or PostgreSQL connection to see the scaling of a real server.
+"""
+
+from __future__ import print_function
+
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from oslo_config import cfg
+
+from tacker import context as t_context
+from tacker.db import api as db_api
+from tacker.db import model_base
+from tacker.db.vm import vm_db
+from tacker.vm import hosting_device_scheduler
+
+
+class Plugin(vm_db.VNFMPluginDb):
+    # only the db mixin is exercised; the API entry points are unused
+    create_vnf = update_vnf = delete_vnf = scale_vnf = create_vnfd = None
+    get_lifecycle_tasks = get_lifecycle_task = None
+    get_lifecycle_operations = get_lifecycle_operation = None
+
+
+def populate(count):
+    engine = db_api.get_engine()
+    model_base.BASE.metadata.drop_all(engine)
+    model_base.BASE.metadata.create_all(engine)
+    session = db_api.get_session()
+    with session.begin():
+        template = vm_db.DeviceTemplate(
+            id=str(uuid.uuid4()), tenant_id='bench', name='bench',
+            infra_driver='noop', mgmt_driver='noop')
+        session.add(template)
+        session.add(vm_db.ServiceType(
+            id=str(uuid.uuid4()), tenant_id='bench',
+            template_id=template.id, service_type='bench'))
+        for _i in range(count):
+            session.add(vm_db.Device(id=str(uuid.uuid4()), tenant_id='bench',
+                                     template_id=template.id,
+                                     status='ACTIVE'))
+
+
+def run(plugin, scheduler_class, count, callers):
+    populate(count)
+    scheduler = scheduler_class()
+    scheduled = []
+
+    def schedule():
+        while True:
+            context = t_context.get_admin_context(load_admin_roles=False)
+            if not scheduler.schedule(plugin, context, 'bench',
+                                      str(uuid.uuid4()), 'bench', []):
+                return
+            scheduled.append(1)
+
+    threads = [threading.Thread(target=schedule) for _i in range(callers)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.time() - start
+    assert len(scheduled) == count, 'devices scheduled twice or not at all'
+    return count / seconds
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    if len(sys.argv) > 2:
+        connection = sys.argv[2]
+    else:
+        connection = 'sqlite:///%s' % os.path.join(tempfile.mkdtemp(),
+                                                   'bench.sqlite')
+    cfg.CONF([], project='tacker')
+    cfg.CONF.set_override('connection', connection, group='database')
+    logging.getLogger('tacker').addHandler(logging.NullHandler())
+
+    plugin = Plugin()
+    for scheduler_class in (hosting_device_scheduler.ChanceScheduler,
+                            hosting_device_scheduler.LeastLoadedScheduler):
+        for callers in (1, 2, 4, 8):
+            rate = run(plugin, scheduler_class, count, callers)
+            print('%-20s %d callers %10.1f schedules/sec' %
+                  (scheduler_class.__name__, callers, rate))
+
+
+if __name__ == '__main__':
+    main()
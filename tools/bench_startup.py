@@ -0,0 +1,73 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure extension and driver discovery at API worker startup.
+
+Every measurement runs in a fresh interpreter, first without and then with
+the startup manifest written by the previous run.
+
+    tools/with_venv.sh python tools/bench_startup.py [runs]
+"""
+
+from __future__ import print_function
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+CHILD = """
+import time
+start = time.time()
+from oslo_config import cfg
+from tacker.api import extensions
+from tacker.common import driver_manager
+cfg.CONF(['--state_path', %(state_path)r], project='tacker')
+for namespace, names in (('tacker.servicevm.device.drivers',
+                          ['noop', 'nova', 'heat']),
+                         ('tacker.servicevm.mgmt.drivers',
+                          ['noop', 'openwrt'])):
+    driver_manager.DriverManager(namespace, names)
+ext_mgr = extensions.ExtensionManager(extensions.get_extensions_path())
+for ext in ext_mgr.extensions.values():
+    ext.get_extended_resources('1.0')
+print(time.time() - start)
+"""
+
+
+def run_child(state_path):
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD % {'state_path': state_path}])
+    return float(output.split()[-1]) * 1e3
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    state_path = tempfile.mkdtemp()
+    manifest = os.path.join(state_path, 'startup_manifest.json')
+    try:
+        cold = []
+        warm = []
+        for _i in range(runs):
+            if os.path.exists(manifest):
+                os.unlink(manifest)
+            cold.append(run_child(state_path))
+            warm.append(run_child(state_path))
+    finally:
+        shutil.rmtree(state_path)
+    print('%-18s %8.1f msec' % ('without manifest', min(cold)))
+    print('%-18s %8.1f msec' % ('with manifest', min(warm)))
+
+
+if __name__ == '__main__':
+    main()
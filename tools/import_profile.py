@@ -0,0 +1,119 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Report the import cost of every module pulled in by the given modules.
+
+Prints, for the modules taking longest to import, the cumulative time
+(including the modules they import) and the time spent in the module
+itself, followed by the peak resident memory of the process.
+
+    tools/with_venv.sh python tools/import_profile.py [-n 30] \\
+        [module ...]
+
+Without modules, the tacker-server entry point and the VNFM plugin with its
+configured drivers are profiled.
+"""
+
+from __future__ import print_function
+
+import argparse
+import resource
+import sys
+import time
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+DEFAULT_MODULES = ['tacker.cmd.server', 'tacker.vm.plugin']
+
+
+class ImportProfiler(object):
+
+    def __init__(self):
+        self.cumulative = {}
+        self.own = {}
+        self._stack = []
+        self._import = None
+
+    def _resolve(self, name, globals_, fromlist, module):
+        if fromlist:
+            return getattr(module, '__name__', name)
+        if name in sys.modules:
+            return name
+        package = (globals_ or {}).get('__package__') or ''
+        return '%s.%s' % (package, name) if package else name
+
+    def __import__(self, name, globals_=None, locals_=None, fromlist=None,
+                   level=-1):
+        if name in sys.modules:
+            return self._import(name, globals_, locals_, fromlist, level)
+        self._stack.append(0.0)
+        start = time.time()
+        try:
+            module = self._import(name, globals_, locals_, fromlist, level)
+        finally:
+            elapsed = time.time() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+        key = self._resolve(name, globals_, fromlist, module)
+        self.cumulative[key] = self.cumulative.get(key, 0) + elapsed
+        self.own[key] = self.own.get(key, 0) + elapsed - children
+        return module
+
+    def __enter__(self):
+        self._import = builtins.__import__
+        builtins.__import__ = self.__import__
+        return self
+
+    def __exit__(self, *exc_info):
+        builtins.__import__ = self._import
+
+
+def load_plugin():
+    from oslo_config import cfg
+
+    from tacker.vm import plugin
+
+    cfg.CONF([], project='tacker')
+    plugin.VNFMPlugin()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', type=int, default=30,
+                        help='number of modules to report')
+    parser.add_argument('modules', nargs='*')
+    args = parser.parse_args()
+
+    start = time.time()
+    with ImportProfiler() as profiler:
+        for name in args.modules or DEFAULT_MODULES:
+            __import__(name)
+        if not args.modules:
+            load_plugin()
+    total = time.time() - start
+
+    print('%10s %10s  %s' % ('cumul ms', 'self ms', 'module'))
+    ranked = sorted(profiler.cumulative.items(), key=lambda item: -item[1])
+    for name, cumulative in ranked[:args.n]:
+        print('%10.1f %10.1f  %s' % (cumulative * 1e3,
+                                     profiler.own[name] * 1e3, name))
+    print('%d modules imported in %.1f ms, peak RSS %d KiB' % (
+        len(profiler.cumulative), total * 1e3,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+if __name__ == '__main__':
+    main()